@@ -0,0 +1,86 @@
+"""Compare cache size and track decode time of the JSON and compact track storage formats.
+
+Usage: python benchmarks/track_storage.py [FILES]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+from typing import Optional
+
+from videoprof.codec import CompactCodec, FORMATS, JsonCodec, TrackCodec
+from videoprof.config import make_attributes
+from videoprof.db import get_connection, migrate_tracks, TrackCache
+from videoprof.mediainfo import MediaInfoList, MediaTrack
+
+
+WORDS = ["Matroska", "AVC", "High@L4.1", "CABAC", "Yes", "No", "Progressive", "4:2:0", "8 bits", "BT.709"]
+
+
+def make_track(track_type: str, fields: int) -> MediaTrack:
+    """A track shaped like pymediainfo output: numbers and short strings, many with rendered variants."""
+    track: MediaTrack = {"track_type": track_type, "format": random.choice(["AVC", "HEVC", "AC-3", "DTS"])}
+    for x in range(fields):
+        number = random.randint(0, 1 << 24)
+        track[f"field_{x}"] = random.choice([number, random.choice(WORDS)])
+        if x % 3 == 0:
+            track[f"other_field_{x}"] = [f"{number} {random.choice(WORDS)}", f"{number / 1000:.1f} k"]
+    track["height"] = random.choice([480, 720, 1080, 2160])
+    track["frame_rate"] = random.choice(["23.976", "25.000", "29.970"])
+    return track
+
+
+def make_tracks() -> MediaInfoList:
+    return (
+        [make_track("General", 60), make_track("Video", 90)]
+        + [make_track("Audio", 60) for x in range(3)]
+        + [make_track("Text", 30) for x in range(6)]
+    )
+
+
+def measure(path: Path, files: int, codec: TrackCodec, project: bool, migrate: bool) -> None:
+    fields = frozenset().union(*[x.get_fields() for x in make_attributes()]) if project else None
+    random.seed(0)
+
+    with TrackCache(
+        get_connection(path, "OFF"), codec=JsonCodec() if migrate else codec, fields=fields
+    ) as cache:
+        for x in range(files):
+            cache.get_tracks(f"/media/video{x}.mkv", 1, 1.0, make_tracks)
+
+    connection = get_connection(path)
+    if migrate:
+        migrate_tracks(connection, codec)
+    connection.execute("VACUUM")
+
+    start = time.perf_counter()
+    for tracks, format in connection.execute("SELECT tracks, format FROM videos"):
+        FORMATS[format].decode(tracks)
+    elapsed = time.perf_counter() - start
+
+    connection.close()
+    label = f"{type(codec).__name__}{' projected' if project else ''}{' migrated' if migrate else ''}"
+    print(f"{label:<30}{os.path.getsize(path) / 1e6:>10.1f} MB{elapsed * 1e6 / files:>10.1f} us/file")
+
+
+def main(files: Optional[int] = None) -> None:
+    files = files or 5000
+    print(f"{files} files")
+
+    with tempfile.TemporaryDirectory() as dir:
+        for x, (codec, project, migrate) in enumerate(
+            [
+                (JsonCodec(), False, False),
+                (CompactCodec(), False, False),
+                (CompactCodec(), False, True),
+                (CompactCodec(), True, False),
+            ]
+        ):
+            measure(Path(dir) / f"cache{x}.db", files, codec, project, migrate)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -4,7 +4,7 @@ from typing import cast
 
 from videoprof.attribute import SingleAttribute, CompositeAttribute
 from videoprof.exceptions import MissingAttributeError
-from videoprof.mediainfo import MediaInfoList
+from videoprof.mediainfo import MediaInfoList, TrackIndex
 from videoprof.preference import SinglePreference
 
 
@@ -44,7 +44,7 @@ def test_attribute_get_value():
         track_type="test_type",
         track_attribute="test_attribute",
     )
-    assert attribute.get_value(media_info) == "test_value"
+    assert attribute.get_value(TrackIndex(media_info)) == "test_value"
 
 
 def test_attribute_get_missing_value():
@@ -63,7 +63,7 @@ def test_attribute_get_missing_value():
         track_type="test_type",
         track_attribute="missing_attribute",
     )
-    assert attribute.get_value(media_info) is None
+    assert attribute.get_value(TrackIndex(media_info)) is None
 
 
 def test_attribute_get_missing_type():
@@ -82,7 +82,7 @@ def test_attribute_get_missing_type():
         track_type="missing_type",
         track_attribute="test_attribute",
     )
-    assert attribute.get_value(media_info) is None
+    assert attribute.get_value(TrackIndex(media_info)) is None
 
 
 def test_attribute_get_preference_create_default():
@@ -103,7 +103,7 @@ def test_attribute_get_preference_create_default():
         track_attribute="test_attribute",
     )
 
-    preference = attribute.get_preference(media_info)
+    preference = attribute.get_preference(TrackIndex(media_info))
     assert preference.get_title() == "test"
 
 
@@ -125,7 +125,7 @@ def test_attribute_get_preference_create_added():
         track_attribute="test_attribute",
     )
 
-    preference = attribute.get_preference(media_info)
+    preference = attribute.get_preference(TrackIndex(media_info))
     assert preference == attribute.get_preferences()[0]
 
 
@@ -149,7 +149,7 @@ def test_attribute_get_preference_find_existing():
         track_attribute="test_attribute",
     )
 
-    preference = attribute.get_preference(media_info)
+    preference = attribute.get_preference(TrackIndex(media_info))
     assert preference == existing_preference
 
 
@@ -201,7 +201,7 @@ def test_composite_attribute_concat_no_existing_preference():
         attributes=[attribute1, attribute2], preferences=[], title="Composite Test"
     )
 
-    preference = composite.get_preference(media_info)
+    preference = composite.get_preference(TrackIndex(media_info))
     assert preference.title == "goodtest"
 
 
@@ -237,7 +237,7 @@ def test_composite_attribute_concat_existing_preference():
         attributes=[attribute1, attribute2], preferences=[existing_preference], title="Composite Test"
     )
 
-    preference = composite.get_preference(media_info)
+    preference = composite.get_preference(TrackIndex(media_info))
     assert preference == existing_preference
 
 
@@ -270,7 +270,7 @@ def test_composite_attribute_one_missing():
         attributes=[attribute1, attribute2], preferences=[], title="Composite Test"
     )
 
-    preference = composite.get_preference(media_info)
+    preference = composite.get_preference(TrackIndex(media_info))
     assert preference.title == "test"
 
 
@@ -303,4 +303,80 @@ def test_composite_attribute_all_missing():
     )
 
     with pytest.raises(MissingAttributeError):
-        composite.get_preference(media_info)
+        composite.get_preference(TrackIndex(media_info))
+
+
+def test_attribute_get_value_first_track_of_type():
+    media_info = cast(
+        MediaInfoList,
+        [
+            {"track_type": "other_type", "test_attribute": "other_value"},
+            {"track_type": "test_type", "test_attribute": "first_value"},
+            {"track_type": "test_type", "test_attribute": "second_value"},
+        ],
+    )
+    attribute = SingleAttribute(
+        preferences=[],
+        title="Test Title",
+        track_type="test_type",
+        track_attribute="test_attribute",
+    )
+    assert attribute.get_value(TrackIndex(media_info)) == "first_value"
+
+
+class CountingTrackIndex(TrackIndex):
+    lookups = 0
+
+    def get_first(self, track_type):
+        self.lookups += 1
+        return super().get_first(track_type)
+
+
+def test_attribute_memo_evaluates_leaf_once():
+    tracks = CountingTrackIndex(cast(MediaInfoList, [{"track_type": "test_type", "test_attribute": "test"}]))
+    attribute = SingleAttribute(
+        preferences=[],
+        title="Test Title",
+        track_type="test_type",
+        track_attribute="test_attribute",
+    )
+    composite = CompositeAttribute(attributes=[attribute], preferences=[], title="Composite Test")
+    memo = {}
+
+    assert attribute.get_preference(tracks, memo) is composite.attributes[0].get_preference(tracks, memo)
+    composite.get_preference(tracks, memo)
+    assert tracks.lookups == 1
+
+
+def test_attribute_memo_missing():
+    tracks = CountingTrackIndex(cast(MediaInfoList, [{"track_type": "test_type"}]))
+    attribute = SingleAttribute(
+        preferences=[],
+        title="Test Title",
+        track_type="test_type",
+        track_attribute="test_attribute",
+    )
+    memo = {}
+
+    for x in range(2):
+        with pytest.raises(MissingAttributeError):
+            attribute.get_preference(tracks, memo)
+    assert tracks.lookups == 1
+
+
+def test_composite_attribute_get_fields():
+    attribute1 = SingleAttribute(
+        preferences=[],
+        title="Test Title",
+        track_type="test_type",
+        track_attribute="test_attribute1",
+    )
+    attribute2 = SingleAttribute(
+        preferences=[],
+        title="Test Title",
+        track_type="test_type",
+        track_attribute="test_attribute2",
+    )
+    composite = CompositeAttribute(attributes=[attribute1, attribute2], preferences=[], title="Composite")
+
+    assert composite.get_fields() == frozenset(["test_attribute1", "test_attribute2"])
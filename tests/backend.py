@@ -0,0 +1,60 @@
+import pytest
+import sys
+
+from videoprof.backend import CliBackend, LibraryBackend, parse_media_info_lists
+
+# Stands in for the mediainfo tool, reporting each readable file with libmediainfo's own OLDXML.
+FAKE_MEDIAINFO = """
+import os, re, sys, time
+from pymediainfo import MediaInfo
+
+files = []
+parse_speed = float(sys.argv[3].split("=")[1])
+for filename in sys.argv[4:]:
+    if "slow" in filename:
+        time.sleep(60)
+    if os.path.exists(filename):
+        xml = MediaInfo.parse(filename, output="OLDXML", full=True, parse_speed=parse_speed)
+        files.append(re.search("<File>.*</File>", xml, re.S).group(0))
+print("<Mediainfo>%s</Mediainfo>" % "".join(files))
+"""
+
+
+def make_mediainfo(tmp_path):
+    command = tmp_path / "mediainfo"
+    command.write_text(f"#!{sys.executable}\n{FAKE_MEDIAINFO}")
+    command.chmod(0o755)
+    return str(command)
+
+
+def test_backend_cli_matches_library(tmp_path):
+    filenames = [str(tmp_path / f"video{x}.mkv") for x in range(3)]
+    for filename in filenames:
+        with open(filename, "w") as file:
+            file.write(filename)
+
+    cli = CliBackend(command=make_mediainfo(tmp_path))
+    cli.check()
+
+    assert cli.probe([*filenames, str(tmp_path / "missing.mkv")]) == LibraryBackend().probe(filenames)
+    assert cli.probe([]) == {}
+
+
+def test_backend_cli_missing_command():
+    with pytest.raises(OSError):
+        CliBackend(command="videoprof-missing-mediainfo").check()
+
+
+def test_backend_parse_media_info_lists():
+    xml = (
+        '<Mediainfo><File><track type="General"><Complete_name>/a.mkv</Complete_name></track>'
+        '<track type="Video"><Height>1080</Height><Height>1 080 pixels</Height></track></File>'
+        '<File><track type="General"></track></File></Mediainfo>'
+    )
+
+    assert parse_media_info_lists(xml) == {
+        "/a.mkv": [
+            {"track_type": "General", "complete_name": "/a.mkv"},
+            {"track_type": "Video", "height": 1080, "other_height": ["1 080 pixels"]},
+        ]
+    }
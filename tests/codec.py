@@ -0,0 +1,47 @@
+import marshal
+import pytest
+import zlib
+
+from videoprof.codec import CompactCodec, JsonCodec, project
+
+TRACKS = [
+    {"track_type": "General", "format": "Matroska", "other_format": ["Matroska", "MKV"]},
+    {"track_type": "Video", "format": "AVC", "height": 1080, "frame_rate": "23.976"},
+]
+
+
+def test_codec_json_round_trip():
+    codec = JsonCodec()
+    assert codec.decode(codec.encode(TRACKS)) == TRACKS
+
+
+def test_codec_compact_round_trip():
+    codec = CompactCodec()
+    assert codec.decode(codec.encode(TRACKS)) == TRACKS
+
+
+def test_codec_compact_smaller_than_json():
+    tracks = TRACKS * 50
+    assert len(CompactCodec().encode(tracks)) < len(JsonCodec().encode(tracks))
+
+
+def test_codec_compact_rejects_other_marshal_version():
+    data = CompactCodec().encode(TRACKS)
+    with pytest.raises(ValueError):
+        CompactCodec().decode(data[:1] + bytes([marshal.version + 1]) + data[2:])
+
+
+def test_codec_compact_rejects_corrupt_data():
+    data = CompactCodec().encode(TRACKS)
+    with pytest.raises(ValueError):
+        CompactCodec().decode(data[:-4])
+    with pytest.raises(ValueError):
+        CompactCodec().decode(data[:2] + zlib.compress(marshal.dumps(TRACKS)[:-4]))
+
+
+def test_codec_project():
+    assert project(TRACKS, frozenset(["height"])) == [
+        {"track_type": "General"},
+        {"track_type": "Video", "height": 1080},
+    ]
+    assert project(TRACKS, None) == TRACKS
@@ -0,0 +1,82 @@
+from videoprof.columns import Column, ColumnarSummary, load_summary
+from videoprof.config import make_attributes
+from videoprof.db import get_connection, TrackCache
+from videoprof.exceptions import MissingAttributeError
+from videoprof.mediainfo import TrackIndex
+
+TRACKS = [
+    [
+        {"track_type": "General", "format": "Matroska"},
+        {"track_type": "Video", "format": "HEVC", "height": 2160, "bit_depth": 10, "frame_rate": "23.976"},
+        {"track_type": "Audio", "format": "E-AC-3", "channel_s": 6},
+        {"track_type": "Audio", "format": "AAC", "channel_s": 2},
+    ],
+    [
+        {"track_type": "General", "format": "MPEG-4"},
+        {"track_type": "Video", "format": "AVC", "height": 1080, "bit_depth": 8, "scan_type": "Progressive"},
+        {"track_type": "Audio", "format": "AAC", "channel_s": 2},
+    ],
+    [
+        {"track_type": "General", "format": "Matroska"},
+        {"track_type": "Audio", "format": "FLAC", "channel_s": 2},
+    ],
+    [{"track_type": "General", "format": "AVI"}],
+] * 3
+
+
+def get_preference_counts(attributes, tracks):
+    preference_counts = {}
+    for media_info_list in tracks:
+        for attribute in attributes:
+            try:
+                preference = attribute.get_preference(TrackIndex(media_info_list))
+            except MissingAttributeError:
+                continue
+            preference_counts[preference] = preference_counts.get(preference, 0) + 1
+    return preference_counts
+
+
+def get_titles(attributes):
+    return [[x.get_title() for x in attribute.get_preferences()] for attribute in attributes]
+
+
+def test_columns_column_encodes_values():
+    column = Column()
+    for value in ["a", "b", None, "a", "a"]:
+        column.append(value)
+
+    assert column.values == ["a", "b", None]
+    assert list(column.data) == [0, 1, 2, 0, 0]
+    assert column.get_counts() == [3, 1, 1]
+
+
+def test_columns_matches_file_by_file():
+    attributes = make_attributes()
+    summary = ColumnarSummary(attributes)
+    for tracks in TRACKS:
+        summary.add(tracks)
+
+    expected_attributes = make_attributes()
+    expected = get_preference_counts(expected_attributes, TRACKS)
+    preference_counts = summary.get_preference_counts()
+
+    assert summary.size == len(TRACKS)
+    assert get_titles(attributes) == get_titles(expected_attributes)
+    assert {(x.get_title(), count) for x, count in preference_counts.items()} == {
+        (x.get_title(), count) for x, count in expected.items()
+    }
+
+
+def test_columns_load_summary_below_directories(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection) as cache:
+        for x, tracks in enumerate(TRACKS):
+            cache.put_tracks(f"/{'a' if x % 2 else 'b'}/video{x}.mkv", 1, 1.0, tracks)
+
+    attributes = make_attributes()
+    summary = load_summary(connection, attributes, ["/a"])
+    counts = {x.get_title(): count for x, count in summary.get_preference_counts().items()}
+
+    assert summary.size == len(TRACKS) // 2
+    assert counts["MP4"] == counts["AVI"] == 3
+    assert "MKV" not in counts
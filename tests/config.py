@@ -1,4 +1,8 @@
-from videoprof.config import make_attributes
+import pytest
+
+from videoprof.backend import CliBackend, LibraryBackend, NativeBackend
+from videoprof.config import make_attributes, make_backend, make_device_limits, make_filter, make_ignore
+from videoprof.device import DeviceLimits
 
 
 def test_config_make_attributes_empty():
@@ -18,3 +22,104 @@ def test_config_make_attributes_one():
     )
 
     assert len(attributes) == 1
+
+
+def test_config_make_attributes_shares_identical_leaves():
+    height = {"title": "Height", "track_type": "Video", "track_attribute": "height"}
+    attributes = make_attributes(
+        {
+            "levels": {},
+            "attributes": [
+                height,
+                {"title": "Resolution", "attributes": [height]},
+                {"title": "Size", "attributes": [dict(height, title="Lines")]},
+            ],
+        }
+    )
+
+    resolution = attributes[1].attributes[0]
+    lines = attributes[2].attributes[0]
+
+    assert resolution is attributes[0]
+    assert lines is not attributes[0]
+    assert lines.get_key() == attributes[0].get_key()
+    assert lines.matcher is attributes[0].matcher
+
+
+def test_config_fingerprint_follows_definition():
+    container = {"title": "Container", "track_type": "General", "track_attribute": "format"}
+    attributes = make_attributes(
+        {
+            "levels": {},
+            "attributes": [container, dict(reversed(list(container.items()))), dict(container, render="%s!")],
+        }
+    )
+
+    assert attributes[0].get_fingerprint() == attributes[1].get_fingerprint()
+    assert attributes[0].get_fingerprint() != attributes[2].get_fingerprint()
+
+
+def test_config_attribute_parse_speed():
+    frames = {"title": "Frames", "track_type": "Video", "track_attribute": "frame_count", "parse_speed": 1.0}
+    height = {"title": "Height", "track_type": "Video", "track_attribute": "height"}
+    attributes = make_attributes(
+        {"levels": {}, "attributes": [frames, height, {"title": "Both", "attributes": [frames, height]}]}
+    )
+
+    assert [x.get_parse_speed() for x in attributes] == [1.0, 0.0, 1.0]
+
+
+def test_config_make_filter_default():
+    video_filter = make_filter()
+
+    assert video_filter.accepts_name("movie.mkv")
+    assert not video_filter.accepts_name("movie.nfo")
+
+
+def test_config_make_filter_missing():
+    video_filter = make_filter({"levels": {}, "attributes": []})
+
+    assert video_filter.accepts_name("movie.nfo")
+
+
+def test_config_make_filter():
+    video_filter = make_filter(
+        {"levels": {}, "attributes": [], "filter": {"exclude_extensions": [".NFO"], "signatures": True}}
+    )
+
+    assert not video_filter.accepts_name("movie.nfo")
+    assert video_filter.signatures
+
+
+def test_config_make_ignore():
+    assert "@eaDir/" in make_ignore()
+    assert make_ignore({"levels": {}, "attributes": []}) == []
+
+
+def test_config_make_device_limits():
+    assert make_device_limits().rotational == 1
+    assert make_device_limits({"levels": {}, "attributes": [], "devices": {"rotational": 2}}) == DeviceLimits(
+        rotational=2
+    )
+
+
+def test_config_make_backend():
+    assert make_backend() == LibraryBackend()
+    assert make_backend(name="cli") == CliBackend(command="mediainfo", batch_size=16)
+    assert make_backend(
+        {"levels": {}, "attributes": [], "probe": {"backend": "cli", "batch_size": 4}}
+    ) == CliBackend(batch_size=4)
+    assert make_backend(name="native", fields=frozenset(["format"])) == NativeBackend(frozenset(["format"]))
+    assert make_backend(
+        {"levels": {}, "attributes": [], "probe": {"backend": "native", "fallback": "cli"}}
+    ) == NativeBackend(fallback=CliBackend())
+    assert make_backend(parse_speed=1.0) == LibraryBackend(parse_speed=1.0)
+    assert make_backend(
+        {"levels": {}, "attributes": [], "probe": {"backend": "cli", "parse_speed": 0.0}}
+    ) == CliBackend(parse_speed=0.0)
+    with pytest.raises(ValueError):
+        make_backend(name="ffprobe")
+    with pytest.raises(ValueError):
+        make_backend(parse_speed=2.0)
+    with pytest.raises(ValueError):
+        make_backend({"levels": {}, "attributes": [], "probe": {"backend": "native", "fallback": "native"}})
@@ -0,0 +1,23 @@
+from videoprof.content import CONTENT_CHUNK_SIZE, get_content_fingerprint
+
+
+def test_content_fingerprint_follows_content(tmp_path):
+    data = bytes(range(256)) * (CONTENT_CHUNK_SIZE // 64)
+    for name in ["one.mkv", "two.mkv"]:
+        (tmp_path / name).write_bytes(data)
+    (tmp_path / "three.mkv").write_bytes(data[:-1] + b"\x00")
+
+    fingerprints = [
+        get_content_fingerprint(str(tmp_path / x), len(data)) for x in ["one.mkv", "two.mkv", "three.mkv"]
+    ]
+
+    assert fingerprints[0] == fingerprints[1]
+    assert fingerprints[0] != fingerprints[2]
+    assert get_content_fingerprint(str(tmp_path / "one.mkv"), len(data) + 1) != fingerprints[0]
+
+
+def test_content_fingerprint_small_and_missing(tmp_path):
+    (tmp_path / "small.mkv").write_bytes(b"small")
+
+    assert get_content_fingerprint(str(tmp_path / "small.mkv"), 5) is not None
+    assert get_content_fingerprint(str(tmp_path / "missing.mkv"), 5) is None
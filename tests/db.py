@@ -0,0 +1,332 @@
+import pytest
+import sqlite3
+
+from videoprof.codec import CompactCodec
+from videoprof.db import get_connection, migrate_tracks, TrackCache
+
+
+def test_db_unknown_synchronous_mode(tmp_path):
+    with pytest.raises(ValueError):
+        get_connection(tmp_path / "cache.db", "SOMETIMES")
+
+
+def test_db_get_tracks_generates_missing(tmp_path):
+    cache = TrackCache(get_connection(tmp_path / "cache.db"))
+    tracks = cache.get_tracks("video.mkv", 1, 1.0, lambda: [{"track_type": "General"}])
+
+    assert tracks == [{"track_type": "General"}]
+    assert cache.has_tracks("video.mkv", 1, 1.0)
+
+
+def test_db_get_tracks_batches_writes(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    cache = TrackCache(connection, batch_size=3)
+
+    for x in range(2):
+        cache.get_tracks(f"video{x}.mkv", 1, 1.0, lambda: [])
+    assert connection.execute("SELECT count(*) FROM videos").fetchone()[0] == 0
+
+    cache.get_tracks("video2.mkv", 1, 1.0, lambda: [])
+    assert connection.execute("SELECT count(*) FROM videos").fetchone()[0] == 3
+
+
+def test_db_flush_on_exit(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection) as cache:
+        cache.get_tracks("video.mkv", 1, 1.0, lambda: [])
+
+    assert connection.execute("SELECT count(*) FROM videos").fetchone()[0] == 1
+
+
+def test_db_prefetch_reuses_cached_tracks(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection) as cache:
+        for x in range(5):
+            cache.get_tracks(f"video{x}.mkv", 1, 1.0, lambda: [{"track_type": "General"}])
+
+    cache = TrackCache(connection, chunk_size=2)
+    cache.prefetch(f"video{x}.mkv" for x in range(5))
+
+    def fail() -> list:
+        raise AssertionError("cached tracks should not be regenerated")
+
+    for x in range(5):
+        assert cache.get_tracks(f"video{x}.mkv", 1, 1.0, fail) == [{"track_type": "General"}]
+
+
+def test_db_get_tracks_regenerates_modified(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection) as cache:
+        cache.get_tracks("video.mkv", 1, 1.0, lambda: [])
+
+    cache = TrackCache(connection)
+    assert not cache.has_tracks("video.mkv", 2, 1.0)
+    assert cache.get_tracks("video.mkv", 2, 1.0, lambda: [{"track_type": "Video"}]) == [
+        {"track_type": "Video"}
+    ]
+
+
+def test_db_results_follow_file_version(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection) as cache:
+        cache.put_results("video.mkv", 1, 1.0, [("a", "value", "Value"), ("b", None, None)])
+
+    cache = TrackCache(connection)
+    cache.prefetch(["video.mkv"], ["a", "b"])
+
+    assert cache.get_results("video.mkv", 1, 1.0) == {"a": "value", "b": None}
+    assert cache.get_results("video.mkv", 2, 1.0) == {}
+
+
+def test_db_parse_speed_upgrades_deep_attributes(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection, parse_speed=0.0) as cache:
+        cache.get_tracks("video.mkv", 1, 1.0, lambda: [{"track_type": "General"}])
+        cache.put_results("video.mkv", 1, 1.0, [("quick", "value", "Value"), ("deep", "value", "Value")])
+
+    # A run at the same speed trusts everything, whatever its attributes ask for.
+    cache = TrackCache(connection, parse_speed=0.0, parse_speeds={"deep": 1.0})
+    cache.prefetch(["video.mkv"], ["quick", "deep"])
+    assert cache.has_tracks("video.mkv", 1, 1.0)
+    assert cache.get_results("video.mkv", 1, 1.0) == {"quick": "value", "deep": "value"}
+
+    # A full run only parses the file again for the attribute that needs it.
+    cache = TrackCache(connection, parse_speed=1.0, parse_speeds={"deep": 1.0})
+    cache.prefetch(["video.mkv"], ["quick", "deep"])
+    assert not cache.has_tracks("video.mkv", 1, 1.0)
+    assert cache.get_results("video.mkv", 1, 1.0) == {"quick": "value"}
+    assert cache.get_tracks("video.mkv", 1, 1.0, lambda: [{"track_type": "Video"}]) == [
+        {"track_type": "Video"}
+    ]
+    cache.put_results("video.mkv", 1, 1.0, [("deep", "deeper", "Deeper")])
+    cache.flush()
+
+    cache = TrackCache(connection, parse_speed=1.0, parse_speeds={"deep": 1.0})
+    cache.prefetch(["video.mkv"], ["quick", "deep"])
+    assert cache.has_tracks("video.mkv", 1, 1.0)
+    assert cache.get_results("video.mkv", 1, 1.0) == {"quick": "value", "deep": "deeper"}
+    assert connection.execute("SELECT parse_speed FROM videos").fetchall() == [(1.0,)]
+
+    cache = TrackCache(connection, parse_speed=1.0)
+    cache.prefetch(["other.mkv"], ["quick"])
+    assert cache.get_tracks("other.mkv", 1, 1.0, lambda: []) == []
+    assert connection.execute("SELECT count(*) FROM videos WHERE parse_speed IS NULL").fetchone()[0] == 0
+
+
+def test_db_results_stand_in_for_projected_tracks(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection, fields=frozenset(["format"])) as cache:
+        cache.prefetch(["video.mkv"], ["format"])
+        cache.get_tracks("video.mkv", 1, 1.0, lambda: [{"track_type": "General", "format": "MKV"}])
+        cache.put_results("video.mkv", 1, 1.0, [("format", "MKV", "MKV")])
+
+    # A run keeping every field has no use for the projected tracks, but needs nothing it lacks.
+    cache = TrackCache(connection)
+    cache.prefetch(["video.mkv"], ["format"])
+    assert cache.has_tracks("video.mkv", 1, 1.0)
+    assert cache.get_results("video.mkv", 1, 1.0) == {"format": "MKV"}
+
+    cache = TrackCache(connection)
+    cache.prefetch(["video.mkv"], ["format", "other"])
+    assert not cache.has_tracks("video.mkv", 1, 1.0)
+
+
+def test_db_migrates_old_videos_table(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / "cache.db"))
+    connection.execute(
+        "CREATE TABLE videos (filename varchar primary key, size integer, modified real, tracks text)"
+    )
+    connection.execute("INSERT INTO videos VALUES ('video.mkv', 1, 1.0, '[]')")
+    connection.commit()
+
+    cache = TrackCache(get_connection(tmp_path / "cache.db"))
+
+    assert cache.get_tracks("video.mkv", 1, 1.0, lambda: [{"track_type": "General"}]) == []
+
+
+def test_db_compact_projected_tracks(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection, codec=CompactCodec(), fields=frozenset(["height"])) as cache:
+        cache.get_tracks("video.mkv", 1, 1.0, lambda: [{"track_type": "Video", "height": 1, "width": 2}])
+
+    cache = TrackCache(connection, codec=CompactCodec(), fields=frozenset(["height"]))
+    assert cache.get_tracks("video.mkv", 1, 1.0, lambda: []) == [{"track_type": "Video", "height": 1}]
+
+    cache = TrackCache(connection, codec=CompactCodec(), fields=frozenset(["height", "width"]))
+    assert not cache.has_tracks("video.mkv", 1, 1.0)
+
+
+def test_db_rewrites_tracks_with_current_codec(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection) as cache:
+        cache.get_tracks("video.mkv", 1, 1.0, lambda: [{"track_type": "General"}])
+
+    with TrackCache(connection, codec=CompactCodec()) as cache:
+        assert cache.get_tracks("video.mkv", 1, 1.0, lambda: []) == [{"track_type": "General"}]
+
+    assert connection.execute("SELECT format FROM videos").fetchone()[0] == CompactCodec().get_format()
+
+
+def test_db_migrate_tracks(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection) as cache:
+        for x in range(3):
+            cache.get_tracks(f"video{x}.mkv", 1, 1.0, lambda: [{"track_type": "General"}])
+    connection.execute("UPDATE videos SET tracks = 'broken' WHERE filename = 'video0.mkv'")
+
+    assert migrate_tracks(connection, CompactCodec(), batch_size=2) == 3
+    assert connection.execute("SELECT count(*) FROM videos").fetchone()[0] == 2
+
+    cache = TrackCache(connection, codec=CompactCodec())
+    assert cache.get_tracks("video1.mkv", 1, 1.0, lambda: []) == [{"track_type": "General"}]
+
+
+def test_db_prefetch_streams_chunks(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection) as cache:
+        for x in range(10):
+            cache.get_tracks(f"video{x}.mkv", 1, 1.0, lambda: [{"track_type": "General"}])
+
+    def fail() -> list:
+        raise AssertionError("cached tracks should not be regenerated")
+
+    cache = TrackCache(connection, chunk_size=2)
+    for start in range(0, 10, 2):
+        cache.prefetch([f"video{x}.mkv" for x in range(start, start + 2)])
+        for x in range(start, start + 2):
+            assert cache.get_tracks(f"video{x}.mkv", 1, 1.0, fail) == [{"track_type": "General"}]
+
+    assert cache.offset == 4
+    assert cache.plan == [f"video{x}.mkv" for x in range(4, 10)]
+    assert sorted(cache.positions) == cache.plan
+    assert len(cache.records) <= 3 * cache.chunk_size
+
+
+def test_db_get_stats_below_root(tmp_path):
+    cache = TrackCache(get_connection(tmp_path / "cache.db"), batch_size=2)
+    for filename in ["/a", "/a/b.mkv", "/a/c/d.mkv", "/a/e.mkv", "/ab.mkv", "/f.mkv"]:
+        cache.put_tracks(filename, 1, 1.0, [])
+    cache.flush()
+
+    assert [x[0] for x in cache.get_stats("/a")] == ["/a", "/a/b.mkv", "/a/c/d.mkv", "/a/e.mkv"]
+    assert list(cache.get_stats("/a/b.mkv")) == [("/a/b.mkv", 1, 1.0)]
+    assert len(list(cache.get_stats("/"))) == 6
+
+
+def test_db_get_unvalidated_rotates(tmp_path):
+    cache = TrackCache(get_connection(tmp_path / "cache.db"))
+    for filename in ["/a/b.mkv", "/a/c.mkv", "/a/d.mkv", "/e.mkv"]:
+        cache.put_tracks(filename, 1, 1.0, [])
+    cache.flush()
+
+    first = [x[0] for x in cache.get_unvalidated(["/a"], 2)]
+    cache.put_validated(first, 1.0)
+    second = [x[0] for x in cache.get_unvalidated(["/a"], 2)]
+
+    assert len(first) == 2 and len(set(first + second)) == 3
+    assert cache.get_unvalidated([], 2) == []
+
+
+def test_db_content_finds_moved_file(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    old = tmp_path / "old.mkv"
+    old.write_text("video")
+    with TrackCache(connection, content=True) as cache:
+        cache.get_tracks(str(old), 5, 1.0, lambda: [{"track_type": "General"}])
+        cache.put_results(str(old), 5, 1.0, [("a", "value", "Value")])
+
+    new = tmp_path / "new.mkv"
+    old.rename(new)
+
+    def fail() -> list:
+        raise AssertionError("moved tracks should not be regenerated")
+
+    with TrackCache(connection, content=True) as cache:
+        assert cache.has_tracks(str(new), 5, 2.0)
+        assert cache.get_tracks(str(new), 5, 2.0, fail) == [{"track_type": "General"}]
+
+    assert connection.execute("SELECT filename, modified FROM videos").fetchall() == [(str(new), 2.0)]
+    assert connection.execute("SELECT count(*) FROM results").fetchone()[0] == 0
+
+
+def test_db_content_copies_existing_file(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    for name in ["one.mkv", "two.mkv"]:
+        (tmp_path / name).write_text("video")
+    with TrackCache(connection, content=True) as cache:
+        cache.get_tracks(str(tmp_path / "one.mkv"), 5, 1.0, lambda: [{"track_type": "General"}])
+
+    with TrackCache(connection, content=True) as cache:
+        assert cache.get_tracks(str(tmp_path / "two.mkv"), 5, 1.0, lambda: []) == [{"track_type": "General"}]
+
+    assert connection.execute("SELECT count(*) FROM videos").fetchone()[0] == 2
+
+
+def test_db_content_ignores_unusable_rows(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    for name in ["one.mkv", "two.mkv"]:
+        (tmp_path / name).write_text("video")
+    with TrackCache(connection, content=True, fields=frozenset(["format"])) as cache:
+        cache.get_tracks(str(tmp_path / "one.mkv"), 5, 1.0, lambda: [{"track_type": "General"}])
+
+    # Projected tracks of the same content are no use to a run keeping every field, so the file is parsed.
+    with TrackCache(connection, content=True) as cache:
+        assert not cache.has_tracks(str(tmp_path / "two.mkv"), 5, 1.0)
+    with TrackCache(
+        connection, content=True, fields=frozenset(["format"]), parse_speed=1.0, parse_speeds={"deep": 1.0}
+    ) as cache:
+        cache.prefetch([str(tmp_path / "two.mkv")], ["deep"])
+        assert not cache.has_tracks(str(tmp_path / "two.mkv"), 5, 1.0)
+    with TrackCache(connection, content=True, fields=frozenset(["format"])) as cache:
+        assert cache.has_tracks(str(tmp_path / "two.mkv"), 5, 1.0)
+
+
+def test_db_content_backfills_old_rows(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    path = tmp_path / "video.mkv"
+    path.write_text("video")
+    with TrackCache(connection) as cache:
+        cache.get_tracks(str(path), 5, 1.0, lambda: [])
+        assert not cache.has_tracks(str(tmp_path / "other.mkv"), 5, 1.0)
+
+    with TrackCache(connection, content=True, backfill_content=False) as cache:
+        cache.prefetch([str(path)])
+        cache.get_results(str(path), 5, 1.0)
+
+    assert connection.execute("SELECT content FROM videos").fetchone()[0] is None
+
+    with TrackCache(connection, content=True) as cache:
+        cache.prefetch([str(path)])
+        cache.get_results(str(path), 5, 1.0)
+
+    assert connection.execute("SELECT content FROM videos").fetchone()[0] is not None
+
+
+def test_db_sweep_drops_unlisted_rows(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection) as cache:
+        for filename in ["/a/b.mkv", "/a/c.mkv", "/a/d/e.mkv", "/a/f/g.mkv", "/h.mkv"]:
+            cache.get_tracks(filename, 1, 1.0, lambda: [])
+            cache.put_results(filename, 1, 1.0, [("a", "value", "Value")])
+
+    cache = TrackCache(connection)
+    cache.start_listing()
+    cache.prefetch(["/a/b.mkv"])
+
+    assert cache.sweep(["/a"], {"/a/f"}) == 2
+    assert [x[0] for x in connection.execute("SELECT filename FROM videos ORDER BY filename")] == [
+        "/a/b.mkv",
+        "/a/f/g.mkv",
+        "/h.mkv",
+    ]
+    assert connection.execute("SELECT count(*) FROM results").fetchone()[0] == 3
+
+
+def test_db_counts_lookups_and_misses(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    for _ in range(2):
+        with TrackCache(connection) as cache:
+            cache.get_tracks("video.mkv", 1, 1.0, lambda: [])
+            cache.get_results("video.mkv", 1, 1.0)
+
+    assert dict(connection.execute("SELECT name, value FROM counters")) == {"lookups": 2, "misses": 1}
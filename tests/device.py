@@ -0,0 +1,15 @@
+import os
+
+from videoprof.device import DeviceLimits, get_device_kind
+
+
+def test_device_kind_of_real_file(tmp_path):
+    assert get_device_kind(os.stat(tmp_path).st_dev) in ["rotational", "solid_state", "other"]
+
+
+def test_device_limits_by_kind():
+    limits = DeviceLimits(rotational=2, solid_state=0, other=3, kinds={1: "rotational", 2: "solid_state"})
+
+    assert limits.get_limit(1) == 2
+    assert limits.get_limit(2) == 1
+    assert limits.get_limit(os.makedev(0, 999)) == 3
@@ -0,0 +1,51 @@
+from videoprof.filter import has_signature, VideoFilter
+
+
+def test_filter_accepts_everything_by_default():
+    assert VideoFilter().accepts_name("movie.nfo")
+    assert VideoFilter().accepts_name("movie")
+
+
+def test_filter_extensions():
+    video_filter = VideoFilter(extensions=frozenset(["mkv"]))
+
+    assert video_filter.accepts_name("movie.MKV")
+    assert not video_filter.accepts_name("movie.nfo")
+    assert not video_filter.accepts_name("movie")
+
+
+def test_filter_exclude_extensions():
+    video_filter = VideoFilter(exclude_extensions=frozenset(["nfo"]))
+
+    assert video_filter.accepts_name("movie.mkv")
+    assert not video_filter.accepts_name("movie.nfo")
+
+
+def test_filter_signatures(tmp_path):
+    headers = {
+        "movie.mkv": b"\x1a\x45\xdf\xa3\x01\x00",
+        "movie.mp4": b"\x00\x00\x00\x20ftypisom",
+        "movie.avi": b"RIFF\x00\x00\x00\x00AVI ",
+        "movie.ts": b"\x47" + b"\x00" * 187 + b"\x47" + b"\x00" * 187,
+        "movie.m2ts": b"\x00" * 4 + b"\x47" + b"\x00" * 191 + b"\x47" + b"\x00" * 191,
+        "movie.rmvb": b".RMF\x00\x00\x00\x12",
+        "movie.nfo": b"<movie></movie>",
+    }
+    for name, header in headers.items():
+        (tmp_path / name).write_bytes(header)
+
+    video_filter = VideoFilter(signatures=True)
+
+    assert [x for x in headers if video_filter.accepts_file(str(tmp_path / x))] == [
+        "movie.mkv",
+        "movie.mp4",
+        "movie.avi",
+        "movie.ts",
+        "movie.m2ts",
+        "movie.rmvb",
+    ]
+    assert VideoFilter().accepts_file(str(tmp_path / "movie.nfo"))
+
+
+def test_filter_signature_missing_file(tmp_path):
+    assert not has_signature(str(tmp_path / "missing.mkv"))
@@ -0,0 +1,63 @@
+import os
+
+from videoprof.ignore import is_ignored, parse_rule, parse_rules, read_rules
+
+
+def test_ignore_comments_and_blank_lines():
+    assert parse_rule("# comment", "/base") is None
+    assert parse_rule("   \n", "/base") is None
+    assert parse_rule("/", "/base") is None
+
+
+def test_ignore_unanchored_matches_any_depth():
+    rules = parse_rules(["@eaDir"], "/base")
+
+    assert is_ignored(rules, "/base/@eaDir", True)
+    assert is_ignored(rules, "/base/a/b/@eaDir", True)
+    assert not is_ignored(rules, "/base/a/@eaDir2", True)
+    assert not is_ignored(rules, "/other/@eaDir", True)
+
+
+def test_ignore_anchored():
+    rules = parse_rules(["/Sample", "a/*.mkv"], "/base")
+
+    assert is_ignored(rules, "/base/Sample", True)
+    assert not is_ignored(rules, "/base/a/Sample", True)
+    assert is_ignored(rules, "/base/a/one.mkv", False)
+    assert not is_ignored(rules, "/base/a/b/one.mkv", False)
+
+
+def test_ignore_directory_only():
+    rules = parse_rules(["Sample/"], "/base")
+
+    assert is_ignored(rules, "/base/a/Sample", True)
+    assert not is_ignored(rules, "/base/a/Sample", False)
+
+
+def test_ignore_globs():
+    rules = parse_rules(["**/extras/**", "*.sample.[mM]kv", "clip?.mp4", "[!a]*.avi"], "/base")
+
+    assert is_ignored(rules, "/base/extras/one.mkv", False)
+    assert is_ignored(rules, "/base/a/extras/b/one.mkv", False)
+    assert is_ignored(rules, "/base/a/one.sample.Mkv", False)
+    assert is_ignored(rules, "/base/clip1.mp4", False)
+    assert not is_ignored(rules, "/base/clip10.mp4", False)
+    assert is_ignored(rules, "/base/b.avi", False)
+    assert not is_ignored(rules, "/base/a.avi", False)
+
+
+def test_ignore_negate_last_rule_wins():
+    rules = parse_rules(["*.mkv", "!keep.mkv", "\\!bang.mkv"], "/base")
+
+    assert is_ignored(rules, "/base/one.mkv", False)
+    assert not is_ignored(rules, "/base/keep.mkv", False)
+    assert is_ignored(rules, "/base/!bang.mkv", False)
+
+
+def test_ignore_read_rules(tmp_path):
+    (tmp_path / ".videoprofignore").write_text("# trailers\ntrailers/\n")
+
+    rules = read_rules(str(tmp_path))
+
+    assert is_ignored(rules, os.path.join(str(tmp_path), "a", "trailers"), True)
+    assert read_rules(str(tmp_path / "missing")) == []
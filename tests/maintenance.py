@@ -0,0 +1,59 @@
+from videoprof.db import get_connection, TrackCache
+from videoprof.maintenance import clear_quarantine, get_quarantine, get_stats, prune, vacuum
+
+
+def cache_files(tmp_path, names):
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection) as cache:
+        for name in names:
+            path = tmp_path / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(name)
+            cache.get_tracks(str(path), 1, 1.0, lambda: [])
+            cache.put_results(str(path), 1, 1.0, [("a", "value", "Value")])
+    return connection
+
+
+def test_maintenance_prune(tmp_path):
+    connection = cache_files(tmp_path, ["a/one.mkv", "a/two.mkv", "b/three.mkv", "c/four.mkv"])
+    (tmp_path / "a" / "one.mkv").unlink()
+    (tmp_path / "b" / "three.mkv").unlink()
+    (tmp_path / "b").rmdir()
+    (tmp_path / "c" / "four.mkv").unlink()
+
+    assert prune(connection, [str(tmp_path / "a"), str(tmp_path / "b")], batch_size=1) == 2
+    assert prune(connection) == 1
+    assert [x[0] for x in connection.execute("SELECT filename FROM videos")] == [
+        str(tmp_path / "a" / "two.mkv")
+    ]
+    assert connection.execute("SELECT count(*) FROM results").fetchone()[0] == 1
+
+
+def test_maintenance_stats_and_vacuum(tmp_path):
+    connection = cache_files(tmp_path, ["one.mkv", "two.mkv"])
+    vacuum(connection)
+    stats = get_stats(connection, tmp_path / "cache.db")
+
+    assert stats["files"] == 2
+    assert stats["json tracks"] == 2
+    assert stats["results"] == 2
+    assert stats["lookups"] == 0 and stats["hit ratio"] == 0.0
+    assert stats["bytes"] > 0
+
+
+def test_maintenance_quarantine(tmp_path):
+    connection = cache_files(tmp_path, [])
+    cache = TrackCache(connection)
+    for name in ["a/one.mkv", "b/two.mkv"]:
+        (tmp_path / name).parent.mkdir()
+        (tmp_path / name).write_text(name)
+        cache.put_quarantine(str(tmp_path / name), 1, 1.0, "Timed out", 2.0)
+    (tmp_path / "b" / "two.mkv").unlink()
+
+    assert [x[0] for x in get_quarantine(connection, [str(tmp_path / "a")])] == [
+        str(tmp_path / "a" / "one.mkv")
+    ]
+    assert prune(connection) == 1
+    assert get_stats(connection, tmp_path / "cache.db")["quarantined"] == 1
+    assert clear_quarantine(connection) == 1
+    assert get_quarantine(connection) == []
@@ -0,0 +1,20 @@
+from typing import cast
+
+from videoprof.mediainfo import MediaInfoList, TrackIndex
+
+
+def test_mediainfo_track_index():
+    media_info = cast(
+        MediaInfoList,
+        [
+            {"track_type": "General"},
+            {"track_type": "Audio", "format": "AC-3"},
+            {"track_type": "Audio", "format": "DTS"},
+        ],
+    )
+    track_index = TrackIndex(media_info)
+
+    assert track_index.get_first("Audio") == {"track_type": "Audio", "format": "AC-3"}
+    assert [x["format"] for x in track_index.get_all("Audio")] == ["AC-3", "DTS"]
+    assert track_index.get_first("Video") is None
+    assert track_index.get_all("Video") == []
@@ -0,0 +1,356 @@
+import struct
+
+from videoprof.backend import LibraryBackend, NativeBackend
+from videoprof.native import NATIVE_FIELDS, probe_native
+
+# Just enough of a Matroska and MP4 muxer to write the headers of files without any frames.
+
+AC3_5_1 = bytes([0x10, 0x3D, 0xC0])
+AAC_STEREO = bytes([0x11, 0x90])
+AAC_5_1 = bytes([0x11, 0xB0])
+
+
+def element(id, payload):
+    if isinstance(payload, int):
+        payload = payload.to_bytes(max(1, (payload.bit_length() + 7) // 8), "big")
+    elif isinstance(payload, str):
+        payload = payload.encode()
+    elif isinstance(payload, list):
+        payload = b"".join(payload)
+
+    size = next(
+        ((1 << (7 * x)) | len(payload)).to_bytes(x, "big") for x in range(1, 9) if len(payload) < 127 ** x
+    )
+    return id.to_bytes((id.bit_length() + 7) // 8, "big") + size + payload
+
+
+def make_mkv(tracks, doctype="matroska"):
+    entries = []
+    for number, track in enumerate(tracks, 1):
+        children = [element(0xD7, number), element(0x83, track["type"]), element(0x86, track["codec"])]
+        if "private" in track:
+            children.append(element(0x63A2, track["private"]))
+        if track["type"] == 1:
+            children.append(element(0x23E383, track["duration"]))
+            children.append(element(0xE0, [element(0xB0, track["width"]), element(0xBA, track["height"])]))
+        if track["type"] == 2:
+            children.append(
+                element(0xE1, [element(0xB5, struct.pack(">d", 48000)), element(0x9F, track["channels"])])
+            )
+        entries.append(element(0xAE, children))
+
+    header = element(
+        0x1A45DFA3, [element(0x4286, 1), element(0x4282, doctype), element(0x4287, 4), element(0x4285, 2)]
+    )
+    info = element(0x1549A966, [element(0x2AD7B1, 1000000), element(0x4D80, "test")])
+    return header + element(
+        0x18538067, [info, element(0x1654AE6B, entries), element(0x1F43B675, [element(0xE7, 0)])]
+    )
+
+
+class Bits:
+    def __init__(self):
+        self.bits = []
+
+    def u(self, count, value):
+        self.bits += [(value >> (count - 1 - x)) & 1 for x in range(count)]
+
+    def ue(self, value):
+        self.u((value + 1).bit_length() - 1, 0)
+        self.u((value + 1).bit_length(), value + 1)
+
+    def to_bytes(self):
+        bits = self.bits + [1] + [0] * (7 - len(self.bits) % 8)
+        return bytes(int("".join(map(str, bits[x : x + 8])), 2) for x in range(0, len(bits), 8))
+
+
+def make_avcc(profile=100, bit_depth=8, frames_only=1, width=1920, height=1080):
+    bits = Bits()
+    bits.u(8, profile)
+    bits.u(16, 40)
+    bits.ue(0)
+    if profile == 100:
+        for value in [1, bit_depth - 8, bit_depth - 8]:
+            bits.ue(value)
+        bits.u(2, 0)
+    for value in [0, 2, 1]:
+        bits.ue(value)
+    bits.u(1, 0)
+    map_units = (height + 15) // 16 if frames_only else (height + 31) // 32
+    bits.ue((width + 15) // 16 - 1)
+    bits.ue(map_units - 1)
+    bits.u(1, frames_only)
+    if not frames_only:
+        bits.u(1, 1)
+    bits.u(1, 1)
+    crop = (map_units * 16 * (2 - frames_only) - height) // (2 * (2 - frames_only))
+    bits.u(1, 1 if crop else 0)
+    for value in [0, 0, 0, crop] if crop else []:
+        bits.ue(value)
+    bits.u(1, 0)
+
+    sps = bytes([0x67]) + bits.to_bytes()
+    pps = bytes([0x68, 0xEB, 0xE3, 0xCB, 0x22, 0xC0])
+    return (
+        bytes([1, profile, 0, 40, 0xFF, 0xE1])
+        + struct.pack(">H", len(sps))
+        + sps
+        + bytes([1])
+        + struct.pack(">H", len(pps))
+        + pps
+    )
+
+
+def make_hvcc(bit_depth=10):
+    depth = 0xF8 | (bit_depth - 8)
+    return bytes(
+        [1, 2, 0x20, 0, 0, 0, 0x90, 0, 0, 0, 0, 0, 150, 0xF0, 0, 0xFC, 0xFD, depth, depth, 0, 0, 0x0F, 0]
+    )
+
+
+def box(kind, *children, version=None):
+    payload = b"".join(children)
+    if version is not None:
+        payload = struct.pack(">I", version) + payload
+    return struct.pack(">I", 8 + len(payload)) + kind.encode() + payload
+
+
+def make_visual_entry(kind, width, height, *children):
+    return box(
+        kind,
+        bytes(6),
+        struct.pack(">H", 1),
+        bytes(16),
+        struct.pack(">HHII", width, height, 0x480000, 0x480000),
+        bytes(4),
+        struct.pack(">H", 1),
+        bytes(32),
+        struct.pack(">Hh", 24, -1),
+        *children,
+    )
+
+
+def make_audio_entry(kind, channels, *children):
+    return box(
+        kind,
+        bytes(6),
+        struct.pack(">H", 1),
+        bytes(8),
+        struct.pack(">HH", channels, 16),
+        bytes(4),
+        struct.pack(">I", 48000 << 16),
+        *children,
+    )
+
+
+def make_esds(object_type, config):
+    decoder = bytes([4, 15 + len(config), object_type, 0x15]) + bytes(11) + bytes([5, len(config)]) + config
+    return box(
+        "esds",
+        bytes([3, 6 + len(decoder)]) + struct.pack(">HB", 1, 0) + decoder + bytes([6, 1, 2]),
+        version=0,
+    )
+
+
+def make_trak(handler, timescale, entry, deltas):
+    stts = box(
+        "stts", struct.pack(">I", len(deltas)), *[struct.pack(">II", 10, x) for x in deltas], version=0
+    )
+    stsd = box("stsd", struct.pack(">I", 1), entry, version=0)
+    stbl = box(
+        "stbl",
+        stsd,
+        stts,
+        box("stsz", bytes(8), version=0),
+        box("stsc", bytes(4), version=0),
+        box("stco", bytes(4), version=0),
+    )
+    mdhd = box("mdhd", bytes(8), struct.pack(">IIHH", timescale, 10 * sum(deltas), 0x55C4, 0), version=0)
+    hdlr = box("hdlr", bytes(4), handler.encode(), bytes(13), version=0)
+    return box("trak", box("tkhd", bytes(80), version=3), box("mdia", mdhd, hdlr, box("minf", stbl)))
+
+
+def make_mp4(traks, brand="isom"):
+    mvhd = box(
+        "mvhd", bytes(8), struct.pack(">II", 1000, 0), bytes(80), struct.pack(">I", len(traks) + 1), version=0
+    )
+    return (
+        box("ftyp", brand.encode(), struct.pack(">I", 512), brand.encode())
+        + box("moov", mvhd, *traks)
+        + box("mdat")
+    )
+
+
+def video(codec, private, duration, width=1920, height=1080):
+    return {
+        "type": 1,
+        "codec": codec,
+        "private": private,
+        "duration": duration,
+        "width": width,
+        "height": height,
+    }
+
+
+def audio(codec, channels):
+    return {"type": 2, "codec": codec, "channels": channels}
+
+
+def make_avc_trak(timescale, deltas, avcc=None, width=1920, height=1080):
+    entry = make_visual_entry("avc1", width, height, box("avcC", avcc or make_avcc()))
+    return make_trak("vide", timescale, entry, deltas)
+
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def get_native_fields(tracks):
+    # libmediainfo also gives AAC tracks a frame rate, which nothing reads from audio tracks.
+    return [
+        {
+            k: v
+            for k, v in x.items()
+            if k == "track_type"
+            or k in NATIVE_FIELDS
+            and not (k == "frame_rate" and x["track_type"] == "Audio")
+        }
+        for x in tracks
+    ]
+
+
+def test_native_matroska_matches_library(tmp_path):
+    filename = write(
+        tmp_path,
+        "video.mkv",
+        make_mkv(
+            [
+                video("V_MPEG4/ISO/AVC", make_avcc(), 41708333),
+                audio("A_AC3", 6),
+                audio("A_AAC", 2),
+                {"type": 17, "codec": "S_TEXT/UTF8"},
+                {"type": 17, "codec": "S_HDMV/PGS"},
+            ]
+        ),
+    )
+    tracks = probe_native(filename)
+
+    assert tracks == get_native_fields(LibraryBackend().probe([filename])[filename])
+    assert [x["format"] for x in tracks] == ["Matroska", "AVC", "AC-3", "AAC", "UTF-8", "PGS"]
+    assert tracks[1] == {
+        "track_type": "Video",
+        "format": "AVC",
+        "width": 1920,
+        "height": 1080,
+        "frame_rate": "23.976",
+        "bit_depth": 8,
+        "scan_type": "Progressive",
+    }
+
+
+def test_native_matroska_variants(tmp_path):
+    filenames = [
+        write(tmp_path, "audio.webm", make_mkv([audio("A_OPUS", 2)], "webm")),
+        write(tmp_path, "main.mkv", make_mkv([video("V_MPEG4/ISO/AVC", make_avcc(77), 40000000)])),
+        write(
+            tmp_path, "high10.mkv", make_mkv([video("V_MPEG4/ISO/AVC", make_avcc(bit_depth=10), 33366667)])
+        ),
+    ]
+    for filename in filenames:
+        assert probe_native(filename) == get_native_fields(LibraryBackend().probe([filename])[filename])
+
+    # libmediainfo only reads the bit depth of HEVC from its frames.
+    hevc = write(
+        tmp_path, "hevc.mkv", make_mkv([video("V_MPEGH/ISO/HEVC", make_hvcc(10), 41708333, 3840, 2160)])
+    )
+    assert probe_native(hevc)[1] == {
+        "track_type": "Video",
+        "format": "HEVC",
+        "width": 3840,
+        "height": 2160,
+        "frame_rate": "23.976",
+        "bit_depth": 10,
+    }
+
+
+def test_native_mp4_matches_library(tmp_path):
+    filename = write(
+        tmp_path,
+        "video.mp4",
+        make_mp4(
+            [
+                make_avc_trak(24000, [1001]),
+                make_trak("soun", 48000, make_audio_entry("mp4a", 2, make_esds(0x40, AAC_5_1)), [1024]),
+                make_trak("soun", 48000, make_audio_entry("mp4a", 2, make_esds(0x40, AAC_STEREO)), [1024]),
+            ]
+        ),
+    )
+    mov = write(
+        tmp_path,
+        "video.mov",
+        make_mp4([make_avc_trak(25, [1], make_avcc(77, width=1280, height=720), 1280, 720)], "qt  "),
+    )
+
+    for name in [filename, mov]:
+        assert probe_native(name) == get_native_fields(LibraryBackend().probe([name])[name])
+    assert [x.get("channel_s") for x in probe_native(filename)] == [None, None, 6, 2]
+    assert probe_native(mov)[1]["frame_rate"] == "25.000"
+
+
+def test_native_mp4_audio_channels(tmp_path):
+    # libmediainfo reads these channel counts from frames; the headers give the same counts.
+    filename = write(
+        tmp_path,
+        "audio.mp4",
+        make_mp4(
+            [
+                make_trak("soun", 48000, make_audio_entry("ac-3", 2, box("dac3", AC3_5_1)), [1536]),
+                make_trak("soun", 48000, make_audio_entry("mp4a", 2, make_esds(0x6B, b"")), [1152]),
+            ]
+        ),
+    )
+
+    assert probe_native(filename) == [
+        {"track_type": "General", "format": "MPEG-4"},
+        {"track_type": "Audio", "format": "AC-3", "channel_s": 6},
+        {"track_type": "Audio", "format": "MPEG Audio", "channel_s": 2},
+    ]
+
+
+def test_native_unsupported(tmp_path):
+    filenames = [
+        write(
+            tmp_path,
+            "interlaced.mkv",
+            make_mkv([video("V_MPEG4/ISO/AVC", make_avcc(frames_only=0), 40000000)]),
+        ),
+        write(tmp_path, "dts.mkv", make_mkv([audio("A_DTS", 6)])),
+        write(tmp_path, "mpeg2.mkv", make_mkv([video("V_MPEG2", b"", 40000000, 720, 576)])),
+        write(tmp_path, "vfr.mp4", make_mp4([make_avc_trak(90000, [3754, 3750])])),
+        write(tmp_path, "truncated.mkv", make_mkv([audio("A_AC3", 6)])[:40]),
+        write(tmp_path, "video.avi", b"RIFF" + bytes(60)),
+        str(tmp_path / "missing.mkv"),
+    ]
+
+    assert [probe_native(x) for x in filenames] == [None] * len(filenames)
+
+
+def test_native_backend(tmp_path, monkeypatch):
+    native = write(tmp_path, "audio.mkv", make_mkv([audio("A_AC3", 6)]))
+    other = write(tmp_path, "audio.mka", make_mkv([audio("A_DTS", 6)]))
+    probed = []
+    monkeypatch.setattr(
+        "videoprof.backend.get_media_info_list", lambda x, parse_speed: probed.append(x) or []
+    )
+
+    backend = NativeBackend(frozenset(["format", "channel_s"]))
+    assert backend.probe([native, other]) == {native: probe_native(native), other: []}
+    assert probed == [other]
+    assert backend.get_batch_size() == 1
+
+    probed.clear()
+    assert NativeBackend(frozenset(["format", "format_profile"])).probe([native]) == {native: []}
+    assert NativeBackend().probe([native]) == {native: []}
+    assert probed == [native, native]
@@ -0,0 +1,111 @@
+import pytest
+import threading
+import time
+
+from videoprof import backend
+from videoprof.config import make_attributes
+from videoprof.db import get_connection, TrackCache
+from videoprof.pipeline import analyze_videos, plan_videos, read_ahead
+from videoprof.walk import WalkEntry
+
+
+def test_pipeline_plans_one_chunk_ahead(tmp_path):
+    cache = TrackCache(get_connection(tmp_path / "cache.db"), chunk_size=2)
+    entries = [WalkEntry(f"video{x}.mkv", f"/video{x}.mkv", 1, 1.0, "/") for x in range(5)]
+    planned = []
+
+    for video, entry in plan_videos(entries, cache, ["a"]):
+        planned.append((video.get_filename(), len(cache.plan) + cache.offset))
+        assert entry.filename == video.get_filename()
+
+    assert planned == [
+        ("/video0.mkv", 2),
+        ("/video1.mkv", 2),
+        ("/video2.mkv", 4),
+        ("/video3.mkv", 4),
+        ("/video4.mkv", 5),
+    ]
+    assert cache.fingerprints == {"a"}
+
+
+def test_pipeline_analyzes_lazily(tmp_path):
+    attributes = make_attributes()
+    cache = TrackCache(get_connection(tmp_path / "cache.db"))
+    for x in range(3):
+        cache.put_tracks(f"/video{x}.mkv", 1, 1.0, [{"track_type": "General"}])
+    entries = [WalkEntry(f"video{x}.mkv", f"/video{x}.mkv", 1, 1.0) for x in range(3)]
+
+    items = analyze_videos(plan_videos(entries, cache, []), attributes, cache, 1)
+    video, _ = next(items)
+
+    assert len(video.get_qualities()) > 0
+    assert cache.get_results("/video1.mkv", 1, 1.0) == {}
+    assert len(list(items)) == 2
+
+
+def test_pipeline_quarantines_failed_probes(tmp_path, monkeypatch):
+    def probe(filename, parse_speed):
+        if filename.endswith("bad.mkv"):
+            raise ValueError("unreadable")
+        return [{"track_type": "General"}]
+
+    monkeypatch.setattr(backend, "get_media_info_list", probe)
+    attributes = make_attributes()
+    cache = TrackCache(get_connection(tmp_path / "cache.db"))
+    entries = [WalkEntry(name, str(tmp_path / name), 1, 1.0) for name in ["bad.mkv", "good.mkv"]]
+
+    first = [x.filename for _, x in analyze_videos(plan_videos(entries, cache, []), attributes, cache, 1, 5)]
+    monkeypatch.setattr(backend, "get_media_info_list", None)
+    second = [x.filename for _, x in analyze_videos(plan_videos(entries, cache, []), attributes, cache, 1, 5)]
+
+    assert first == second == [str(tmp_path / "good.mkv")]
+    assert cache.connection.execute("SELECT filename, size, modified, reason FROM quarantine").fetchall() == [
+        (str(tmp_path / "bad.mkv"), 1, 1.0, "ValueError: unreadable")
+    ]
+
+
+def test_pipeline_read_ahead_runs_bounded_distance_ahead():
+    produced = []
+    threads = set()
+
+    def produce():
+        for x in range(10):
+            produced.append(x)
+            threads.add(threading.current_thread())
+            yield x
+
+    items = read_ahead(produce(), 2)
+    assert next(items) == 0
+    while len(produced) < 4:
+        time.sleep(0.01)
+    time.sleep(0.05)
+
+    assert len(produced) == 4
+    assert list(items) == list(range(1, 10))
+    assert threading.current_thread() not in threads
+
+
+def test_pipeline_read_ahead_raises_and_stops():
+    def produce():
+        yield 1
+        raise OSError("unreachable share")
+
+    items = read_ahead(produce())
+    assert next(items) == 1
+    with pytest.raises(OSError):
+        next(items)
+
+    produced = []
+
+    def endless():
+        while True:
+            produced.append(None)
+            yield len(produced)
+
+    items = read_ahead(endless(), 1)
+    assert next(items) == 1
+    items.close()
+    count = len(produced)
+
+    assert count <= 3
+    assert len(produced) == count
@@ -0,0 +1,161 @@
+import os
+import time
+
+from dataclasses import dataclass
+from pathlib import Path
+
+from videoprof import backend
+from videoprof.backend import CliBackend, ProbeBackend
+from videoprof.db import get_connection, TrackCache
+from videoprof.device import DeviceLimits
+from videoprof.mediainfo import get_media_info_list
+from videoprof.pool import probe_media_info_lists, probe_serially, ProbeFailure, ProbePool
+from videoprof.video import SingleVideo
+
+from .backend import make_mediainfo
+
+
+def test_pool_probes_uncached_videos_in_order(tmp_path):
+    cache = TrackCache(get_connection(tmp_path / "cache.db"))
+    paths = [tmp_path / f"video{x}.txt" for x in range(5)]
+    for path in paths:
+        path.write_text(path.name)
+
+    videos = [SingleVideo(path=path) for path in paths]
+    media_info_lists = list(probe_media_info_lists(videos, cache, 2))
+
+    assert media_info_lists == [get_media_info_list(str(path)) for path in paths]
+
+
+def test_pool_skips_cached_videos(tmp_path):
+    cache = TrackCache(get_connection(tmp_path / "cache.db"))
+    path = tmp_path / "video.txt"
+    path.write_text("video")
+
+    video = SingleVideo(path=path)
+    video.get_cached_media_info_list(cache)
+
+    assert list(probe_media_info_lists([SingleVideo(path=Path(path))], cache, 2)) == [None]
+
+
+def test_pool_fails_slow_and_broken_files(tmp_path, monkeypatch):
+    def probe(filename, parse_speed):
+        name = Path(filename).stem
+        if name == "slow":
+            time.sleep(60)
+        elif name == "broken":
+            raise ValueError("unreadable")
+        elif name == "crash":
+            os._exit(3)
+        return [{"track_type": "General", "file_name": name}]
+
+    monkeypatch.setattr(backend, "get_media_info_list", probe)
+    cache = TrackCache(get_connection(tmp_path / "cache.db"))
+    names = ["one", "slow", "broken", "crash", "two"]
+    for name in names:
+        (tmp_path / f"{name}.mkv").write_text(name)
+
+    videos = [SingleVideo(path=tmp_path / f"{name}.mkv") for name in names]
+    probes = list(probe_media_info_lists(videos, cache, 2, 0.5))
+
+    assert probes == [
+        [{"track_type": "General", "file_name": "one"}],
+        ProbeFailure("Timed out after 0.5 seconds"),
+        ProbeFailure("ValueError: unreadable"),
+        ProbeFailure("Worker exited with code 3"),
+        [{"track_type": "General", "file_name": "two"}],
+    ]
+
+
+def test_pool_serial_probe_fails_broken_files(tmp_path, monkeypatch):
+    def probe(filename, parse_speed):
+        if Path(filename).stem == "broken":
+            raise OSError("unreadable")
+        return [{"track_type": "General"}]
+
+    monkeypatch.setattr(backend, "get_media_info_list", probe)
+    cache = TrackCache(get_connection(tmp_path / "cache.db"))
+    videos = [SingleVideo(path=tmp_path / f"{name}.mkv", stat=(1, 1.0)) for name in ["broken", "one"]]
+
+    assert list(probe_serially(videos, cache)) == [
+        ProbeFailure("OSError: unreadable"),
+        [{"track_type": "General"}],
+    ]
+
+
+def test_pool_reads_ahead_to_other_devices(tmp_path, monkeypatch):
+    def probe(filename, parse_speed):
+        start = time.monotonic()
+        time.sleep(0.05)
+        return [{"track_type": "General", "start": start, "end": time.monotonic()}]
+
+    monkeypatch.setattr(backend, "get_media_info_list", probe)
+    cache = TrackCache(get_connection(tmp_path / "cache.db"))
+    videos = [
+        SingleVideo(path=tmp_path / f"{device}-{x}.mkv", stat=(1, 1.0), file_id=(device, x))
+        for device, count in [(1, 20), (2, 2)]
+        for x in range(count)
+    ]
+    limits = DeviceLimits(kinds={1: "rotational", 2: "rotational"})
+    probes = [x[0] for x in probe_media_info_lists(videos, cache, 2, limits=limits)]
+
+    # The second disk is read while the first is still busy, not once the first has almost been read.
+    assert len(probes) == 22
+    assert min(x["start"] for x in probes[20:]) < sorted(x["end"] for x in probes[:20])[1]
+
+
+@dataclass
+class BatchBackend(ProbeBackend):
+    batch_size: int
+
+    def get_batch_size(self):
+        return self.batch_size
+
+    def check(self):
+        pass
+
+    def probe(self, filenames):
+        return {x: [{"track_type": "General", "batch": len(filenames)}] for x in filenames}
+
+
+def test_pool_probes_full_batches(tmp_path):
+    cache = TrackCache(get_connection(tmp_path / "cache.db"))
+    videos = [SingleVideo(path=tmp_path / f"{x}.mkv", stat=(1, 1.0), file_id=(1, x)) for x in range(40)]
+    probes = list(probe_media_info_lists(videos, cache, 1, backend=BatchBackend(8)))
+
+    assert [x[0]["batch"] for x in probes] == [8] * 40
+
+
+def test_pool_limits_reads_per_device():
+    probe_pool = ProbePool(3, limits=DeviceLimits(kinds={1: "rotational", 2: "other"}))
+    probe_pool.submit("/a/b/two.mkv", 1, 20)
+    probe_pool.submit("/a/b/one.mkv", 1, 10)
+    probe_pool.submit("/a/c.mkv", 1, 5)
+    probe_pool.submit("/d/e.mkv", 2, 2)
+    probe_pool.submit("/d/f.mkv", 2, 1)
+
+    def take():
+        taken = probe_pool.take()
+        return None if taken is None else taken[1][0][3]
+
+    assert [take(), take(), take(), take()] == ["/a/c.mkv", "/d/f.mkv", "/d/e.mkv", None]
+    assert probe_pool.reading == {1: 1, 2: 2}
+
+    probe_pool.reading[1] -= 1
+    assert [take(), take()] == ["/a/b/one.mkv", None]
+
+
+def test_pool_retries_failed_batches_alone(tmp_path):
+    cache = TrackCache(get_connection(tmp_path / "cache.db"))
+    names = ["one", "slow", "two", "three"]
+    for name in names:
+        (tmp_path / f"{name}.mkv").write_text(name)
+
+    cli = CliBackend(command=make_mediainfo(tmp_path), batch_size=2)
+    videos = [SingleVideo(path=tmp_path / f"{name}.mkv") for name in names]
+    probes = list(probe_media_info_lists(videos, cache, 1, 1, backend=cli))
+
+    assert probes[1] == ProbeFailure("Timed out after 1 seconds")
+    assert [probes[0], *probes[2:]] == [
+        get_media_info_list(str(tmp_path / f"{x}.mkv")) for x in ["one", "two", "three"]
+    ]
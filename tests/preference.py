@@ -1,5 +1,7 @@
+import re
+
 from videoprof.level import Level
-from videoprof.preference import SinglePreference
+from videoprof.preference import PreferenceMatcher, SinglePreference
 
 
 def test_preference_title():
@@ -55,3 +57,40 @@ def test_preference_hash():
 
     assert preference1.__hash__() != preference2.__hash__()
     assert preference1.__hash__() == preference3.__hash__()
+
+
+def test_preference_literal():
+    assert SinglePreference(pattern="test", title="Test").get_literal() == "test"
+    assert SinglePreference(pattern="test[3-8]", title="Test").get_literal() is None
+
+
+def test_preference_matcher_first_match_wins():
+    preferences = [
+        SinglePreference(pattern="test[1-2]", title="Pattern"),
+        SinglePreference(pattern="test1", title="Literal"),
+        SinglePreference(pattern="test2", title="Later"),
+        SinglePreference(pattern="test3", title="Literal3"),
+        SinglePreference(pattern="test[3-4]", title="Pattern3"),
+    ]
+    matcher = PreferenceMatcher(preferences)
+
+    def create(value):
+        return SinglePreference(pattern=re.escape(value), title=value)
+
+    assert matcher.match("test1", create).get_title() == "Pattern"
+    assert matcher.match("test3", create).get_title() == "Literal3"
+    assert matcher.match("test4", create).get_title() == "Pattern3"
+
+
+def test_preference_matcher_learns_unmatched():
+    preferences = [SinglePreference(pattern="test", title="Test")]
+    matcher = PreferenceMatcher(preferences)
+
+    def create(value):
+        return SinglePreference(pattern=re.escape(value), title=value)
+
+    learned = matcher.match("2.0", create)
+
+    assert preferences == [SinglePreference(pattern="test", title="Test"), learned]
+    assert matcher.match("2.0", create) is learned
+    assert matcher.match("2.0x", create) is learned
@@ -0,0 +1,78 @@
+import pytest
+
+from videoprof.config import make_attributes
+from videoprof.db import get_connection, TrackCache
+from videoprof.query import parse_filter, ResultQuery
+
+
+def get_attribute(attributes, title):
+    return next(x for x in attributes if x.get_title() == title)
+
+
+def make_query(tmp_path, **kwargs):
+    attributes = make_attributes()
+    codec = get_attribute(attributes, "Video Codec").get_fingerprint()
+    container = get_attribute(attributes, "Container").get_fingerprint()
+    connection = get_connection(tmp_path / "cache.db")
+
+    with TrackCache(connection) as cache:
+        cache.put_results("/lib/tv/a.mkv", 1, 1.0, [(codec, "HEVC", "HEVC"), (container, "Matroska", "MKV")])
+        cache.put_results("/lib/tv/b.mkv", 1, 1.0, [(codec, "AVC", "AVC"), (container, None, None)])
+        cache.put_results("/lib/movies/c.mkv", 1, 1.0, [(codec, "HEVC", "HEVC")])
+        cache.put_results("/lib/movies/d.avi", 1, 1.0, [(codec, "XviD", "XviD")])
+        cache.put_results("/lib/tv2/e.mkv", 1, 1.0, [(codec, "HEVC", "HEVC")])
+        cache.put_results("/lib/tv/old.mkv", 1, 1.0, [("stale", "HEVC", "HEVC")])
+
+    return ResultQuery(connection, attributes, **kwargs)
+
+
+def test_query_parse_filter():
+    attributes = make_attributes()
+
+    assert parse_filter("video codec = HEVC", attributes).target == "HEVC"
+    assert parse_filter("Video Codec!=HEVC", attributes).negate
+    with pytest.raises(ValueError):
+        parse_filter("Video Codec", attributes)
+    with pytest.raises(ValueError):
+        parse_filter("Codec=HEVC", attributes)
+
+
+def test_query_count(tmp_path):
+    assert make_query(tmp_path).count() == 5
+
+
+def test_query_filters_under(tmp_path):
+    attributes = make_attributes()
+
+    def count(filters, under=()):
+        return make_query(
+            tmp_path, filters=[parse_filter(x, attributes) for x in filters], under=under
+        ).count()
+
+    assert count(["Video Codec=HEVC"]) == 3
+    assert count(["Video Codec=HEVC"], ["/lib/tv"]) == 1
+    assert count(["Video Codec=HEVC"], ["/lib/tv", "/lib/movies"]) == 2
+    assert count(["Video Codec!=HEVC"]) == 2
+    assert count(["Video Codec=HEVC", "Container=MKV"]) == 1
+
+
+def test_query_only_flagged(tmp_path):
+    query = make_query(tmp_path, only_flagged=True)
+
+    assert [filename for filename, _ in query.get_files()] == ["/lib/movies/d.avi"]
+
+
+def test_query_preference_counts(tmp_path):
+    query = make_query(tmp_path, under=["/lib/tv"])
+
+    counts = {x.get_title(): count for x, count in query.get_preference_counts().items()}
+
+    assert counts == {"HEVC": 1, "AVC": 1, "MKV": 1}
+
+
+def test_query_files(tmp_path):
+    files = dict(make_query(tmp_path, under=["/lib/tv"]).get_files())
+
+    assert sorted(files) == ["/lib/tv/a.mkv", "/lib/tv/b.mkv"]
+    assert sorted(x.preference.get_title() for x in files["/lib/tv/a.mkv"]) == ["HEVC", "MKV"]
+    assert [x.value for x in files["/lib/tv/b.mkv"]] == ["AVC"]
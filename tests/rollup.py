@@ -0,0 +1,73 @@
+from pathlib import Path
+
+from videoprof.config import make_attributes
+from videoprof.db import get_connection
+from videoprof.rollup import get_config_fingerprint, load_rollups, roll_up, Rollup, save_rollups
+from videoprof.quality import Quality
+from videoprof.video import SingleVideo
+from videoprof.walk import WalkEntry
+
+
+def make_item(attribute, filename, value, root="/root"):
+    preference = attribute.match(value)
+    video = SingleVideo(Path(filename), [Quality(attribute=attribute, preference=preference, value=value)])
+    return video, WalkEntry(filename, filename, 1, 1.0, root=root)
+
+
+def test_rollup_every_level():
+    attribute = make_attributes()[0]
+    rollups = {}
+    items = [
+        make_item(attribute, "/root/a/b/one.mkv", "1"),
+        make_item(attribute, "/root/a/two.mkv", "1"),
+        make_item(attribute, "/root/three.mkv", "2"),
+        make_item(attribute, "/four.mkv", "2", root=None),
+    ]
+
+    assert list(roll_up(items, rollups)) == items
+    assert {x: rollup.video_count for x, rollup in rollups.items()} == {
+        "/root/a/b": 1,
+        "/root/a": 2,
+        "/root": 3,
+    }
+    assert sorted(rollups["/root"].badges.values()) == [1, 2]
+
+
+def test_rollup_save_and_load(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    attributes = make_attributes()
+    attribute = attributes[0]
+    config = get_config_fingerprint(attributes)
+    rollups = {}
+    for _ in roll_up(
+        [make_item(attribute, "/root/a/b/one.mkv", "1"), make_item(attribute, "/root/c/two.mkv", "2")],
+        rollups,
+    ):
+        pass
+    rollups["/root/d"] = Rollup()
+
+    save_rollups(connection, ["/root"], rollups, config)
+    loaded = load_rollups(connection, make_attributes(), "/root", 1)
+
+    assert sorted(loaded) == ["/root/a", "/root/c", "/root/d"]
+    assert [(x.value, count) for x, count in loaded["/root/a"].badges.items()] == [("1", 1)]
+    assert loaded["/root/d"] == Rollup()
+    assert sorted(load_rollups(connection, attributes, "/root/a", 1)) == ["/root/a/b"]
+    assert load_rollups(connection, attributes[1:], "/root", 1) == {}
+    assert sorted(load_rollups(connection, attributes, "/", 1)) == ["/root"]
+    assert sorted(load_rollups(connection, attributes, "/", 2)) == ["/root/a", "/root/c", "/root/d"]
+
+
+def test_rollup_save_replaces_subtree(tmp_path):
+    connection = get_connection(tmp_path / "cache.db")
+    attributes = make_attributes()
+    config = get_config_fingerprint(attributes)
+    save_rollups(connection, ["/root"], {"/root": Rollup(), "/root/a": Rollup(), "/rooted": Rollup()}, config)
+
+    save_rollups(connection, ["/root"], {"/root": Rollup(video_count=1)}, config)
+
+    assert [x[0] for x in connection.execute("SELECT directory FROM directories ORDER BY directory")] == [
+        "/root",
+        "/rooted",
+    ]
+    assert load_rollups(connection, attributes, "/root", 0)["/root"].video_count == 1
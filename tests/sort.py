@@ -0,0 +1,20 @@
+import random
+
+from videoprof.sort import external_sort
+
+
+def test_sort_in_memory():
+    assert list(external_sort([("b", "2"), ("a", "1")])) == [("a", "1"), ("b", "2")]
+
+
+def test_sort_spills_runs():
+    keys = [f"{x:04}" for x in range(1000)]
+    records = [(key, f"line {key}\t✓") for key in keys]
+    shuffled = records[:]
+    random.Random(0).shuffle(shuffled)
+
+    assert list(external_sort(shuffled, buffer_size=64)) == records
+
+
+def test_sort_empty():
+    assert list(external_sort([])) == []
@@ -1,6 +1,8 @@
 from pathlib import Path
 
 from videoprof.attribute import SingleAttribute
+from videoprof.config import make_attributes
+from videoprof.db import get_connection, TrackCache
 from videoprof.level import Level
 from videoprof.preference import SinglePreference
 from videoprof.quality import Quality
@@ -13,6 +15,20 @@ def test_video_path():
     assert video.get_path() == path
 
 
+def test_video_path_compact():
+    video = SingleVideo(path=Path("shows/a.mkv"), filename="/library/shows/a.mkv")
+    other = SingleVideo(path=Path("shows/b.mkv"), filename="/library/shows/b.mkv")
+    assert video.get_path() == Path("shows/a.mkv")
+    assert video.get_filename() == "/library/shows/a.mkv"
+    assert video.directory is other.directory
+    assert video.relative is not None and video.relative[0] is other.relative[0]
+    assert not hasattr(video, "__dict__")
+
+    video = SingleVideo(path=Path("/library/shows/a.mkv"), filename="/library/shows/a.mkv")
+    assert video.relative is None
+    assert video.get_path() == Path("/library/shows/a.mkv")
+
+
 def test_video_default_not_flagged():
     video = SingleVideo(path=Path("./testpath.mkv"))
     assert not video.is_flagged()
@@ -51,3 +67,47 @@ def test_video_flagged_quality():
 
     video = SingleVideo(path=Path("./testpath.mkv"), qualities=[quality])
     assert video.is_flagged()
+
+
+def make_video(tmp_path):
+    path = tmp_path / "video.mkv"
+    path.write_text("video")
+    return SingleVideo(path=path, stat=(5, 1.0))
+
+
+def test_video_analyze_reuses_stored_results(tmp_path):
+    tracks = [{"track_type": "General", "format": "Matroska"}]
+    attributes = make_attributes(
+        {
+            "levels": {},
+            "attributes": [
+                {"title": "Container", "track_type": "General", "track_attribute": "format"},
+                {"title": "Codec", "track_type": "Video", "track_attribute": "format"},
+            ],
+        }
+    )
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection) as cache:
+        make_video(tmp_path).analyze(attributes, cache, tracks)
+
+    cache = TrackCache(connection)
+    cache.get_tracks = None
+    video = make_video(tmp_path)
+    video.analyze(attributes, cache)
+
+    assert [x.preference.get_title() for x in video.get_qualities()] == ["Matroska"]
+
+
+def test_video_analyze_evaluates_changed_attributes(tmp_path):
+    container = {"title": "Container", "track_type": "General", "track_attribute": "format"}
+    connection = get_connection(tmp_path / "cache.db")
+    with TrackCache(connection) as cache:
+        video = make_video(tmp_path)
+        video.analyze(make_attributes({"levels": {}, "attributes": [container]}), cache, [])
+        assert video.get_qualities() == []
+
+    attributes = make_attributes({"levels": {}, "attributes": [dict(container, missing_value="Unknown")]})
+    video = make_video(tmp_path)
+    video.analyze(attributes, TrackCache(connection))
+
+    assert [x.preference.get_title() for x in video.get_qualities()] == ["Unknown"]
@@ -4,7 +4,16 @@ from pathlib import Path
 
 from click.testing import CliRunner
 
-from videoprof.videoprof import main
+from videoprof import backend
+from videoprof.attribute import SingleAttribute
+from videoprof.level import Level
+from videoprof.preference import SinglePreference
+from videoprof.quality import Quality
+from videoprof.rollup import Rollup
+from videoprof.video import SingleVideo
+from videoprof.videoprof import main, show_directories
+
+from .native import audio, make_avcc, make_mkv, video
 
 
 # https://stackoverflow.com/questions/14693701/how-can-i-remove-the-ansi-escape-sequences-from-a-string-in-python
@@ -43,3 +52,233 @@ def test_videoprof_summary_empty_directory():
         assert result.exit_code == 0
         for count in re.findall(":\t[0-9]+", ansi_escape.sub("", result.output)):
             assert count == ":\t0"
+
+
+def test_videoprof_scans_directory_named_like_command():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        Path("query").mkdir()
+        Path("query/video.mkv").write_text("video")
+
+        result = runner.invoke(main, ["query", "-c", "config.json", "-s", "cache.db", "-f"])
+
+        assert result.exit_code == 0
+        assert re.findall(r"(\S+):\t", result.output) == ["query/video.mkv"]
+
+
+def test_videoprof_serial_missing_library(monkeypatch):
+    def check_library():
+        raise OSError("libmediainfo could not be loaded")
+
+    monkeypatch.setattr(backend, "check_library", check_library)
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        Path("test").mkdir()
+        Path("test/video.mkv").write_text("video")
+
+        result = runner.invoke(main, ["-c", "config.json", "-s", "cache.db", "-t", "0", "test"])
+        quarantined = runner.invoke(main, ["cache", "quarantine", "-s", "cache.db"])
+
+        assert result.exit_code == 1
+        assert "make sure libmediainfo is installed" in result.output
+        assert quarantined.output == ""
+
+
+def test_videoprof_jobs_matches_serial():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        Path("test").mkdir()
+        for x in range(3):
+            Path(f"test/video{x}.mkv").write_text(str(x))
+
+        serial = runner.invoke(main, ["-s", "serial.db", "test"])
+        parallel = runner.invoke(main, ["-s", "parallel.db", "-j", "2", "test"])
+
+        assert parallel.exit_code == 0
+        assert parallel.output == serial.output
+
+
+def test_videoprof_directories_counts_files_once():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        Path("test/a/b").mkdir(parents=True)
+        Path("test/a/b/video.mkv").write_text("video")
+        Path("test/a/b/video.nfo").write_text("video")
+
+        result = runner.invoke(main, ["-c", "config.json", "-d", "test", "test/a"])
+
+        assert result.exit_code == 0
+        assert ansi_escape.sub("", result.output).endswith("\rtest/a:\t\u2690 1/1\t\u2612 ? \u00d71\n")
+
+
+def test_videoprof_files_sorted_and_unordered():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        Path("test/b").mkdir(parents=True)
+        Path("test/a.mkv").write_text("a")
+        Path("test/b/c.mkv").write_text("c")
+        Path("test/b.mkv").write_text("b")
+
+        ordered = runner.invoke(main, ["-s", "cache.db", "-f", "test/b.mkv", "test"])
+        unordered = runner.invoke(main, ["-s", "cache.db", "-f", "-u", "test/b.mkv", "test"])
+
+        def paths(output):
+            return re.findall(r"(test/\S+):\t", ansi_escape.sub("", output))
+
+        assert ordered.exit_code == 0
+        assert paths(ordered.output) == ["test/a.mkv", "test/b/c.mkv", "test/b.mkv"]
+        assert paths(unordered.output) == ["test/b.mkv", "test/a.mkv", "test/b/c.mkv"]
+
+
+def test_videoprof_show_directories_counts_badges(capsys):
+    hd = SinglePreference(title="HD", pattern="1080", level=Level(flag=False))
+    sd = SinglePreference(title="SD", pattern="480", level=Level(flag=True))
+    attribute = SingleAttribute(
+        preferences=[hd, sd], title="Resolution", track_type="Video", track_attribute="height"
+    )
+    rollup = Rollup()
+    # Badges follow the attribute's preferences, whichever was counted first.
+    for preference in [sd, hd, hd]:
+        video = SingleVideo(Path("a/video.mkv"), [Quality(attribute=attribute, preference=preference)])
+        rollup.add(video, video.is_flagged())
+
+    show_directories({Path("a"): rollup, Path("b"): Rollup()}, only_flagged=False)
+
+    assert ansi_escape.sub("", capsys.readouterr().out) == (
+        "a:\t\u2690 1/3\t\u2713 HD \u00d72 \u2612 SD \u00d71\nb:\t\u2690 0/0\t\n"
+    )
+
+
+def test_videoprof_directories_from_cache():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        for path in ["test/a/b/one.mkv", "test/a/c/two.mkv", "test/a/three.mkv", "test/d/e/four.mkv"]:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            Path(path).write_text(path)
+        Path("test/a/f").mkdir()
+
+        scan = runner.invoke(main, ["-c", "config.json", "-s", "cache.db", "test"])
+        for depth in ["1", "2"]:
+            live = runner.invoke(main, ["-c", "config.json", "-s", "live.db", "-d", "-p", depth, "test"])
+            cached = runner.invoke(main, ["-c", "config.json", "-s", "cache.db", "-r", "-p", depth, "test"])
+
+            assert cached.exit_code == 0
+            assert ansi_escape.sub("", live.output).split("\r")[-1] == ansi_escape.sub("", cached.output)
+
+        subtree = runner.invoke(main, ["-c", "config.json", "-s", "cache.db", "-r", "-p", "1", "test/a"])
+
+        assert scan.exit_code == 0
+        assert re.findall(r"(\S+):\t\u2690 (\d+/\d+)", ansi_escape.sub("", subtree.output)) == [
+            ("test/a/b", "1/1"),
+            ("test/a/c", "1/1"),
+            ("test/a/f", "0/0"),
+        ]
+
+
+def test_videoprof_query():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        Path("test/a").mkdir(parents=True)
+        Path("test/a/one.mkv").write_text("one")
+        Path("test/two.mkv").write_text("two")
+
+        scan = runner.invoke(main, ["-c", "config.json", "-s", "cache.db", "test"])
+        total = runner.invoke(main, ["query", "-c", "config.json", "-s", "cache.db"])
+        under = runner.invoke(
+            main, ["query", "-c", "config.json", "-s", "cache.db", "--under", "test/a", "-f"]
+        )
+        invalid = runner.invoke(main, ["query", "-c", "config.json", "-s", "cache.db", "Codec"])
+
+        assert scan.exit_code == 0
+        assert total.output.startswith("Files:\t2\n")
+        assert ansi_escape.sub("", total.output).split("\n")[1:] == ansi_escape.sub("", scan.output).split(
+            "\r"
+        )[-1].split("\n")
+        assert re.findall(r"(\S+):\t", under.output) == [str(Path("test/a/one.mkv").absolute())]
+        assert invalid.exit_code == 2
+
+
+def test_videoprof_native_matches_library():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        Path("test").mkdir()
+        Path("test/video.mkv").write_bytes(
+            make_mkv([video("V_MPEG4/ISO/AVC", make_avcc(), 41708333), audio("A_AC3", 6)])
+        )
+
+        library = runner.invoke(main, ["-c", "config.json", "-s", "library.db", "-f", "test"])
+        native = runner.invoke(
+            main, ["-c", "config.json", "-s", "native.db", "-f", "--probe-backend", "native", "test"]
+        )
+        stats = runner.invoke(main, ["cache", "stats", "-s", "native.db"])
+
+        assert native.exit_code == 0
+        assert native.output == library.output
+        assert "Projected:\t1\n" in stats.output
+
+
+def test_videoprof_query_columns_matches_query():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        Path("test/a").mkdir(parents=True)
+        Path("test/a/video.mkv").write_bytes(make_mkv([video("V_MPEG4/ISO/AVC", make_avcc(), 41708333)]))
+        Path("test/b.mkv").write_bytes(make_mkv([audio("A_AC3", 6), audio("A_AAC", 2)]))
+        Path("test/c.mkv").write_text("c")
+
+        runner.invoke(main, ["-c", "config.json", "-s", "cache.db", "test"])
+        stored = runner.invoke(main, ["query", "-c", "config.json", "-s", "cache.db"])
+        columns = runner.invoke(main, ["query", "-c", "config.json", "-s", "cache.db", "--columns"])
+        under = runner.invoke(
+            main, ["query", "-c", "config.json", "-s", "cache.db", "--columns", "--under", "test/a"]
+        )
+        files = runner.invoke(main, ["query", "-c", "config.json", "-s", "cache.db", "--columns", "-f"])
+
+        assert columns.exit_code == 0
+        assert columns.output == stored.output
+        assert under.output.startswith("Files:\t1\n")
+        assert files.exit_code != 0
+
+
+def test_videoprof_trust_cache():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        Path("test/a").mkdir(parents=True)
+        Path("test/a/one.mkv").write_text("one")
+        Path("test/two.mkv").write_text("two")
+
+        scan = runner.invoke(main, ["-c", "config.json", "-s", "cache.db", "-f", "test"])
+        Path("test/a/one.mkv").unlink()
+        trusted = runner.invoke(main, ["-c", "config.json", "-s", "cache.db", "-f", "--trust-cache", "test"])
+        checked = runner.invoke(
+            main, ["-c", "config.json", "-s", "cache.db", "-f", "--trust-cache", "--revalidate", "5", "test"]
+        )
+
+        assert trusted.exit_code == 0
+        assert trusted.output == scan.output
+        assert re.findall(r"(\S+):\t", checked.output) == ["test/two.mkv"]
+
+
+def test_videoprof_cache_commands():
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        Path("test/a").mkdir(parents=True)
+        Path("test/a/one.mkv").write_text("one")
+        Path("test/b").mkdir()
+        Path("test/b/two.mkv").write_text("two")
+
+        runner.invoke(main, ["-c", "config.json", "-s", "cache.db", "test"])
+        Path("test/a/one.mkv").unlink()
+        rescan = runner.invoke(main, ["-c", "config.json", "-s", "cache.db", "test/a"])
+        Path("test/b/two.mkv").unlink()
+        pruned = runner.invoke(main, ["cache", "prune", "-s", "cache.db", "test"])
+        vacuumed = runner.invoke(main, ["cache", "vacuum", "-s", "cache.db"])
+        stats = runner.invoke(main, ["cache", "stats", "-s", "cache.db"])
+        quarantined = runner.invoke(main, ["cache", "quarantine", "-s", "cache.db"])
+        cleared = runner.invoke(main, ["cache", "quarantine", "-s", "cache.db", "--clear"])
+
+        assert rescan.exit_code == 0
+        assert pruned.output == "Pruned:\t1\n"
+        assert vacuumed.exit_code == 0
+        assert stats.output.startswith("Files:\t0\n")
+        assert quarantined.output == ""
+        assert cleared.output == "Cleared:\t0\n"
@@ -0,0 +1,181 @@
+import os
+
+from videoprof.db import get_connection, TrackCache
+from videoprof.filter import VideoFilter
+from videoprof.walk import CacheWalker, Walker
+
+
+def make_tree(root, paths):
+    for path in paths:
+        target = root / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(path)
+
+
+def test_walk_files_once_with_directory(tmp_path):
+    make_tree(tmp_path, ["top.mkv", "a/one.mkv", "a/b/two.mkv", "c/three.mkv"])
+    walker = Walker(1)
+
+    entries = [(os.path.relpath(x.path, tmp_path), x.directory) for x in walker.walk([str(tmp_path)])]
+
+    assert entries == [
+        ("a/b/two.mkv", str(tmp_path / "a")),
+        ("a/one.mkv", str(tmp_path / "a")),
+        ("c/three.mkv", str(tmp_path / "c")),
+        ("top.mkv", None),
+    ]
+    assert walker.directories == [str(tmp_path / "a"), str(tmp_path / "c")]
+
+
+def test_walk_depth(tmp_path):
+    make_tree(tmp_path, ["a/one.mkv", "a/b/two.mkv"])
+    (tmp_path / "a" / "empty").mkdir()
+    walker = Walker(2)
+
+    entries = [(os.path.relpath(x.path, tmp_path), x.directory) for x in walker.walk([str(tmp_path)])]
+
+    assert entries == [("a/b/two.mkv", str(tmp_path / "a" / "b")), ("a/one.mkv", None)]
+    assert walker.directories == [str(tmp_path / "a" / "b"), str(tmp_path / "a" / "empty")]
+
+
+def test_walk_stat(tmp_path):
+    make_tree(tmp_path, ["video.mkv"])
+    stat = os.stat(tmp_path / "video.mkv")
+
+    entry = next(Walker().walk([str(tmp_path)]))
+
+    assert entry.filename == str(tmp_path / "video.mkv")
+    assert entry.size == stat.st_size
+    assert entry.modified == stat.st_mtime
+    assert entry.file_id == (stat.st_dev, stat.st_ino)
+
+
+def test_walk_overlapping_sources(tmp_path):
+    make_tree(tmp_path, ["a/one.mkv", "a/b/two.mkv"])
+
+    entries = list(Walker().walk([str(tmp_path), str(tmp_path / "a"), str(tmp_path / "a" / "one.mkv")]))
+
+    assert len(entries) == 2
+
+
+def test_walk_symlink_duplicates(tmp_path):
+    make_tree(tmp_path, ["a/one.mkv"])
+    os.symlink(tmp_path / "a" / "one.mkv", tmp_path / "link.mkv")
+    os.symlink(tmp_path, tmp_path / "a" / "loop")
+
+    entries = list(Walker().walk([str(tmp_path)]))
+
+    assert [x.path for x in entries] == [str(tmp_path / "a" / "one.mkv")]
+
+
+def test_walk_records_directories_and_linked_files(tmp_path):
+    make_tree(tmp_path, ["a/one.mkv", "b/two.mkv", "c/three.mkv"])
+    os.symlink(tmp_path / "c" / "three.mkv", tmp_path / "a" / "link.mkv")
+    os.link(tmp_path / "b" / "two.mkv", tmp_path / "c" / "hard.mkv")
+
+    walker = Walker()
+    entries = list(walker.walk([str(tmp_path), str(tmp_path / "b" / "two.mkv")]))
+
+    assert sorted(x.filename for x in entries) == [
+        str(tmp_path / "a" / "link.mkv"),
+        str(tmp_path / "a" / "one.mkv"),
+        str(tmp_path / "b" / "two.mkv"),
+    ]
+    assert len(walker.seen) == 6
+
+
+def test_walk_missing_source(tmp_path):
+    assert list(Walker().walk([str(tmp_path / "missing")])) == []
+
+
+def test_walk_filter(tmp_path):
+    make_tree(tmp_path, ["a/one.mkv", "a/one.nfo", "two.mkv"])
+    (tmp_path / "two.mkv").write_bytes(b"\x1a\x45\xdf\xa3")
+    video_filter = VideoFilter(exclude_extensions=frozenset(["nfo"]), signatures=True)
+
+    entries = list(Walker(1, video_filter).walk([str(tmp_path), str(tmp_path / "a" / "one.nfo")]))
+
+    assert [x.path for x in entries] == [str(tmp_path / "two.mkv")]
+
+
+def test_walk_ignore_prunes_directories(tmp_path, monkeypatch):
+    make_tree(tmp_path, ["one.mkv", "@eaDir/one.mkv", "a/Sample/two.mkv", "a/two.mkv", "a/two.nfo"])
+    opened = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda path: opened.append(path) or scandir(path))
+
+    entries = list(Walker(1, ignore=["@eaDir/", "Sample/", "*.nfo"]).walk([str(tmp_path)]))
+
+    assert [os.path.relpath(x.path, tmp_path) for x in entries] == ["a/two.mkv", "one.mkv"]
+    assert opened == [str(tmp_path), str(tmp_path / "a")]
+
+
+def test_walk_ignore_file(tmp_path):
+    make_tree(tmp_path, ["a/one.mkv", "a/trailer.mkv", "a/b/trailer.mkv", "c/trailer.mkv"])
+    (tmp_path / "a" / ".videoprofignore").write_text("trailer.mkv\n!b/trailer.mkv\n")
+
+    entries = list(Walker(1).walk([str(tmp_path)]))
+
+    assert [os.path.relpath(x.path, tmp_path) for x in entries] == [
+        "a/b/trailer.mkv",
+        "a/one.mkv",
+        "c/trailer.mkv",
+    ]
+
+
+def cache_tree(tmp_path, paths):
+    make_tree(tmp_path / "lib", paths)
+    cache = TrackCache(get_connection(tmp_path / "cache.db"))
+    for entry in Walker().walk([str(tmp_path / "lib")]):
+        cache.put_tracks(entry.filename, entry.size, entry.modified, [])
+    cache.flush()
+    return cache
+
+
+def test_walk_cache_matches_walk(tmp_path):
+    cache = cache_tree(tmp_path, ["top.mkv", "a/one.mkv", "a/b/two.mkv", "c/three.mkv"])
+    tmp_path = tmp_path / "lib"
+    source = str(tmp_path / ".." / tmp_path.name)
+    walker = Walker(2)
+    cache_walker = CacheWalker(cache, 2)
+
+    def fields(entries):
+        return sorted((x.path, x.filename, x.size, x.modified, x.directory, x.root) for x in entries)
+
+    assert fields(cache_walker.walk([source, str(tmp_path / "a")])) == fields(walker.walk([source]))
+    assert cache_walker.directories == walker.directories
+    assert cache_walker.roots == walker.roots
+    assert set(cache_walker.walked) <= set(walker.walked)
+
+
+def test_walk_cache_trusts_cached_stat(tmp_path, monkeypatch):
+    cache = cache_tree(tmp_path, ["a/one.mkv", "a/two.mkv", "b/three.mkv"])
+    tmp_path = tmp_path / "lib"
+    (tmp_path / "a" / "one.mkv").write_text("changed")
+    (tmp_path / "b" / "three.mkv").unlink()
+    cached = {x.filename: x.size for x in CacheWalker(cache).walk([str(tmp_path)])}
+
+    stats = []
+    stat = os.stat
+    monkeypatch.setattr(os, "stat", lambda path: stats.append(path) or stat(path))
+    checked = [
+        {x.filename: x.size for x in CacheWalker(cache, revalidate=2).walk([str(tmp_path)])} for _ in range(2)
+    ]
+
+    files = [str(tmp_path / x) for x in ["a/one.mkv", "a/two.mkv", "b/three.mkv"]]
+    assert cached == {files[0]: 9, files[1]: 9, files[2]: 11}
+    assert stats == [files[0], files[1], files[2], files[0]]
+    assert checked[0] == {files[0]: 7, files[1]: 9, files[2]: 11}
+    assert checked[1] == {files[0]: 7, files[1]: 9}
+
+
+def test_walk_unwalked_directories(tmp_path):
+    make_tree(tmp_path, ["a/one.mkv", "b/two.mkv", "c/three.mkv"])
+    (tmp_path / "d").symlink_to(tmp_path / "a")
+    walker = Walker(ignore=["b/"])
+
+    assert [x.filename for x in walker.walk([str(tmp_path)])] == [
+        str(tmp_path / "a" / "one.mkv"),
+        str(tmp_path / "c" / "three.mkv"),
+    ]
+    assert walker.unwalked == {str(tmp_path / "b"), str(tmp_path / "d")}
@@ -1,24 +1,58 @@
 import re
 
 from abc import abstractmethod, ABC
-from dataclasses import dataclass
-from typing import List, Optional, Sequence
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Hashable, List, Optional, Sequence, Tuple
 
 from .exceptions import MissingAttributeError
 from .level import Level, DEFAULT_LEVEL
-from .mediainfo import MediaInfoList
-from .preference import Preference, SinglePreference
+from .mediainfo import TrackIndex
+from .preference import Preference, PreferenceMatcher, SinglePreference
+
+# Per-video values of the single attributes evaluated so far, keyed by their definition; None if missing.
+AttributeMemo = Dict[Hashable, Optional[str]]
+# A track type and the name of one of its fields.
+TrackField = Tuple[str, str]
 
 
 class Attribute(ABC):
+    def get_preference(self, tracks: TrackIndex, memo: Optional[AttributeMemo] = None) -> Preference:
+        return self.match(self.evaluate(tracks, memo))
+
+    @abstractmethod
+    def evaluate(self, tracks: TrackIndex, memo: Optional[AttributeMemo] = None) -> str:
+        raise NotImplementedError
+
     @abstractmethod
-    def get_preference(self, media_info: MediaInfoList) -> Preference:
+    def match(self, value: str) -> Preference:
         raise NotImplementedError
 
     @abstractmethod
     def get_title(self) -> str:
         raise NotImplementedError
 
+    @abstractmethod
+    def get_fingerprint(self) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def __hash__(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_fields(self) -> FrozenSet[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_track_fields(self) -> FrozenSet[TrackField]:
+        """The fields of the first track of each type that this attribute's value is evaluated from."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_parse_speed(self) -> float:
+        """The least parse speed whose tracks this attribute's stored values can be trusted from."""
+        raise NotImplementedError
+
     @abstractmethod
     def get_preferences(self) -> Sequence[Preference]:
         raise NotImplementedError
@@ -33,34 +67,76 @@ class SingleAttribute(Attribute):
     default_level: Level = DEFAULT_LEVEL
     render: str = "%s"
     missing_value: Optional[str] = None
+    parse_speed: float = 0.0
+    fingerprint: str = field(default="", compare=False)
+    matcher: PreferenceMatcher = field(init=False, repr=False, compare=False)
+    key: Hashable = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.matcher = PreferenceMatcher(self.preferences)
+        self.key = (
+            self.track_type,
+            self.track_attribute,
+            self.default_level,
+            self.render,
+            self.missing_value,
+            tuple(self.preferences),
+        )
 
-    def get_value(self, media_info: MediaInfoList) -> Optional[str]:
-        for track in media_info:
-            if track["track_type"] == self.track_type:
-                value = track.get(self.track_attribute, None)
-                return None if value is None else str(value)
+    def get_key(self) -> Hashable:
+        return self.key
 
-        return None
+    def share(self, attribute: "SingleAttribute") -> None:
+        self.preferences = attribute.preferences
+        self.matcher = attribute.matcher
 
-    def get_preference(self, media_info: MediaInfoList) -> Preference:
-        value = self.get_value(media_info) or self.missing_value
+    def create_preference(self, value: str) -> Preference:
+        return SinglePreference(
+            level=self.default_level, title=self.render % (value), pattern=re.escape(value)
+        )
+
+    def get_value(self, tracks: TrackIndex) -> Optional[str]:
+        track = tracks.get_first(self.track_type)
+        if track is None:
+            return None
+
+        value = track.get(self.track_attribute, None)
+        return None if value is None else str(value)
+
+    def evaluate(self, tracks: TrackIndex, memo: Optional[AttributeMemo] = None) -> str:
+        if memo is None:
+            value = self.get_value(tracks) or self.missing_value
+        else:
+            if self.key not in memo:
+                memo[self.key] = self.get_value(tracks) or self.missing_value
+            value = memo[self.key]
 
         if not value:
             raise MissingAttributeError(f"Value missing for {self.track_type}:{self.track_attribute}")
 
-        for preference in self.preferences:
-            if preference.match(value):
-                return preference
+        return value
 
-        preference = SinglePreference(
-            level=self.default_level, title=self.render % (value), pattern=re.escape(value)
-        )
-        self.preferences.append(preference)
-        return preference
+    def match(self, value: str) -> Preference:
+        return self.matcher.match(value, self.create_preference)
 
     def get_title(self) -> str:
         return self.title
 
+    def __hash__(self) -> int:
+        return hash(self.title)
+
+    def get_fingerprint(self) -> str:
+        return self.fingerprint
+
+    def get_fields(self) -> FrozenSet[str]:
+        return frozenset([self.track_attribute])
+
+    def get_track_fields(self) -> FrozenSet[TrackField]:
+        return frozenset([(self.track_type, self.track_attribute)])
+
+    def get_parse_speed(self) -> float:
+        return self.parse_speed
+
     def get_preferences(self) -> Sequence[Preference]:
         return self.preferences
 
@@ -72,13 +148,24 @@ class CompositeAttribute(Attribute):
     title: str
     default_level: Level = DEFAULT_LEVEL
     render: str = "%s"
+    parse_speed: float = 0.0
+    fingerprint: str = field(default="", compare=False)
+    matcher: PreferenceMatcher = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.matcher = PreferenceMatcher(self.preferences)
 
-    def get_preference(self, media_info: MediaInfoList) -> Preference:
+    def create_preference(self, value: str) -> Preference:
+        return SinglePreference(
+            level=self.default_level, title=self.render % (value), pattern=re.escape(value)
+        )
+
+    def evaluate(self, tracks: TrackIndex, memo: Optional[AttributeMemo] = None) -> str:
         all_values_missing = True
         value_list = []
         for attribute in self.attributes:
             try:
-                value_list.append(attribute.get_preference(media_info).get_title())
+                value_list.append(attribute.get_preference(tracks, memo).get_title())
                 all_values_missing = False
             except MissingAttributeError:
                 pass
@@ -86,20 +173,28 @@ class CompositeAttribute(Attribute):
         if all_values_missing:
             raise MissingAttributeError(f"All values missing for composite attribute '{self.title}''")
 
-        value = "".join(value_list)
+        return "".join(value_list)
 
-        for preference in self.preferences:
-            if preference.match(value):
-                return preference
-
-        preference = SinglePreference(
-            level=self.default_level, title=self.render % (value), pattern=re.escape(value)
-        )
-        self.preferences.append(preference)
-        return preference
+    def match(self, value: str) -> Preference:
+        return self.matcher.match(value, self.create_preference)
 
     def get_title(self) -> str:
         return self.title
 
+    def __hash__(self) -> int:
+        return hash(self.title)
+
+    def get_fingerprint(self) -> str:
+        return self.fingerprint
+
+    def get_fields(self) -> FrozenSet[str]:
+        return frozenset().union(*[attribute.get_fields() for attribute in self.attributes])
+
+    def get_track_fields(self) -> FrozenSet[TrackField]:
+        return frozenset().union(*[attribute.get_track_fields() for attribute in self.attributes])
+
+    def get_parse_speed(self) -> float:
+        return max([self.parse_speed, *[attribute.get_parse_speed() for attribute in self.attributes]])
+
     def get_preferences(self) -> Sequence[Preference]:
         return self.preferences
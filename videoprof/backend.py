@@ -0,0 +1,133 @@
+import shutil
+import subprocess
+import xml.etree.ElementTree as ET
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pymediainfo import Track
+from typing import Dict, FrozenSet, Optional, Sequence
+
+from .mediainfo import check_library, DEFAULT_PARSE_SPEED, get_media_info_list, MediaInfoList
+from .native import NATIVE_FIELDS, probe_native
+
+CLI_BATCH_SIZE = 16
+
+
+class ProbeBackend(ABC):
+    """A way of turning files into the tracks mediainfo reports for them, in the shape pymediainfo gives."""
+
+    @abstractmethod
+    def get_batch_size(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def check(self) -> None:
+        """Raise OSError if this backend cannot probe anything on this host."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def probe(self, filenames: Sequence[str]) -> Dict[str, MediaInfoList]:
+        """The tracks of each file that could be read, keyed by filename."""
+        raise NotImplementedError
+
+
+@dataclass
+class LibraryBackend(ProbeBackend):
+    """Parse files one at a time with libmediainfo, loaded into the probing process by pymediainfo."""
+
+    parse_speed: float = DEFAULT_PARSE_SPEED
+
+    def get_batch_size(self) -> int:
+        return 1
+
+    def check(self) -> None:
+        check_library()
+
+    def probe(self, filenames: Sequence[str]) -> Dict[str, MediaInfoList]:
+        return {filename: get_media_info_list(filename, self.parse_speed) for filename in filenames}
+
+
+def parse_media_info_lists(xml: str) -> Dict[str, MediaInfoList]:
+    """Split the OLDXML report of several files by the complete name of each file."""
+    media_info_lists: Dict[str, MediaInfoList] = {}
+
+    for file in ET.fromstring(xml).iterfind("File"):
+        tracks = [Track(x).to_data() for x in file.iterfind("track")]
+        general = [x for x in tracks if x.get("track_type") == "General"]
+        if general and "complete_name" in general[0]:
+            media_info_lists[str(general[0]["complete_name"])] = tracks
+
+    return media_info_lists
+
+
+@dataclass
+class CliBackend(ProbeBackend):
+    """Parse `batch_size` files per run of the mediainfo command line tool, in its own process.
+
+    The tool is asked for the same complete OLDXML report pymediainfo reads from the library, and that
+    report is read with pymediainfo's own track parser, so both backends give identical tracks. Files that
+    the tool could not read are missing from its report.
+    """
+
+    command: str = "mediainfo"
+    batch_size: int = CLI_BATCH_SIZE
+    parse_speed: float = DEFAULT_PARSE_SPEED
+
+    def get_batch_size(self) -> int:
+        return max(1, self.batch_size)
+
+    def check(self) -> None:
+        if shutil.which(self.command) is None:
+            raise OSError(f"{self.command} could not be found")
+
+    def probe(self, filenames: Sequence[str]) -> Dict[str, MediaInfoList]:
+        if not filenames:
+            return {}
+
+        process = subprocess.run(
+            [self.command, "-f", "--Output=OLDXML", f"--ParseSpeed={self.parse_speed:g}", *filenames],
+            stdout=subprocess.PIPE,
+            check=False,
+        )
+        if not process.stdout.strip():
+            return {}
+
+        return parse_media_info_lists(process.stdout.decode("utf-8", "replace"))
+
+
+@dataclass
+class NativeBackend(ProbeBackend):
+    """Read the headers of Matroska and MP4 files in Python, and probe other files with `fallback`.
+
+    Native tracks only carry NATIVE_FIELDS, so the native probe is only used when `fields`, the track
+    fields the caller needs, are among them; files it cannot read completely go to the fallback as well.
+    """
+
+    fields: Optional[FrozenSet[str]] = None
+    fallback: ProbeBackend = field(default_factory=LibraryBackend)
+
+    def is_native(self) -> bool:
+        return self.fields is not None and self.fields <= NATIVE_FIELDS
+
+    def get_batch_size(self) -> int:
+        return self.fallback.get_batch_size()
+
+    def check(self) -> None:
+        self.fallback.check()
+
+    def probe(self, filenames: Sequence[str]) -> Dict[str, MediaInfoList]:
+        media_info_lists: Dict[str, MediaInfoList] = {}
+        rest = []
+
+        for filename in filenames:
+            tracks = probe_native(filename) if self.is_native() else None
+            if tracks is None:
+                rest.append(filename)
+            else:
+                media_info_lists[filename] = tracks
+
+        media_info_lists.update(self.fallback.probe(rest))
+        return media_info_lists
+
+
+BACKENDS = ["library", "cli", "native"]
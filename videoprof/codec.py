@@ -0,0 +1,74 @@
+import json
+import marshal
+import zlib
+
+from abc import abstractmethod, ABC
+from typing import cast, Dict, FrozenSet, Optional, Union
+
+from .mediainfo import MediaInfoList
+
+TrackData = Union[str, bytes]
+
+# Bumped whenever the layout of compact rows changes; older rows then fail to decode and are re-probed.
+COMPACT_VERSION = 1
+
+
+class TrackCodec(ABC):
+    @abstractmethod
+    def get_format(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def encode(self, tracks: MediaInfoList) -> TrackData:
+        raise NotImplementedError
+
+    @abstractmethod
+    def decode(self, data: TrackData) -> MediaInfoList:
+        raise NotImplementedError
+
+
+class JsonCodec(TrackCodec):
+    def get_format(self) -> int:
+        return 0
+
+    def encode(self, tracks: MediaInfoList) -> TrackData:
+        return json.dumps(tracks)
+
+    def decode(self, data: TrackData) -> MediaInfoList:
+        return cast(MediaInfoList, json.loads(data))
+
+
+class CompactCodec(TrackCodec):
+    """Tracks as zlib-compressed marshal data, several times smaller than JSON and a little faster to decode.
+
+    The marshal format may change between Python versions, so every row starts with the layout and
+    marshal versions it was written with, and rows written by another version raise a ValueError, as do
+    rows that are corrupt.
+    """
+
+    def get_format(self) -> int:
+        return 1
+
+    def encode(self, tracks: MediaInfoList) -> TrackData:
+        return bytes([COMPACT_VERSION, marshal.version]) + zlib.compress(marshal.dumps(list(tracks)))
+
+    def decode(self, data: TrackData) -> MediaInfoList:
+        data = cast(bytes, data)
+        if data[:2] != bytes([COMPACT_VERSION, marshal.version]):
+            raise ValueError("Compact tracks were written by an incompatible version")
+        try:
+            return cast(MediaInfoList, marshal.loads(zlib.decompress(data[2:])))
+        except (zlib.error, EOFError, TypeError) as e:
+            raise ValueError(f"Compact tracks could not be decoded: {e}") from e
+
+
+CODECS: Dict[str, TrackCodec] = {"json": JsonCodec(), "compact": CompactCodec()}
+FORMATS: Dict[int, TrackCodec] = {codec.get_format(): codec for codec in CODECS.values()}
+
+
+def project(tracks: MediaInfoList, fields: Optional[FrozenSet[str]]) -> MediaInfoList:
+    """Keep only the given track fields, plus the track type, of every track."""
+    if fields is None:
+        return tracks
+
+    return [{k: v for k, v in track.items() if k == "track_type" or k in fields} for track in tracks]
@@ -0,0 +1,125 @@
+import sqlite3
+
+from array import array
+from collections import Counter
+from typing import Dict, Generic, Hashable, List, Optional, Sequence, Tuple, TypeVar
+
+from .attribute import Attribute, TrackField
+from .codec import FORMATS
+from .exceptions import MissingAttributeError
+from .maintenance import get_prefix_condition
+from .mediainfo import MediaInfoList, MediaTrack, TrackIndex
+from .preference import Preference
+
+K = TypeVar("K", bound=Hashable)
+
+
+class Column(Generic[K]):
+    """A dictionary-encoded column, keeping each distinct value once and each row as the code of its value."""
+
+    values: List[K]
+    codes: Dict[K, int]
+    data: "array[int]"
+
+    def __init__(self) -> None:
+        self.values = []
+        self.codes = {}
+        self.data = array("L")
+
+    def append(self, value: K) -> None:
+        code = self.codes.get(value, None)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        self.data.append(code)
+
+    def get_counts(self) -> List[int]:
+        """The number of rows of each distinct value, in the order of the values."""
+        counts = [0] * len(self.values)
+        for code, count in Counter(self.data).items():
+            counts[code] = count
+        return counts
+
+
+class ColumnarSummary:
+    """Preference counts over many files, evaluated column by column instead of file by file.
+
+    The first track of each type gives every file one value per track field the attributes read, kept in a
+    dictionary-encoded column per field. Each attribute is then evaluated and matched once per distinct
+    value of its fields, from a stand-in for the tracks holding just those values, and the count of files
+    sharing that value is added to its preference at once. A composite attribute's fields are combined into
+    one more column first, so it is still evaluated once per distinct combination.
+    """
+
+    attributes: Sequence[Attribute]
+    columns: Dict[TrackField, Column[Optional[str]]]
+    size: int
+
+    def __init__(self, attributes: Sequence[Attribute]):
+        self.attributes = attributes
+        self.columns = {
+            x: Column() for x in sorted(frozenset().union(*[x.get_track_fields() for x in attributes]))
+        }
+        self.size = 0
+
+    def add(self, tracks: MediaInfoList) -> None:
+        first: Dict[str, MediaTrack] = {}
+        for track in tracks:
+            first.setdefault(str(track["track_type"]), track)
+
+        for (track_type, name), column in self.columns.items():
+            value = first.get(track_type, {}).get(name, None)
+            column.append(None if value is None else str(value))
+        self.size += 1
+
+    def get_keys(self, fields: Sequence[TrackField]) -> Tuple[List[Tuple[Optional[str], ...]], List[int]]:
+        """The distinct combinations of values of the fields, and how many files have each of them."""
+        if len(fields) == 1:
+            column = self.columns[fields[0]]
+            return [(x,) for x in column.values], column.get_counts()
+
+        columns = [self.columns[x] for x in fields]
+        combined: Column[Tuple[int, ...]] = Column()
+        for codes in zip(*[x.data for x in columns]):
+            combined.append(codes)
+
+        keys = [tuple(column.values[x] for column, x in zip(columns, codes)) for codes in combined.values]
+        return keys, combined.get_counts()
+
+    def get_preference_counts(self) -> Dict[Preference, int]:
+        preference_counts: Dict[Preference, int] = {}
+
+        for attribute in self.attributes:
+            fields = sorted(attribute.get_track_fields())
+            for key, count in zip(*self.get_keys(fields)):
+                tracks: Dict[str, MediaTrack] = {}
+                for (track_type, name), value in zip(fields, key):
+                    track = tracks.setdefault(track_type, {"track_type": track_type})
+                    if value is not None:
+                        track[name] = value
+
+                try:
+                    preference = attribute.get_preference(TrackIndex(list(tracks.values())))
+                except MissingAttributeError:
+                    continue
+                preference_counts[preference] = preference_counts.get(preference, 0) + count
+
+        return preference_counts
+
+
+def load_summary(
+    connection: sqlite3.Connection, attributes: Sequence[Attribute], under: Sequence[str] = ()
+) -> ColumnarSummary:
+    """Read the cached tracks of every file below the directories, or of all of them, into a summary."""
+    summary = ColumnarSummary(attributes)
+    condition, parameters = get_prefix_condition(under)
+
+    for tracks, format in connection.execute(
+        f"SELECT tracks, format FROM videos WHERE {condition}", parameters
+    ):
+        try:
+            summary.add(FORMATS[format].decode(tracks))
+        except (KeyError, ValueError):
+            continue
+
+    return summary
@@ -1,16 +1,22 @@
+import hashlib
 import json
 import os
 
 from pathlib import Path
-from typing import cast, Dict, Optional, Sequence, Union
+from typing import cast, Dict, FrozenSet, Hashable, Optional, Sequence, Union
 from typing_extensions import TypedDict
 
 from .attribute import Attribute, SingleAttribute, CompositeAttribute
+from .backend import CLI_BATCH_SIZE, CliBackend, LibraryBackend, NativeBackend, ProbeBackend
+from .device import DeviceLimits
+from .filter import VideoFilter
 from .preference import Preference, SinglePreference
 from .level import Level, DEFAULT_LEVEL
+from .mediainfo import DEFAULT_PARSE_SPEED
 
 
 LevelMap = Dict[str, Level]
+LeafMap = Dict[Hashable, SingleAttribute]
 
 
 class ConfigPreference(TypedDict):
@@ -27,6 +33,7 @@ class ConfigSingleAttribute(TypedDict):
     render: Optional[str]
     default_level: Optional[str]
     missing_value: Optional[str]
+    parse_speed: Optional[float]
 
 
 class ConfigCompositeAttribute(TypedDict):
@@ -35,6 +42,7 @@ class ConfigCompositeAttribute(TypedDict):
     preferences: Sequence[ConfigPreference]
     render: Optional[str]
     default_level: Optional[str]
+    parse_speed: Optional[float]
 
 
 ConfigAttribute = Union[ConfigSingleAttribute, ConfigCompositeAttribute]
@@ -45,9 +53,33 @@ class ConfigLevel(TypedDict):
     flag: bool
 
 
+class ConfigFilter(TypedDict):
+    extensions: Sequence[str]
+    exclude_extensions: Sequence[str]
+    signatures: bool
+
+
+class ConfigDevices(TypedDict):
+    rotational: int
+    solid_state: int
+    other: int
+
+
+class ConfigProbe(TypedDict):
+    backend: str
+    fallback: str
+    command: str
+    batch_size: int
+    parse_speed: float
+
+
 class Config(TypedDict):
     attributes: Sequence[ConfigAttribute]
     levels: Dict[str, ConfigLevel]
+    filter: Optional[ConfigFilter]
+    ignore: Optional[Sequence[str]]
+    devices: Optional[ConfigDevices]
+    probe: Optional[ConfigProbe]
 
 
 def get_preference(config_preference: ConfigPreference, level_map: LevelMap, render: str) -> Preference:
@@ -58,48 +90,66 @@ def get_preference(config_preference: ConfigPreference, level_map: LevelMap, ren
     )
 
 
-def get_single_attribute(config_attribute: ConfigSingleAttribute, level_map: LevelMap) -> Attribute:
+def get_fingerprint(config_attribute: ConfigAttribute) -> str:
+    definition = json.dumps(config_attribute, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(definition.encode()).hexdigest()
+
+
+def get_single_attribute(
+    config_attribute: ConfigSingleAttribute, level_map: LevelMap, leaves: Optional[LeafMap] = None
+) -> Attribute:
     default_level_name = config_attribute.get("default_level", None) or ""
     default_level = level_map.get(default_level_name, DEFAULT_LEVEL)
+    render = config_attribute.get("render", None) or "%s"
 
     attribute = SingleAttribute(
         title=config_attribute["title"],
-        render=config_attribute.get("render", None) or "%s",
-        preferences=[],
+        render=render,
+        preferences=[get_preference(x, level_map, render) for x in config_attribute.get("preferences", [])],
         default_level=default_level,
         track_type=config_attribute["track_type"],
         track_attribute=config_attribute["track_attribute"],
         missing_value=config_attribute.get("missing_value", None),
+        parse_speed=config_attribute.get("parse_speed", None) or 0.0,
+        fingerprint=get_fingerprint(config_attribute),
     )
-    attribute.preferences = [
-        get_preference(x, level_map, attribute.render) for x in config_attribute.get("preferences", [])
-    ]
+
+    if leaves is None:
+        return attribute
+
+    leaf = leaves.setdefault(attribute.get_key(), attribute)
+    if leaf.get_title() == attribute.get_title():
+        return leaf
+
+    attribute.share(leaf)
     return attribute
 
 
-def get_composite_attribute(config_attribute: ConfigCompositeAttribute, level_map: LevelMap) -> Attribute:
+def get_composite_attribute(
+    config_attribute: ConfigCompositeAttribute, level_map: LevelMap, leaves: Optional[LeafMap] = None
+) -> Attribute:
     default_level_name = config_attribute.get("default_level", None) or ""
     default_level = level_map.get(default_level_name, DEFAULT_LEVEL)
+    render = config_attribute.get("render", None) or "%s"
 
-    attribute = CompositeAttribute(
+    return CompositeAttribute(
         title=config_attribute["title"],
-        render=config_attribute.get("render", None) or "%s",
-        attributes=[],
-        preferences=[],
+        render=render,
+        attributes=[get_attribute(x, level_map, leaves) for x in config_attribute.get("attributes", [])],
+        preferences=[get_preference(x, level_map, render) for x in config_attribute.get("preferences", [])],
         default_level=default_level,
+        parse_speed=config_attribute.get("parse_speed", None) or 0.0,
+        fingerprint=get_fingerprint(config_attribute),
     )
-    attribute.attributes = [get_attribute(x, level_map) for x in config_attribute.get("attributes", [])]
-    attribute.preferences = [
-        get_preference(x, level_map, attribute.render) for x in config_attribute.get("preferences", [])
-    ]
-    return attribute
 
 
-def get_attribute(config_attribute: ConfigAttribute, level_map: LevelMap) -> Attribute:
+def get_attribute(
+    config_attribute: ConfigAttribute, level_map: LevelMap, leaves: Optional[LeafMap] = None
+) -> Attribute:
     return (
-        get_composite_attribute(cast(ConfigCompositeAttribute, config_attribute), level_map)
+        get_composite_attribute(cast(ConfigCompositeAttribute, config_attribute), level_map, leaves)
         if "attributes" in config_attribute
-        else get_single_attribute(cast(ConfigSingleAttribute, config_attribute), level_map)
+        else get_single_attribute(cast(ConfigSingleAttribute, config_attribute), level_map, leaves)
     )
 
 
@@ -126,20 +176,95 @@ def make_attributes(config: Config = get_default_config()) -> Sequence[Attribute
     for name, options in config["levels"].items():
         level_map[name] = Level(color=options["color"], flag=options["flag"])
 
+    # Identical single attributes, wherever they appear, share one set of preferences and one memo entry.
+    leaves: LeafMap = {}
     attributes = []
 
     for config_attribute in config["attributes"]:
-        attribute = get_attribute(config_attribute, level_map)
+        attribute = get_attribute(config_attribute, level_map, leaves)
         attributes.append(attribute)
 
     return attributes
 
 
-def get_attributes(path: Path) -> Sequence[Attribute]:
+def make_filter(config: Config = get_default_config()) -> VideoFilter:
+    config_filter = config.get("filter", None) or cast(ConfigFilter, {})
+
+    return VideoFilter(
+        extensions=frozenset(x.lower().lstrip(".") for x in config_filter.get("extensions", [])),
+        exclude_extensions=frozenset(
+            x.lower().lstrip(".") for x in config_filter.get("exclude_extensions", [])
+        ),
+        signatures=config_filter.get("signatures", False),
+    )
+
+
+def make_ignore(config: Config = get_default_config()) -> Sequence[str]:
+    return config.get("ignore", None) or []
+
+
+def make_device_limits(config: Config = get_default_config()) -> DeviceLimits:
+    config_devices = config.get("devices", None) or cast(ConfigDevices, {})
+    defaults = DeviceLimits()
+
+    return DeviceLimits(
+        rotational=config_devices.get("rotational", defaults.rotational),
+        solid_state=config_devices.get("solid_state", defaults.solid_state),
+        other=config_devices.get("other", defaults.other),
+    )
+
+
+def make_parse_speed(config: Config = get_default_config(), parse_speed: Optional[float] = None) -> float:
+    """The parse speed given, or the one the configuration sets, or libmediainfo's own default."""
+    config_probe = config.get("probe", None) or cast(ConfigProbe, {})
+    if parse_speed is None:
+        parse_speed = config_probe.get("parse_speed", DEFAULT_PARSE_SPEED)
+
+    if not 0 <= parse_speed <= 1:
+        raise ValueError(f"Parse speed {parse_speed:g} is not between 0 and 1")
+    return parse_speed
+
+
+def make_backend(
+    config: Config = get_default_config(),
+    name: Optional[str] = None,
+    fields: Optional[FrozenSet[str]] = None,
+    parse_speed: Optional[float] = None,
+) -> ProbeBackend:
+    """The probe backend named, or the one the configuration names, or the library by default.
+
+    The native backend reads headers itself when `fields` allow, and otherwise probes with its fallback.
+    """
+    config_probe = config.get("probe", None) or cast(ConfigProbe, {})
+    name = name or config_probe.get("backend", "library")
+    parse_speed = make_parse_speed(config, parse_speed)
+
+    if name == "native":
+        fallback = config_probe.get("fallback", "library")
+        if fallback == "native":
+            raise ValueError("The native probe backend cannot fall back to itself")
+        return NativeBackend(fields=fields, fallback=make_backend(config, fallback, parse_speed=parse_speed))
+
+    if name == "cli":
+        return CliBackend(
+            command=config_probe.get("command", "mediainfo"),
+            batch_size=config_probe.get("batch_size", CLI_BATCH_SIZE),
+            parse_speed=parse_speed,
+        )
+    if name == "library":
+        return LibraryBackend(parse_speed=parse_speed)
+
+    raise ValueError(f"Unknown probe backend '{name}'")
+
+
+def get_config(path: Path) -> Config:
     if path.exists():
-        config = load_config(path)
-    else:
-        config = get_default_config()
-        save_config(config, path)
+        return load_config(path)
 
-    return make_attributes(config)
+    config = get_default_config()
+    save_config(config, path)
+    return config
+
+
+def get_attributes(path: Path) -> Sequence[Attribute]:
+    return make_attributes(get_config(path))
@@ -1,59 +1,689 @@
-import json
 import os
 import sqlite3
 
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Callable
+from types import TracebackType
+from typing import (
+    cast,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+)
 
-from .mediainfo import MediaInfoList
+from .codec import FORMATS, JsonCodec, project, TrackCodec, TrackData
+from .content import get_content_fingerprint
+from .mediainfo import DEFAULT_PARSE_SPEED, MediaInfoList
 
+# Older SQLite builds cap a statement at 999 host parameters, so IN queries are chunked below that.
+CHUNK_SIZE = 500
+BATCH_SIZE = 1000
+SYNCHRONOUS_MODES = ["OFF", "NORMAL", "FULL"]
+
+TABLES = {
+    "videos": "CREATE TABLE videos (filename varchar primary key, size integer, modified real, tracks text)",
+    "results": (
+        "CREATE TABLE results (filename varchar, fingerprint varchar, size integer, modified real, "
+        "value text, preference text, primary key (filename, fingerprint))"
+    ),
+    "directories": (
+        "CREATE TABLE directories (directory varchar primary key, config varchar, video_count integer, "
+        "flag_count integer)"
+    ),
+    "badges": (
+        "CREATE TABLE badges (directory varchar, fingerprint varchar, preference varchar, value text, "
+        "count integer, primary key (directory, fingerprint, preference))"
+    ),
+    "counters": "CREATE TABLE counters (name varchar primary key, value integer)",
+    "quarantine": (
+        "CREATE TABLE quarantine (filename varchar primary key, size integer, modified real, reason text, "
+        "failed real)"
+    ),
+}
+
+INDEXES = {
+    "videos_content": "CREATE INDEX IF NOT EXISTS videos_content ON videos (content)",
+    "results_value": "CREATE INDEX IF NOT EXISTS results_value ON results (fingerprint, value)",
+    "results_preference": (
+        "CREATE INDEX IF NOT EXISTS results_preference ON results (fingerprint, preference)"
+    ),
+}
+
+# Columns added to existing tables since they were first created, migrated in place on connect.
+COLUMNS = {
+    "videos": {
+        "format": "integer not null default 0",
+        "fields": "text",
+        "validated": "real",
+        "content": "varchar",
+        "parse_speed": "real",
+    },
+    "results": {
+        "parse_speed": "real",
+    },
+}
+
+# A stored attribute result: the file size and modification time it was evaluated for, the value the
+# attribute matched against (None if it was missing), the title of the preference that matched and the
+# parse speed of the tracks it was evaluated from.
+ResultRecord = Tuple[int, float, Optional[str], Optional[str], float]
+Result = Tuple[str, Optional[str], Optional[str]]
+
+
+VideoRow = Tuple[int, float, TrackData, int, Optional[str], Optional[str], float]
+Stat = Tuple[str, int, float]
+# A file that could not be probed: its filename, size and modification time, why, and when it failed.
+QuarantineRow = Tuple[str, int, float, str, float]
+
+
+@dataclass
+class CacheRecord:
+    size: Optional[int] = None
+    modified: Optional[float] = None
+    tracks: Optional[TrackData] = None
+    format: int = 0
+    fields: Optional[str] = None
+    content: Optional[str] = None
+    parse_speed: float = DEFAULT_PARSE_SPEED
+    quarantined: Optional[Tuple[int, float]] = None
+    results: Dict[str, ResultRecord] = field(default_factory=dict)
+
+    def is_fresh(self, size: int, modified: float) -> bool:
+        return self.size == size and self.modified == modified
+
+    def has_fields(self, fields: Optional[FrozenSet[str]]) -> bool:
+        """Whether the stored tracks were kept with at least the given fields (None for every field)."""
+        if self.fields is None:
+            return True
+        return fields is not None and fields <= frozenset(self.fields.split(","))
+
+
+def get_parse_speed(parse_speed: Optional[float]) -> float:
+    """Rows stored before parse speeds were recorded were parsed at libmediainfo's default."""
+    return DEFAULT_PARSE_SPEED if parse_speed is None else parse_speed
+
+
+def get_subtree_range(filename: str) -> Tuple[str, str, str]:
+    """The path itself and the bounds of every path below it, for an index-friendly range query."""
+    prefix = filename if filename.endswith(os.sep) else filename + os.sep
+    return filename, prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+def get_connection(path: Path, synchronous: str = "NORMAL") -> sqlite3.Connection:
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"Unknown synchronous mode '{synchronous}'")
 
-def get_connection(path: Path) -> sqlite3.Connection:
     dir = path.parent
     if not dir.is_dir():
         os.makedirs(str(dir))
 
     connection = sqlite3.connect(str(path))
     cursor = connection.cursor()
-    cursor.execute("SELECT count(name) FROM sqlite_master WHERE type='table' AND name='videos'")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={synchronous}")
 
-    if cursor.fetchone()[0] == 0:
-        cursor.execute(
-            "CREATE TABLE videos (filename varchar primary key, size integer, modified real, tracks text)"
-        )
+    for table, definition in TABLES.items():
+        cursor.execute("SELECT count(name) FROM sqlite_master WHERE type='table' AND name=?", [table])
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(definition)
+
+    for table, columns in COLUMNS.items():
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = [x[1] for x in cursor.fetchall()]
+        for column, definition in columns.items():
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    for definition in INDEXES.values():
+        cursor.execute(definition)
 
     cursor.close()
     return connection
 
 
-def get_tracks(
-    connection: sqlite3.Connection,
-    filename: str,
-    size: int,
-    modified: float,
-    tracks_generator: Callable[[], MediaInfoList],
-) -> MediaInfoList:
-    cursor = connection.cursor()
-    cursor.execute("SELECT * FROM videos WHERE filename=?", [filename])
-    record = cursor.fetchone()
+def migrate_tracks(connection: sqlite3.Connection, codec: TrackCodec, batch_size: int = BATCH_SIZE) -> int:
+    """Rewrite every track row stored with another codec, returning the number of rows rewritten.
+
+    Rows that can no longer be decoded are dropped, so their files are parsed again on the next scan.
+    """
+    count = 0
+
+    while True:
+        rows = connection.execute(
+            "SELECT filename, tracks, format FROM videos WHERE format != ? LIMIT ?",
+            [codec.get_format(), batch_size],
+        ).fetchall()
+        if not rows:
+            return count
+
+        updates = []
+        deletes = []
+        for filename, tracks, format in rows:
+            try:
+                updates.append((codec.encode(FORMATS[format].decode(tracks)), codec.get_format(), filename))
+            except (KeyError, ValueError):
+                deletes.append((filename,))
 
-    if not record:
-        tracks = tracks_generator()
         with connection:
-            cursor.execute(
-                "INSERT INTO videos VALUES (?,?,?,?)",
-                [filename, size, modified, json.dumps(tracks)],
+            connection.executemany("UPDATE videos SET tracks = ?, format = ? WHERE filename = ?", updates)
+            connection.executemany("DELETE FROM videos WHERE filename = ?", deletes)
+        count += len(rows)
+
+
+class TrackCache:
+    """Bulk access to the videos and results tables.
+
+    Rows are read ahead in chunked IN queries following the order given to prefetch, and new or changed
+    rows are buffered and written in batched transactions instead of one commit per file. Track blobs are
+    only read ahead for files missing a stored result for one of the prefetched attribute fingerprints.
+    Each prefetch extends the plan, so a stream of files can be planned one chunk at a time; the plan and
+    the records more than a couple of chunks behind the file last asked for are dropped.
+
+    New tracks are written with the given codec, keeping only `fields` when set. Rows stored with another
+    codec are rewritten as they are read, and rows missing one of `fields` are parsed again.
+
+    Tracks and results record the parse speed they were read at. A stored result is trusted if it was
+    read at least as deeply as its attribute asks for in `parse_speeds`, but never more deeply than this
+    run's `parse_speed`, so a quick run can be followed by a deeper one that only parses the files again
+    whose results for those attributes came from a shallower parse.
+
+    With `content` set, rows are also keyed by a fingerprint of their file's content. A file missing from
+    the cache takes the tracks of a row with the same fingerprint instead of being parsed, and the old row
+    is dropped if its file is gone, so moved and renamed files are not parsed again. Rows stored without a
+    fingerprint get theirs as their results are read, unless `backfill_content` is unset, so a run that
+    otherwise trusts the cache never has to read the files.
+
+    Once `start_listing` is called, every prefetched filename is also noted in a temporary table, so that
+    `sweep` can drop the rows of files that a complete walk did not find without a single stat. Lookups
+    and misses are counted in the counters table as they are flushed.
+
+    Files that could not be probed are quarantined with the size and modification time they failed at,
+    so they are skipped until they change instead of being probed again on every scan.
+    """
+
+    connection: sqlite3.Connection
+    batch_size: int
+    chunk_size: int
+    codec: TrackCodec
+    fields: Optional[FrozenSet[str]]
+    content: bool
+    backfill_content: bool
+    parse_speed: float
+    parse_speeds: Dict[str, float]
+    plan: List[str]
+    offset: int
+    positions: Dict[str, int]
+    fingerprints: Set[str]
+    records: Dict[str, CacheRecord]
+    pending: Dict[str, VideoRow]
+    pending_results: List[Tuple[str, str, int, float, Optional[str], Optional[str], float]]
+    pending_contents: List[Tuple[str, str]]
+    contents: Dict[str, Optional[str]]
+    listing: bool
+    lookups: int
+    misses: int
+
+    def __init__(
+        self,
+        connection: sqlite3.Connection,
+        batch_size: int = BATCH_SIZE,
+        chunk_size: int = CHUNK_SIZE,
+        codec: TrackCodec = JsonCodec(),
+        fields: Optional[FrozenSet[str]] = None,
+        content: bool = False,
+        parse_speed: float = DEFAULT_PARSE_SPEED,
+        parse_speeds: Optional[Dict[str, float]] = None,
+        backfill_content: bool = True,
+    ):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.codec = codec
+        self.fields = fields
+        self.content = content
+        self.backfill_content = backfill_content
+        self.parse_speed = parse_speed
+        self.parse_speeds = parse_speeds or {}
+        self.plan = []
+        self.offset = 0
+        self.positions = {}
+        self.fingerprints = set()
+        self.records = {}
+        self.pending = {}
+        self.pending_results = []
+        self.pending_contents = []
+        self.contents = {}
+        self.listing = False
+        self.lookups = 0
+        self.misses = 0
+
+    def __enter__(self) -> "TrackCache":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.flush()
+
+    def prefetch(self, filenames: Iterable[str], fingerprints: Iterable[str] = ()) -> None:
+        start = self.offset + len(self.plan)
+        self.plan.extend(filenames)
+        self.positions.update(
+            (filename, position) for position, filename in enumerate(self.plan[start - self.offset :], start)
+        )
+        self.fingerprints = set(fingerprints)
+
+        if self.listing:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO temp.listed VALUES (?)",
+                    [(x,) for x in self.plan[start - self.offset :]],
+                )
+
+    def start_listing(self) -> None:
+        with self.connection:
+            self.connection.execute("CREATE TEMP TABLE IF NOT EXISTS listed (filename varchar primary key)")
+            self.connection.execute("DELETE FROM temp.listed")
+        self.listing = True
+
+    def sweep(self, roots: Sequence[str], unwalked: Set[str]) -> int:
+        """Drop the rows below the roots that were not listed, unless they are below an unwalked directory.
+
+        Returns the number of files dropped.
+        """
+        self.flush()
+        gone = []
+
+        for root in roots:
+            for (filename,) in self.connection.execute(
+                "SELECT filename FROM videos WHERE (filename = ? OR (filename > ? AND filename < ?)) "
+                "AND filename NOT IN (SELECT filename FROM temp.listed) UNION "
+                "SELECT filename FROM quarantine WHERE (filename = ? OR (filename > ? AND filename < ?)) "
+                "AND filename NOT IN (SELECT filename FROM temp.listed)",
+                get_subtree_range(root) * 2,
+            ).fetchall():
+                path = filename
+                while len(path) > len(root) and path not in unwalked:
+                    path = os.path.dirname(path)
+                if path not in unwalked:
+                    gone.append((filename,))
+
+        with self.connection:
+            self.connection.executemany("DELETE FROM videos WHERE filename = ?", gone)
+            self.connection.executemany("DELETE FROM results WHERE filename = ?", gone)
+            self.connection.executemany("DELETE FROM quarantine WHERE filename = ?", gone)
+        return len(gone)
+
+    def select(self, query: str, filenames: Sequence[str]) -> List[Tuple[str, ...]]:
+        cursor = self.connection.cursor()
+        rows = []
+
+        for start in range(0, len(filenames), self.chunk_size):
+            chunk = filenames[start : start + self.chunk_size]
+            cursor.execute(query % (",".join("?" * len(chunk))), chunk)
+            rows.extend(cursor.fetchall())
+
+        cursor.close()
+        return rows
+
+    def load(self, filenames: Iterable[str]) -> None:
+        records = {filename: CacheRecord() for filename in filenames}
+        filenames = list(records)
+
+        for filename, size, modified, fields, content, parse_speed in self.select(
+            "SELECT filename, size, modified, fields, content, parse_speed FROM videos "
+            "WHERE filename IN (%s)",
+            filenames,
+        ):
+            records[filename].size = cast(int, size)
+            records[filename].modified = cast(float, modified)
+            records[filename].fields = fields
+            records[filename].content = content
+            records[filename].parse_speed = get_parse_speed(cast(Optional[float], parse_speed))
+
+        for filename, fingerprint, size, modified, value, preference, parse_speed in self.select(
+            "SELECT filename, fingerprint, size, modified, value, preference, parse_speed FROM results "
+            "WHERE filename IN (%s)",
+            filenames,
+        ):
+            records[filename].results[fingerprint] = (
+                cast(int, size),
+                cast(float, modified),
+                value,
+                preference,
+                get_parse_speed(cast(Optional[float], parse_speed)),
             )
-    elif record[1] != size or record[2] != modified:
-        tracks = tracks_generator()
-        with connection:
-            cursor.execute(
-                "UPDATE videos SET size = ?, modified = ?, tracks = ? WHERE filename = ?",
-                [size, modified, json.dumps(tracks), filename],
+
+        for filename, size, modified in self.select(
+            "SELECT filename, size, modified FROM quarantine WHERE filename IN (%s)", filenames
+        ):
+            records[filename].quarantined = (cast(int, size), cast(float, modified))
+
+        needs_tracks = [filename for filename, record in records.items() if not self.has_results(record)]
+        for filename, tracks, format in self.select(
+            "SELECT filename, tracks, format FROM videos WHERE filename IN (%s)", needs_tracks
+        ):
+            records[filename].tracks = tracks
+            records[filename].format = cast(int, format)
+
+        self.records.update(records)
+
+    def has_results(self, record: CacheRecord) -> bool:
+        return all(
+            record.size is not None
+            and record.modified is not None
+            and self.is_usable(
+                fingerprint, record.results.get(fingerprint, None), record.size, record.modified
             )
-    else:
-        tracks = json.loads(record[3])
+            for fingerprint in self.fingerprints
+        )
 
-    cursor.close()
+    def has_usable_results(self, record: CacheRecord, size: int, modified: float) -> bool:
+        """Whether every prefetched attribute has a usable result for this version of the file."""
+        return bool(self.fingerprints) and all(
+            self.is_usable(fingerprint, record.results.get(fingerprint, None), size, modified)
+            for fingerprint in self.fingerprints
+        )
+
+    def is_usable(self, fingerprint: str, result: Optional[ResultRecord], size: int, modified: float) -> bool:
+        """Whether a stored result is for this version of the file, from tracks read deeply enough."""
+        needed = min(self.parse_speeds.get(fingerprint, 0.0), self.parse_speed)
+        return result is not None and result[:2] == (size, modified) and result[4] >= needed
+
+    def get_needed_speed(self, record: CacheRecord, size: int, modified: float) -> float:
+        """The parse speed the tracks of a file must have been read at to evaluate its missing results."""
+        return max(
+            (
+                min(self.parse_speeds.get(fingerprint, 0.0), self.parse_speed)
+                for fingerprint in self.fingerprints
+                if not self.is_usable(fingerprint, record.results.get(fingerprint, None), size, modified)
+            ),
+            default=0.0,
+        )
+
+    def has_usable_tracks(self, record: CacheRecord, size: int, modified: float) -> bool:
+        return (
+            record.is_fresh(size, modified)
+            and record.has_fields(self.fields)
+            and record.parse_speed >= self.get_needed_speed(record, size, modified)
+        )
+
+    def get_record(self, filename: str) -> CacheRecord:
+        if filename not in self.records:
+            position = self.positions.get(filename, None)
+            if position is None:
+                self.load([filename])
+            else:
+                # Only keep a couple of chunks around, so memory stays flat however long the scan is.
+                start = position - 2 * self.chunk_size
+                self.records = {
+                    x: record for x, record in self.records.items() if self.positions.get(x, -1) >= start
+                }
+                if start > self.offset:
+                    for x in self.plan[: start - self.offset]:
+                        if self.positions.get(x, start) < start:
+                            del self.positions[x]
+                    del self.plan[: start - self.offset]
+                    self.offset = start
+
+                position -= self.offset
+                self.load(
+                    x for x in self.plan[position : position + self.chunk_size] if x not in self.records
+                )
+
+        return self.records[filename]
+
+    def has_tracks(self, filename: str, size: int, modified: float) -> bool:
+        """Whether the file can be analyzed without being probed, from its stored tracks or results."""
+        if filename in self.pending:
+            return self.pending[filename][:2] == (size, modified)
+
+        record = self.get_record(filename)
+        if self.has_usable_tracks(record, size, modified) or self.has_usable_results(record, size, modified):
+            return True
+
+        content = self.get_content(filename, size)
+        if content is None:
+            return False
+
+        needed = self.get_needed_speed(record, size, modified)
+        return any(
+            self.is_usable_content(fields, parse_speed, needed)
+            for fields, parse_speed in self.connection.execute(
+                "SELECT fields, parse_speed FROM videos WHERE content = ? AND size = ? AND filename != ?",
+                [content, size, filename],
+            ).fetchall()
+        )
+
+    def is_usable_content(self, fields: Optional[str], parse_speed: Optional[float], needed: float) -> bool:
+        """Whether the tracks of a row with the same content kept every field and were read deeply enough."""
+        return CacheRecord(fields=fields).has_fields(self.fields) and get_parse_speed(parse_speed) >= needed
+
+    def get_content(self, filename: str, size: int) -> Optional[str]:
+        """The content fingerprint of a file missing from the cache, kept until its tracks are stored."""
+        if not self.content:
+            return None
+
+        if filename not in self.contents:
+            self.contents[filename] = get_content_fingerprint(filename, size)
+        return self.contents[filename]
+
+    def decode(self, filename: str, record: CacheRecord) -> Optional[MediaInfoList]:
+        if record.tracks is None:
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT tracks, format FROM videos WHERE filename=?", [filename])
+            record.tracks, record.format = cursor.fetchone()
+            cursor.close()
+
+        try:
+            return FORMATS[record.format].decode(cast(TrackData, record.tracks))
+        except (KeyError, ValueError):
+            return None
+
+    def get_tracks(
+        self,
+        filename: str,
+        size: int,
+        modified: float,
+        tracks_generator: Callable[[], MediaInfoList],
+    ) -> MediaInfoList:
+        if filename in self.pending and self.pending[filename][:2] == (size, modified):
+            return FORMATS[self.pending[filename][3]].decode(self.pending[filename][2])
+
+        record = self.get_record(filename)
+        if self.has_usable_tracks(record, size, modified):
+            tracks = self.decode(filename, record)
+            if tracks is not None:
+                if record.format != self.codec.get_format() or (self.fields and record.fields is None):
+                    self.put_tracks(filename, size, modified, tracks, parse_speed=record.parse_speed)
+                return tracks
+
+        content = self.get_content(filename, size)
+        self.contents.pop(filename, None)
+        moved = None if content is None else self.find_content(filename, size, modified, content)
+        parse_speed = None
+        if moved is None:
+            self.misses += 1
+            tracks = tracks_generator()
+        else:
+            tracks, parse_speed = moved
+        self.put_tracks(filename, size, modified, tracks, content, parse_speed)
+        return tracks
+
+    def find_content(
+        self, filename: str, size: int, modified: float, content: str
+    ) -> Optional[Tuple[MediaInfoList, float]]:
+        """Take the tracks of another row with the same content, dropping that row if its file is gone.
+
+        Returns the tracks along with the parse speed they were read at.
+        """
+        needed = self.get_needed_speed(self.get_record(filename), size, modified)
+        for other, tracks, format, fields, parse_speed in self.connection.execute(
+            "SELECT filename, tracks, format, fields, parse_speed FROM videos "
+            "WHERE content = ? AND size = ? AND filename != ?",
+            [content, size, filename],
+        ).fetchall():
+            if not self.is_usable_content(fields, parse_speed, needed):
+                continue
+
+            try:
+                moved = FORMATS[format].decode(tracks)
+            except (KeyError, ValueError):
+                continue
 
-    return tracks
+            if not os.path.exists(other):
+                with self.connection:
+                    self.connection.execute("DELETE FROM videos WHERE filename = ?", [other])
+                    self.connection.execute("DELETE FROM results WHERE filename = ?", [other])
+            return moved, get_parse_speed(parse_speed)
+
+        return None
+
+    def put_tracks(
+        self,
+        filename: str,
+        size: int,
+        modified: float,
+        tracks: MediaInfoList,
+        content: Optional[str] = None,
+        parse_speed: Optional[float] = None,
+    ) -> None:
+        """Store the tracks of a file, read at this run's parse speed unless they were read at another."""
+        if self.content and content is None:
+            content = get_content_fingerprint(filename, size)
+        if parse_speed is None:
+            parse_speed = self.parse_speed
+        fields = None if self.fields is None else ",".join(sorted(self.fields))
+        data = self.codec.encode(project(tracks, self.fields))
+        self.pending[filename] = (size, modified, data, self.codec.get_format(), fields, content, parse_speed)
+        if filename in self.records:
+            self.records[filename].parse_speed = parse_speed
+
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def get_results(self, filename: str, size: int, modified: float) -> Dict[str, Optional[str]]:
+        """Return the stored values of this version of the file, keyed by attribute fingerprint.
+
+        Cached rows written before content fingerprints were enabled get theirs on the way, if backfilled.
+        """
+        self.lookups += 1
+        record = self.get_record(filename)
+        if (
+            self.content
+            and self.backfill_content
+            and record.content is None
+            and record.is_fresh(size, modified)
+        ):
+            record.content = get_content_fingerprint(filename, size)
+            if record.content is not None and filename not in self.pending:
+                self.pending_contents.append((record.content, filename))
+
+        return {
+            fingerprint: result[2]
+            for fingerprint, result in record.results.items()
+            if self.is_usable(fingerprint, result, size, modified)
+        }
+
+    def get_stats(self, root: str) -> Iterator[Stat]:
+        """Yield the cached size and modification time of the file or every file below the directory.
+
+        Rows are read in pages, so no statement is left open while results are written between them.
+        """
+        last = ""
+        while True:
+            rows: List[Stat] = self.connection.execute(
+                "SELECT filename, size, modified FROM videos "
+                "WHERE (filename = ? OR (filename > ? AND filename < ?)) AND filename > ? "
+                "ORDER BY filename LIMIT ?",
+                [*get_subtree_range(root), last, self.batch_size],
+            ).fetchall()
+            if not rows:
+                return
+
+            yield from rows
+            last = rows[-1][0]
+
+    def get_unvalidated(self, roots: Sequence[str], count: int) -> List[Stat]:
+        """The `count` files below the roots that have gone longest without their stat being checked."""
+        if not roots or count <= 0:
+            return []
+
+        condition = " OR ".join(["filename = ? OR (filename > ? AND filename < ?)"] * len(roots))
+        return self.connection.execute(
+            f"SELECT filename, size, modified FROM videos WHERE {condition} "
+            "ORDER BY validated, filename LIMIT ?",
+            [*[x for root in roots for x in get_subtree_range(root)], count],
+        ).fetchall()
+
+    def put_validated(self, filenames: Sequence[str], validated: float) -> None:
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE videos SET validated = ? WHERE filename = ?", [(validated, x) for x in filenames]
+            )
+
+    def is_quarantined(self, filename: str, size: int, modified: float) -> bool:
+        return self.get_record(filename).quarantined == (size, modified)
+
+    def put_quarantine(self, filename: str, size: int, modified: float, reason: str, failed: float) -> None:
+        self.get_record(filename).quarantined = (size, modified)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO quarantine VALUES (?,?,?,?,?)",
+                [filename, size, modified, reason, failed],
+            )
+
+    def put_results(self, filename: str, size: int, modified: float, results: Sequence[Result]) -> None:
+        """Store results evaluated from the tracks the cache last gave for this file."""
+        record = self.get_record(filename)
+        for fingerprint, value, preference in results:
+            record.results[fingerprint] = (size, modified, value, preference, record.parse_speed)
+            self.pending_results.append(
+                (filename, fingerprint, size, modified, value, preference, record.parse_speed)
+            )
+
+        if len(self.pending_results) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not (self.pending or self.pending_results or self.pending_contents or self.lookups or self.misses):
+            return
+
+        counters = [(self.lookups, "lookups"), (self.misses, "misses")]
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO videos "
+                "(filename, size, modified, tracks, format, fields, content, parse_speed) "
+                "VALUES (?,?,?,?,?,?,?,?)",
+                [(filename, *record) for filename, record in self.pending.items()],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO results "
+                "(filename, fingerprint, size, modified, value, preference, parse_speed) "
+                "VALUES (?,?,?,?,?,?,?)",
+                self.pending_results,
+            )
+            self.connection.executemany(
+                "UPDATE videos SET content = ? WHERE filename = ?", self.pending_contents
+            )
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO counters VALUES (?, 0)", [x[1:] for x in counters]
+            )
+            self.connection.executemany("UPDATE counters SET value = value + ? WHERE name = ?", counters)
+        self.pending = {}
+        self.pending_results = []
+        self.pending_contents = []
+        self.lookups = 0
+        self.misses = 0
@@ -0,0 +1,46 @@
+import os
+
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+# A file's device and inode, which identify it however it was reached.
+FileId = Tuple[int, int]
+
+DEVICE_KINDS = ["rotational", "solid_state", "other"]
+
+
+def get_device_kind(device: int) -> str:
+    """Whether a device is a rotational or solid state disk according to sysfs, or something else.
+
+    Partitions are looked up through their parent disk. Network and virtual filesystems, which have no
+    block device, are "other".
+    """
+    block = f"/sys/dev/block/{os.major(device)}:{os.minor(device)}"
+    for queue in [os.path.join(block, "queue"), os.path.join(block, "..", "queue")]:
+        try:
+            with open(os.path.join(queue, "rotational")) as file:
+                return "rotational" if file.read().strip() == "1" else "solid_state"
+        except OSError:
+            continue
+
+    return "other"
+
+
+@dataclass
+class DeviceLimits:
+    """How many files may be probed at once on each kind of device.
+
+    Keeping a rotational disk to one or two reads at a time stops it seeking between files, while the
+    other devices keep the remaining workers busy.
+    """
+
+    rotational: int = 1
+    solid_state: int = 8
+    other: int = 4
+    kinds: Dict[int, str] = field(default_factory=dict, compare=False)
+
+    def get_limit(self, device: int) -> int:
+        if device not in self.kinds:
+            self.kinds[device] = get_device_kind(device)
+
+        return max(1, int(getattr(self, self.kinds[device])))
@@ -0,0 +1,71 @@
+import os
+
+from dataclasses import dataclass, field
+from typing import FrozenSet, Sequence, Tuple
+
+# Container signatures as (offset, bytes) found at the start of a file.
+SIGNATURES: Sequence[Tuple[int, bytes]] = [
+    (0, b"\x1a\x45\xdf\xa3"),  # EBML: Matroska, WebM
+    (4, b"ftyp"),  # ISO base media: MP4, MOV, 3GP
+    (4, b"moov"),  # QuickTime without ftyp
+    (4, b"mdat"),
+    (4, b"wide"),
+    (4, b"free"),
+    (0, b"RIFF"),  # AVI
+    (0, b"\x00\x00\x01\xba"),  # MPEG program stream, VOB
+    (0, b"\x00\x00\x01\xb3"),  # MPEG video elementary stream
+    (0, b"\x30\x26\xb2\x75\x8e\x66\xcf\x11"),  # ASF: WMV
+    (0, b"FLV"),
+    (0, b"OggS"),
+    (0, b".RMF"),  # RealMedia: RM, RMVB
+]
+TS_PACKET_SIZES = [188, 192]
+SIGNATURE_SIZE = 2 * max(TS_PACKET_SIZES) + 1
+
+
+def is_transport_stream(header: bytes) -> bool:
+    """MPEG-TS and M2TS packets start with a 0x47 sync byte, M2TS after a four byte timestamp."""
+    for size in TS_PACKET_SIZES:
+        offset = size - 188
+        if header[offset : offset + 1] == b"\x47" and header[offset + size : offset + size + 1] == b"\x47":
+            return True
+
+    return False
+
+
+def has_signature(filename: str) -> bool:
+    try:
+        with open(filename, "rb") as file:
+            header = file.read(SIGNATURE_SIZE)
+    except OSError:
+        return False
+
+    for offset, signature in SIGNATURES:
+        if header[offset : offset + len(signature)] == signature:
+            return True
+
+    return is_transport_stream(header)
+
+
+@dataclass
+class VideoFilter:
+    """Decide which files are worth probing before mediainfo ever sees them.
+
+    Extensions are compared lowercase and without the dot. An empty allowlist allows every extension that
+    is not excluded, and the signature check reads the first few hundred bytes of the remaining files.
+    """
+
+    extensions: FrozenSet[str] = field(default_factory=frozenset)
+    exclude_extensions: FrozenSet[str] = field(default_factory=frozenset)
+    signatures: bool = False
+
+    def accepts_name(self, name: str) -> bool:
+        extension = os.path.splitext(name)[1][1:].lower()
+
+        if extension in self.exclude_extensions:
+            return False
+
+        return not self.extensions or extension in self.extensions
+
+    def accepts_file(self, filename: str) -> bool:
+        return not self.signatures or has_signature(filename)
@@ -0,0 +1,101 @@
+import os
+import re
+
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Pattern, Sequence
+
+IGNORE_FILE = ".videoprofignore"
+
+
+@dataclass(frozen=True)
+class IgnoreRule:
+    """One gitignore-style pattern, relative to the directory it was read in."""
+
+    base: str
+    regex: Pattern[str]
+    negate: bool
+    directory_only: bool
+
+    def matches(self, filename: str, is_dir: bool) -> bool:
+        if self.directory_only and not is_dir:
+            return False
+
+        if not filename.startswith(self.base + os.sep):
+            return False
+
+        return self.regex.fullmatch(filename[len(self.base) + 1 :].replace(os.sep, "/")) is not None
+
+
+def translate(pattern: str) -> str:
+    """Translate a gitignore glob into a regex, where only `**` crosses directory separators."""
+    regex = ""
+    i = 0
+
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2 :]:
+            end = pattern.index("]", i + 2)
+            members = pattern[i + 1 : end].replace("\\", "\\\\")
+            regex += "[^" + members[1:] + "]" if members.startswith("!") else "[" + members + "]"
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+
+    return regex
+
+
+def parse_rule(line: str, base: str) -> Optional[IgnoreRule]:
+    pattern = line.rstrip("\n").rstrip()
+    if not pattern or pattern.startswith("#"):
+        return None
+
+    negate = pattern.startswith("!")
+    if negate:
+        pattern = pattern[1:]
+    elif pattern.startswith("\\"):
+        pattern = pattern[1:]
+
+    directory_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    if not pattern:
+        return None
+
+    # Like git, a pattern without a slash matches at any depth; anything else is anchored to its directory.
+    regex = translate(pattern.lstrip("/"))
+    if "/" not in pattern:
+        regex = "(?:.*/)?" + regex
+
+    return IgnoreRule(base=base, regex=re.compile(regex), negate=negate, directory_only=directory_only)
+
+
+def parse_rules(lines: Iterable[str], base: str) -> List[IgnoreRule]:
+    return [rule for rule in (parse_rule(line, base) for line in lines) if rule is not None]
+
+
+def read_rules(directory: str) -> List[IgnoreRule]:
+    try:
+        with open(os.path.join(directory, IGNORE_FILE)) as file:
+            return parse_rules(file, directory)
+    except OSError:
+        return []
+
+
+def is_ignored(rules: Sequence[IgnoreRule], filename: str, is_dir: bool) -> bool:
+    """The last matching rule decides, so later and deeper rules can re-include what earlier ones ignore."""
+    for rule in reversed(rules):
+        if rule.matches(filename, is_dir):
+            return not rule.negate
+
+    return False
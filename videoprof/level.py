@@ -4,7 +4,7 @@ from dataclasses import dataclass
 from typing import cast
 
 
-@dataclass
+@dataclass(frozen=True)
 class Level:
     color: str = ""
     flag: bool = False
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple, Union
+
+from .codec import CODECS
+from .db import BATCH_SIZE, get_subtree_range, QuarantineRow
+
+Stats = Dict[str, Union[int, float]]
+
+
+def get_prefix_condition(prefixes: Sequence[str]) -> Tuple[str, List[str]]:
+    condition = " OR ".join(["filename = ? OR (filename > ? AND filename < ?)"] * len(prefixes)) or "1"
+    return f"({condition})", [x for prefix in prefixes for x in get_subtree_range(os.path.abspath(prefix))]
+
+
+def get_filenames(
+    connection: sqlite3.Connection, prefixes: Sequence[str] = (), batch_size: int = BATCH_SIZE
+) -> Iterator[List[str]]:
+    """Yield the cached and quarantined filenames below the prefixes, or all of them, in pages."""
+    condition, parameters = get_prefix_condition(prefixes)
+    last = ""
+
+    while True:
+        filenames = [
+            x[0]
+            for x in connection.execute(
+                f"SELECT filename FROM videos WHERE {condition} AND filename > ? UNION "
+                f"SELECT filename FROM quarantine WHERE {condition} AND filename > ? "
+                "ORDER BY filename LIMIT ?",
+                [*parameters, last, *parameters, last, batch_size],
+            )
+        ]
+        if not filenames:
+            return
+
+        yield filenames
+        last = filenames[-1]
+
+
+def find_missing(filenames: Sequence[str], executor: ThreadPoolExecutor) -> List[str]:
+    """Check each directory once, and only check the files of directories that still exist."""
+    directories = sorted({os.path.dirname(x) for x in filenames})
+    existing = {x for x, exists in zip(directories, executor.map(os.path.isdir, directories)) if exists}
+
+    candidates = [x for x in filenames if os.path.dirname(x) in existing]
+    found = {x for x, exists in zip(candidates, executor.map(os.path.exists, candidates)) if exists}
+
+    return [x for x in filenames if x not in found]
+
+
+def prune(
+    connection: sqlite3.Connection, prefixes: Sequence[str] = (), jobs: int = 8, batch_size: int = BATCH_SIZE
+) -> int:
+    """Drop the rows of files that no longer exist, checking them on `jobs` threads.
+
+    Returns the number of files dropped. Results left without a file row are dropped as well.
+    """
+    count = 0
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for filenames in get_filenames(connection, prefixes, batch_size):
+            missing = [(x,) for x in find_missing(filenames, executor)]
+            with connection:
+                connection.executemany("DELETE FROM videos WHERE filename = ?", missing)
+                connection.executemany("DELETE FROM results WHERE filename = ?", missing)
+                connection.executemany("DELETE FROM quarantine WHERE filename = ?", missing)
+            count += len(missing)
+
+    with connection:
+        connection.execute("DELETE FROM results WHERE filename NOT IN (SELECT filename FROM videos)")
+    return count
+
+
+def get_quarantine(connection: sqlite3.Connection, prefixes: Sequence[str] = ()) -> List[QuarantineRow]:
+    condition, parameters = get_prefix_condition(prefixes)
+    return connection.execute(
+        f"SELECT * FROM quarantine WHERE {condition} ORDER BY filename", parameters
+    ).fetchall()
+
+
+def clear_quarantine(connection: sqlite3.Connection, prefixes: Sequence[str] = ()) -> int:
+    """Release quarantined files below the prefixes, or all of them, so the next scan probes them again."""
+    condition, parameters = get_prefix_condition(prefixes)
+    with connection:
+        return connection.execute(f"DELETE FROM quarantine WHERE {condition}", parameters).rowcount
+
+
+def vacuum(connection: sqlite3.Connection) -> None:
+    connection.execute("ANALYZE")
+    connection.execute("VACUUM")
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def get_stats(connection: sqlite3.Connection, path: Path) -> Stats:
+    def count(query: str) -> int:
+        return int(connection.execute(query).fetchone()[0])
+
+    counters = dict(connection.execute("SELECT name, value FROM counters").fetchall())
+    lookups = counters.get("lookups", 0)
+    misses = counters.get("misses", 0)
+    formats = dict(connection.execute("SELECT format, count(*) FROM videos GROUP BY format").fetchall())
+    files = [path, path.with_name(path.name + "-wal")]
+
+    return {
+        "files": count("SELECT count(*) FROM videos"),
+        **{f"{name} tracks": formats.get(codec.get_format(), 0) for name, codec in CODECS.items()},
+        "results": count("SELECT count(*) FROM results"),
+        "directories": count("SELECT count(*) FROM directories"),
+        "projected": count("SELECT count(*) FROM videos WHERE fields IS NOT NULL"),
+        "fingerprinted": count("SELECT count(*) FROM videos WHERE content IS NOT NULL"),
+        "quarantined": count("SELECT count(*) FROM quarantine"),
+        "lookups": lookups,
+        "hits": lookups - misses,
+        "misses": misses,
+        "hit ratio": (lookups - misses) / lookups if lookups else 0.0,
+        "bytes": sum(x.stat().st_size for x in files if x.exists()),
+    }
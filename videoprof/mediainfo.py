@@ -1,10 +1,37 @@
 from pymediainfo import MediaInfo
-from typing import Dict, Sequence, Union
+from typing import Dict, List, Optional, Sequence, Union
 
 MediaAttribute = Union[str, bool, int, float]
 MediaTrack = Dict[str, MediaAttribute]
 MediaInfoList = Sequence[MediaTrack]
 
+# How much of each file libmediainfo reads, from 0 for little more than the headers to 1 for all of it.
+DEFAULT_PARSE_SPEED = 0.5
 
-def get_media_info_list(filename: str) -> MediaInfoList:
-    return [x.to_data() for x in MediaInfo.parse(filename).tracks]
+
+def get_media_info_list(filename: str, parse_speed: float = DEFAULT_PARSE_SPEED) -> MediaInfoList:
+    return [x.to_data() for x in MediaInfo.parse(filename, parse_speed=parse_speed).tracks]
+
+
+def check_library() -> None:
+    """Fail up front when libmediainfo is missing, rather than with every file probed in a worker."""
+    if not MediaInfo.can_parse():
+        raise OSError("libmediainfo could not be loaded")
+
+
+class TrackIndex:
+    """Tracks of a single video grouped by track type, built once and shared by every attribute."""
+
+    tracks: Dict[str, List[MediaTrack]]
+
+    def __init__(self, media_info: MediaInfoList):
+        self.tracks = {}
+        for track in media_info:
+            self.tracks.setdefault(str(track["track_type"]), []).append(track)
+
+    def get_first(self, track_type: str) -> Optional[MediaTrack]:
+        tracks = self.tracks.get(track_type, None)
+        return tracks[0] if tracks else None
+
+    def get_all(self, track_type: str) -> Sequence[MediaTrack]:
+        return self.tracks.get(track_type, [])
@@ -0,0 +1,444 @@
+import os
+import struct
+
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from .mediainfo import MediaInfoList, MediaTrack
+
+# The track fields the native probe reports, with the values libmediainfo would give for them.
+NATIVE_FIELDS = frozenset(["format", "width", "height", "frame_rate", "bit_depth", "scan_type", "channel_s"])
+
+# Header boxes and elements are read whole, so anything larger than this is not worth the trouble.
+MAX_HEADER_SIZE = 16 * 1024 * 1024
+READ_BUFFER_SIZE = 64 * 1024
+
+EBML_MAGIC = b"\x1a\x45\xdf\xa3"
+EBML_DOCTYPE = 0x4282
+MKV_SEGMENT = 0x18538067
+MKV_TRACKS = 0x1654AE6B
+MKV_CLUSTER = 0x1F43B675
+MKV_TRACK_ENTRY = 0xAE
+MKV_TRACK_TYPE = 0x83
+MKV_CODEC_ID = 0x86
+MKV_CODEC_PRIVATE = 0x63A2
+MKV_DEFAULT_DURATION = 0x23E383
+MKV_CONTENT_ENCODINGS = 0x6D80
+MKV_VIDEO = 0xE0
+MKV_PIXEL_WIDTH = 0xB0
+MKV_PIXEL_HEIGHT = 0xBA
+MKV_PIXEL_CROPS = [0x54AA, 0x54BB, 0x54CC, 0x54DD]
+MKV_AUDIO = 0xE1
+MKV_CHANNELS = 0x9F
+MKV_TRACK_TYPES = {1: "Video", 2: "Audio", 17: "Text"}
+
+# Codecs whose format libmediainfo reports from the codec ID alone. Others, such as DTS or TrueHD, are
+# only named once their frames are parsed, so files holding them are left to libmediainfo.
+MKV_FORMATS = {
+    "V_MPEG4/ISO/AVC": "AVC",
+    "V_MPEGH/ISO/HEVC": "HEVC",
+    "A_AC3": "AC-3",
+    "A_AAC": "AAC",
+    "A_AAC/MPEG2/LC": "AAC",
+    "A_AAC/MPEG4/LC": "AAC",
+    "A_MPEG/L2": "MPEG Audio",
+    "A_MPEG/L3": "MPEG Audio",
+    "A_PCM/INT/LIT": "PCM",
+    "A_PCM/INT/BIG": "PCM",
+    "A_OPUS": "Opus",
+    "A_VORBIS": "Vorbis",
+    "S_TEXT/UTF8": "UTF-8",
+    "S_TEXT/ASS": "ASS",
+    "S_HDMV/PGS": "PGS",
+    "S_VOBSUB": "VobSub",
+}
+MP4_FORMATS = {
+    "avc1": "AVC",
+    "avc3": "AVC",
+    "hvc1": "HEVC",
+    "hev1": "HEVC",
+    "ac-3": "AC-3",
+    "mp4a": "AAC",
+    "tx3g": "Timed Text",
+}
+MP4_HANDLERS = {"vide": "Video", "soun": "Audio", "sbtl": "Text", "text": "Text"}
+# MPEG-4 object types of mp4a entries holding AAC or MPEG audio.
+MP4_AUDIO_OBJECTS = {
+    0x40: "AAC",
+    0x66: "AAC",
+    0x67: "AAC",
+    0x68: "AAC",
+    0x69: "MPEG Audio",
+    0x6B: "MPEG Audio",
+}
+
+AAC_CHANNELS = {1: 1, 2: 2, 3: 3, 4: 4, 5: 5, 6: 6, 7: 8, 11: 7, 12: 8, 14: 8}
+AC3_CHANNELS = [2, 1, 2, 3, 3, 4, 4, 5]
+# AVC profiles whose SPS carries chroma format and bit depth.
+AVC_HIGH_PROFILES = {100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135}
+
+
+class Unsupported(Exception):
+    """The file needs libmediainfo after all."""
+
+
+def require(condition: bool) -> None:
+    if not condition:
+        raise Unsupported()
+
+
+class BitReader:
+    """Big-endian bits of an H.264 or HEVC parameter set, with its emulation prevention bytes removed."""
+
+    data: bytes
+    position: int
+
+    def __init__(self, nal: bytes):
+        self.data = nal.replace(b"\x00\x00\x03", b"\x00\x00")
+        self.position = 0
+
+    def u(self, count: int) -> int:
+        value = 0
+        for _ in range(count):
+            require(self.position < 8 * len(self.data))
+            value = (value << 1) | ((self.data[self.position // 8] >> (7 - self.position % 8)) & 1)
+            self.position += 1
+        return value
+
+    def ue(self) -> int:
+        zeros = 0
+        while self.u(1) == 0:
+            zeros += 1
+            require(zeros < 32)
+        return (1 << zeros) - 1 + self.u(zeros)
+
+    def se(self) -> int:
+        value = self.ue()
+        return (value + 1) // 2 if value % 2 else -(value // 2)
+
+
+def read_avc_sps(sps: bytes) -> Tuple[int, bool]:
+    """The bit depth and whether every picture is a frame, read from an AVC sequence parameter set."""
+    bits = BitReader(sps[1:])
+    profile = bits.u(8)
+    bits.u(16)
+    bits.ue()
+    bit_depth = 8
+
+    if profile in AVC_HIGH_PROFILES:
+        if bits.ue() == 3:
+            bits.u(1)
+        bit_depth = bits.ue() + 8
+        bits.ue()
+        bits.u(1)
+        if bits.u(1):
+            for index in range(12 if profile == 244 else 8):
+                if bits.u(1):
+                    last, scale = 8, 8
+                    for _ in range(16 if index < 6 else 64):
+                        if scale:
+                            scale = (last + bits.se()) % 256
+                        last = scale or last
+
+    bits.ue()
+    pic_order_cnt_type = bits.ue()
+    if pic_order_cnt_type == 0:
+        bits.ue()
+    elif pic_order_cnt_type == 1:
+        bits.u(1)
+        bits.se()
+        bits.se()
+        for _ in range(bits.ue()):
+            bits.se()
+    bits.ue()
+    bits.u(1)
+    bits.ue()
+    bits.ue()
+
+    return bit_depth, bits.u(1) == 1
+
+
+def read_avc_config(config: bytes) -> MediaTrack:
+    """Bit depth and scan type from the first SPS of an avcC record.
+
+    Interlaced streams are left to libmediainfo, which needs their frames to tell MBAFF from fields.
+    """
+    require(len(config) > 8 and config[0] == 1 and config[5] & 0x1F > 0)
+    length = struct.unpack(">H", config[6:8])[0]
+    bit_depth, frames_only = read_avc_sps(config[8 : 8 + length])
+    require(frames_only)
+    return {"bit_depth": bit_depth, "scan_type": "Progressive"}
+
+
+def read_hevc_config(config: bytes) -> MediaTrack:
+    """The bit depth of an hvcC record; libmediainfo gives no scan type for HEVC without field SEI."""
+    require(len(config) > 18 and config[0] == 1)
+    return {"bit_depth": (config[17] & 0x07) + 8}
+
+
+def get_frame_rate(frame_duration: float) -> str:
+    return f"{1 / frame_duration:.3f}"
+
+
+def read_vint(data: bytes, position: int, keep_marker: bool) -> Tuple[int, int]:
+    require(position < len(data) and data[position] != 0)
+    length = 9 - data[position].bit_length()
+    require(position + length <= len(data))
+    value = int.from_bytes(data[position : position + length], "big")
+    if not keep_marker:
+        value &= (1 << (7 * length)) - 1
+    return value, position + length
+
+
+def iter_elements(data: bytes) -> Iterator[Tuple[int, bytes]]:
+    position = 0
+    while position < len(data):
+        element, position = read_vint(data, position, True)
+        size, position = read_vint(data, position, False)
+        require(position + size <= len(data))
+        yield element, data[position : position + size]
+        position += size
+
+
+def get_elements(data: bytes) -> Dict[int, bytes]:
+    return {element: payload for element, payload in iter_elements(data)}
+
+
+def get_uint(payload: bytes) -> int:
+    return int.from_bytes(payload, "big")
+
+
+def read_header(file: BinaryIO, size: int) -> bytes:
+    require(size <= MAX_HEADER_SIZE)
+    data = file.read(size)
+    require(len(data) == size)
+    return data
+
+
+def read_file_vint(file: BinaryIO, keep_marker: bool) -> Tuple[int, bool]:
+    """A variable-length integer from the file, and whether it is the reserved 'unknown' value."""
+    first = file.read(1)
+    require(len(first) == 1 and first[0] != 0)
+    length = 9 - first[0].bit_length()
+    data = first + file.read(length - 1)
+    require(len(data) == length)
+    value, _ = read_vint(data, 0, keep_marker)
+    return value, not keep_marker and value == (1 << (7 * length)) - 1
+
+
+def read_matroska_track(entry: bytes) -> Optional[MediaTrack]:
+    elements = get_elements(entry)
+    require(MKV_CONTENT_ENCODINGS not in elements)
+    track_type = MKV_TRACK_TYPES.get(get_uint(elements.get(MKV_TRACK_TYPE, b"")))
+    if track_type is None:
+        return None
+
+    codec_id = elements.get(MKV_CODEC_ID, b"").rstrip(b"\x00").decode("ascii", "replace")
+    require(codec_id in MKV_FORMATS)
+    track: MediaTrack = {"track_type": track_type, "format": MKV_FORMATS[codec_id]}
+
+    if track_type == "Video":
+        video = get_elements(elements.get(MKV_VIDEO, b""))
+        require(
+            MKV_DEFAULT_DURATION in elements and not any(get_uint(video.get(x, b"")) for x in MKV_PIXEL_CROPS)
+        )
+        track["width"] = get_uint(video[MKV_PIXEL_WIDTH])
+        track["height"] = get_uint(video[MKV_PIXEL_HEIGHT])
+        track["frame_rate"] = get_frame_rate(get_uint(elements[MKV_DEFAULT_DURATION]) / 1e9)
+        private = elements.get(MKV_CODEC_PRIVATE, b"")
+        track.update(read_avc_config(private) if track["format"] == "AVC" else read_hevc_config(private))
+    elif track_type == "Audio":
+        audio = get_elements(elements.get(MKV_AUDIO, b""))
+        track["channel_s"] = get_uint(audio.get(MKV_CHANNELS, b"\x01"))
+
+    return track
+
+
+def read_matroska(file: BinaryIO) -> MediaInfoList:
+    """Skip through the top level of the first segment to its Tracks element, which comes before any
+    Cluster in files written by any common muxer."""
+    file.seek(0)
+    element, _ = read_file_vint(file, True)
+    size, _ = read_file_vint(file, False)
+    doctype = get_elements(read_header(file, size)).get(EBML_DOCTYPE, b"matroska")
+    general_format = "WebM" if doctype.rstrip(b"\x00") == b"webm" else "Matroska"
+
+    element, _ = read_file_vint(file, True)
+    require(element == MKV_SEGMENT)
+    read_file_vint(file, False)
+
+    while True:
+        element, _ = read_file_vint(file, True)
+        size, unknown = read_file_vint(file, False)
+        require(not unknown and element != MKV_CLUSTER)
+        if element == MKV_TRACKS:
+            break
+        file.seek(size, os.SEEK_CUR)
+
+    tracks = [
+        track
+        for element, entry in iter_elements(read_header(file, size))
+        if element == MKV_TRACK_ENTRY
+        for track in [read_matroska_track(entry)]
+        if track is not None
+    ]
+    return get_media_info_list(general_format, tracks)
+
+
+def iter_boxes(data: bytes) -> Iterator[Tuple[str, bytes]]:
+    position = 0
+    while position + 8 <= len(data):
+        size, kind = struct.unpack(">I4s", data[position : position + 8])
+        require(size >= 8 and position + size <= len(data))
+        yield kind.decode("latin-1"), data[position + 8 : position + size]
+        position += size
+
+
+def get_boxes(data: bytes) -> Dict[str, bytes]:
+    return {kind: payload for kind, payload in iter_boxes(data)}
+
+
+def read_descriptor(data: bytes, position: int) -> Tuple[int, bytes, int]:
+    require(position < len(data))
+    tag = data[position]
+    size = 0
+    position += 1
+    for _ in range(4):
+        require(position < len(data))
+        size = (size << 7) | (data[position] & 0x7F)
+        position += 1
+        if not data[position - 1] & 0x80:
+            break
+    require(position + size <= len(data))
+    return tag, data[position : position + size], position + size
+
+
+def read_esds(esds: bytes) -> Tuple[int, bytes]:
+    """The object type and decoder specific configuration of an elementary stream descriptor."""
+    tag, descriptor, _ = read_descriptor(esds, 4)
+    require(tag == 3 and len(descriptor) >= 3)
+    position = 3
+    if descriptor[2] & 0x80:
+        position += 2
+    if descriptor[2] & 0x40:
+        require(position < len(descriptor))
+        position += 1 + descriptor[position]
+    if descriptor[2] & 0x20:
+        position += 2
+
+    tag, decoder, _ = read_descriptor(descriptor, position)
+    require(tag == 4 and len(decoder) >= 13)
+    config = b""
+    if len(decoder) > 13:
+        tag, payload, _ = read_descriptor(decoder, 13)
+        if tag == 5:
+            config = payload
+    return decoder[0], config
+
+
+def get_aac_channels(config: bytes) -> int:
+    bits = BitReader(config)
+    if bits.u(5) == 31:
+        bits.u(6)
+    if bits.u(4) == 15:
+        bits.u(24)
+    channel_configuration = bits.u(4)
+    require(channel_configuration in AAC_CHANNELS)
+    return AAC_CHANNELS[channel_configuration]
+
+
+def read_mp4_track(trak: bytes) -> Optional[MediaTrack]:
+    mdia = get_boxes(get_boxes(trak)["mdia"])
+    track_type = MP4_HANDLERS.get(mdia["hdlr"][8:12].decode("latin-1"))
+    if track_type is None:
+        return None
+
+    stbl = get_boxes(get_boxes(mdia["minf"])["stbl"])
+    stsd = stbl["stsd"]
+    require(struct.unpack(">I", stsd[4:8])[0] == 1)
+    (kind, entry), *_ = iter_boxes(stsd[8:])
+    require(kind in MP4_FORMATS)
+    track: MediaTrack = {"track_type": track_type, "format": MP4_FORMATS[kind]}
+
+    if track_type == "Video":
+        version = mdia["mdhd"][0]
+        timescale = struct.unpack(">I", mdia["mdhd"][20:24] if version == 1 else mdia["mdhd"][12:16])[0]
+        stts = stbl["stts"]
+        require(struct.unpack(">I", stts[4:8])[0] == 1 and timescale > 0)
+        track["width"], track["height"] = struct.unpack(">HH", entry[24:28])
+        track["frame_rate"] = get_frame_rate(struct.unpack(">I", stts[12:16])[0] / timescale)
+        children = get_boxes(entry[78:])
+        track.update(
+            read_avc_config(children["avcC"])
+            if track["format"] == "AVC"
+            else read_hevc_config(children["hvcC"])
+        )
+    elif track_type == "Audio":
+        require(struct.unpack(">H", entry[8:10])[0] == 0)
+        channels = struct.unpack(">H", entry[16:18])[0]
+        children = get_boxes(entry[28:])
+        if kind == "mp4a":
+            object_type, config = read_esds(children["esds"])
+            require(object_type in MP4_AUDIO_OBJECTS)
+            track["format"] = MP4_AUDIO_OBJECTS[object_type]
+            if track["format"] == "AAC":
+                channels = get_aac_channels(config)
+        elif kind == "ac-3":
+            bits = BitReader(children["dac3"])
+            bits.u(10)
+            acmod = bits.u(3)
+            channels = AC3_CHANNELS[acmod] + bits.u(1)
+        track["channel_s"] = channels
+
+    return track
+
+
+def read_mp4(file: BinaryIO) -> MediaInfoList:
+    """Skip through the top-level boxes to the movie box, wherever it is, and read its track headers."""
+    file.seek(0)
+    while True:
+        header = file.read(8)
+        require(len(header) == 8)
+        size, kind = struct.unpack(">I4s", header)
+        if size == 1:
+            size = struct.unpack(">Q", file.read(8))[0] - 8
+        require(size >= 8)
+        if kind == b"moov":
+            break
+        file.seek(size - 8, os.SEEK_CUR)
+
+    tracks = [
+        track
+        for kind, trak in iter_boxes(read_header(file, size - 8))
+        if kind == "trak"
+        for track in [read_mp4_track(trak)]
+        if track is not None
+    ]
+    return get_media_info_list("MPEG-4", tracks)
+
+
+def get_media_info_list(general_format: str, tracks: List[MediaTrack]) -> MediaInfoList:
+    """Order the tracks by kind, as libmediainfo does, after a General track carrying the first frame rate."""
+    general: MediaTrack = {"track_type": "General", "format": general_format}
+    videos = [x for x in tracks if x["track_type"] == "Video"]
+    if videos:
+        general["frame_rate"] = videos[0]["frame_rate"]
+
+    return [general, *[x for kind in MKV_TRACK_TYPES.values() for x in tracks if x["track_type"] == kind]]
+
+
+def probe_native(filename: str) -> Optional[MediaInfoList]:
+    """The tracks of a Matroska or MP4 file read from its headers alone, or None if it needs libmediainfo.
+
+    Only NATIVE_FIELDS are reported, for the codecs libmediainfo names from their headers.
+    """
+    try:
+        with open(filename, "rb", buffering=READ_BUFFER_SIZE) as file:
+            magic = file.read(8)
+            if magic[:4] == EBML_MAGIC:
+                return read_matroska(file)
+            if magic[4:8] == b"ftyp":
+                return read_mp4(file)
+    except (Unsupported, OSError, KeyError, IndexError, ValueError, struct.error):
+        pass
+
+    return None
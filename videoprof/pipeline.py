@@ -0,0 +1,120 @@
+import threading
+import time
+
+from itertools import islice, tee
+from pathlib import Path
+from queue import Full, Queue
+from typing import cast, Iterable, Iterator, Optional, Sequence, Tuple, TypeVar
+
+from .attribute import Attribute
+from .backend import LibraryBackend, ProbeBackend
+from .db import TrackCache
+from .device import DeviceLimits
+from .pool import Probe, ProbeFailure, probe_media_info_lists, probe_serially
+from .video import SingleVideo, Video
+from .walk import WalkEntry
+
+# A video along with the walk entry it was found as.
+Item = Tuple[Video, WalkEntry]
+
+# Number of walk entries found ahead of the file being analyzed.
+WALK_AHEAD = 4096
+
+T = TypeVar("T")
+
+
+def read_ahead(items: Iterable[T], size: int = WALK_AHEAD) -> Iterator[T]:
+    """Iterate over `items` on a background thread, keeping up to `size` of them ready for the consumer.
+
+    A slow producer, such as a walk over a network share, then runs while the consumer probes and analyzes
+    what it found so far, and the bounded queue keeps it from running further ahead than that. Whatever the
+    producer raises is raised by this iterator. Closing the iterator stops the producer at its next item.
+    """
+    queue: "Queue[Tuple[bool, Optional[T], Optional[BaseException]]]" = Queue(size)
+    stopped = threading.Event()
+
+    def put(done: bool, item: Optional[T] = None, error: Optional[BaseException] = None) -> bool:
+        while not stopped.is_set():
+            try:
+                queue.put((done, item, error), timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if not put(False, item):
+                    return
+            put(True)
+        except BaseException as e:
+            put(True, error=e)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            done, item, error = queue.get()
+            if error is not None:
+                raise error
+            if done:
+                return
+            yield cast(T, item)
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def plan_videos(
+    entries: Iterable[WalkEntry], cache: TrackCache, fingerprints: Sequence[str]
+) -> Iterator[Item]:
+    """Turn walk entries into videos, planning the cache reads for each chunk before it is yielded."""
+    iterator = iter(entries)
+
+    while True:
+        chunk = list(islice(iterator, cache.chunk_size))
+        if not chunk:
+            return
+
+        cache.prefetch((entry.filename for entry in chunk), fingerprints)
+        for entry in chunk:
+            video = SingleVideo(
+                path=Path(entry.path),
+                filename=entry.filename,
+                stat=(entry.size, entry.modified),
+                file_id=entry.file_id,
+            )
+            yield video, entry
+
+
+def analyze_videos(
+    items: Iterable[Item],
+    attributes: Sequence[Attribute],
+    cache: TrackCache,
+    jobs: int,
+    timeout: float = 0.0,
+    limits: DeviceLimits = DeviceLimits(),
+    backend: ProbeBackend = LibraryBackend(),
+) -> Iterator[Item]:
+    """Analyze each video as it arrives, probing cache misses a few files ahead on `jobs` processes.
+
+    With a `timeout`, even a single job probes in a worker process, so a file that hangs or crashes the
+    parser is quarantined and skipped rather than stalling or aborting the scan. Quarantined files are
+    skipped until they change.
+    """
+    items, ahead = tee(items)
+    videos = (video for video, _ in ahead)
+    probes: Iterator[Optional[Probe]] = (
+        probe_media_info_lists(videos, cache, jobs, timeout, limits, backend)
+        if jobs > 1 or timeout > 0
+        else probe_serially(videos, cache, backend)
+    )
+
+    for item, probe in zip(items, probes):
+        video, entry = item
+        if isinstance(probe, ProbeFailure):
+            cache.put_quarantine(video.get_filename(), entry.size, entry.modified, probe.reason, time.time())
+        elif not video.is_quarantined(cache):
+            video.analyze(attributes, cache, probe)
+            yield item
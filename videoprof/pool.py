@@ -0,0 +1,306 @@
+import heapq
+import multiprocessing
+import os
+import time
+
+from collections import deque
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection, wait
+from multiprocessing.process import BaseProcess
+from types import TracebackType
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Type, Union
+
+from .backend import LibraryBackend, ProbeBackend
+from .db import TrackCache
+from .device import DeviceLimits
+from .mediainfo import MediaInfoList
+from .video import Video
+
+# Number of probes kept in flight per worker, so workers never wait on the parent between files.
+QUEUE_DEPTH = 4
+# Number of files read ahead of the oldest one not yet yielded, looking for another device for idle workers.
+MAX_AHEAD = 1024
+
+
+@dataclass(frozen=True)
+class ProbeFailure:
+    """Why a file could not be probed, recorded in the quarantine instead of its tracks."""
+
+    reason: str
+
+
+Probe = Union[MediaInfoList, ProbeFailure]
+
+
+def probe_files(backend: ProbeBackend, filenames: Sequence[str]) -> List[Probe]:
+    """Probe the files together, and one by one if that fails, so an error only fails its own file."""
+    try:
+        media_info_lists = backend.probe(filenames)
+    except Exception as e:
+        if len(filenames) > 1:
+            return [probe for filename in filenames for probe in probe_files(backend, [filename])]
+        return [ProbeFailure(f"{type(e).__name__}: {e}")]
+
+    return [media_info_lists.get(x, ProbeFailure("No tracks were reported")) for x in filenames]
+
+
+def serve(connection: Connection, backend: ProbeBackend) -> None:
+    """Probe each batch of filenames received until the parent closes the connection or sends None."""
+    while True:
+        try:
+            filenames = connection.recv()
+        except EOFError:
+            return
+        if filenames is None:
+            return
+
+        connection.send(probe_files(backend, filenames))
+
+
+# A queued probe: the directory and inode that order it within its device, its ticket and its filename.
+Job = Tuple[str, int, int, str]
+
+
+@dataclass
+class Worker:
+    process: BaseProcess
+    connection: Connection
+    jobs: List[Job] = field(default_factory=list)
+    device: int = 0
+    deadline: float = 0.0
+
+
+class ProbePool:
+    """Worker processes probing one file at a time, each replaced when its file takes over `timeout` seconds.
+
+    A worker that hangs, or dies, on a file is killed and that file fails instead of stalling the scan.
+    Backends that probe several files per call get batches from one device, with the timeout of each
+    file added up; when a batch fails that way, its files are queued again to be probed alone.
+
+    Files are queued by device, and no more of a device's files are probed at once than its limit allows,
+    so several disks are read in parallel without any one of them seeking between files. Each device's
+    files are handed out by directory and inode, close to the order they are laid out in, and the device
+    holding the oldest queued file goes first.
+    """
+
+    jobs: int
+    timeout: float
+    limits: DeviceLimits
+    backend: ProbeBackend
+    workers: List[Worker]
+    queues: Dict[int, List[Job]]
+    reading: Dict[int, int]
+    alone: Set[int]
+    results: Dict[int, Probe]
+    submitted: int
+
+    def __init__(
+        self,
+        jobs: int,
+        timeout: float = 0.0,
+        limits: DeviceLimits = DeviceLimits(),
+        backend: ProbeBackend = LibraryBackend(),
+    ):
+        self.jobs = jobs
+        self.timeout = timeout
+        self.limits = limits
+        self.backend = backend
+        self.workers = []
+        self.queues = {}
+        self.reading = {}
+        self.alone = set()
+        self.results = {}
+        self.submitted = 0
+
+    def __enter__(self) -> "ProbePool":
+        self.workers = [self.start() for _ in range(self.jobs)]
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        for worker in self.workers:
+            if not worker.jobs:
+                worker.connection.send(None)
+            else:
+                worker.process.terminate()
+        for worker in self.workers:
+            worker.process.join()
+            worker.connection.close()
+
+    def start(self) -> Worker:
+        connection, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=serve, args=(child, self.backend), daemon=True)
+        process.start()
+        child.close()
+        return Worker(process=process, connection=connection)
+
+    def submit(self, filename: str, device: int = 0, inode: int = 0) -> int:
+        ticket = self.submitted
+        self.submitted += 1
+        heapq.heappush(
+            self.queues.setdefault(device, []), (os.path.dirname(filename), inode, ticket, filename)
+        )
+        # More files are on their way, so only full batches are handed out until a result is waited on.
+        self.poll(0, partial=False)
+        return ticket
+
+    def get(self, ticket: int) -> Probe:
+        while ticket not in self.results:
+            self.poll(None)
+        return self.results.pop(ticket)
+
+    def get_ready_devices(self, partial: bool = True) -> List[int]:
+        """The devices under their limit with queued files, and with a full batch of them unless `partial`."""
+        return [
+            device
+            for device, queue in self.queues.items()
+            if queue
+            and self.reading.get(device, 0) < self.limits.get_limit(device)
+            and (partial or len(queue) >= self.backend.get_batch_size() or queue[0][2] in self.alone)
+        ]
+
+    def is_starved(self) -> bool:
+        """Whether a worker is idle with no full batch it may be handed, so more files should be queued."""
+        return any(not worker.jobs for worker in self.workers) and not self.get_ready_devices(partial=False)
+
+    def take(self, partial: bool = True) -> Optional[Tuple[int, List[Job]]]:
+        devices = self.get_ready_devices(partial)
+        if not devices:
+            return None
+
+        device = min(devices, key=lambda x: min(job[2] for job in self.queues[x]))
+        self.reading[device] = self.reading.get(device, 0) + 1
+        queue = self.queues[device]
+        jobs = [heapq.heappop(queue)]
+        while (
+            queue
+            and len(jobs) < self.backend.get_batch_size()
+            and jobs[0][2] not in self.alone
+            and queue[0][2] not in self.alone
+        ):
+            jobs.append(heapq.heappop(queue))
+
+        return device, jobs
+
+    def dispatch(self, partial: bool = True) -> None:
+        for worker in self.workers:
+            if not worker.jobs:
+                taken = self.take(partial)
+                if taken is None:
+                    return
+
+                worker.device, worker.jobs = taken
+                worker.deadline = time.monotonic() + self.timeout * len(worker.jobs)
+                worker.connection.send([job[3] for job in worker.jobs])
+
+    def poll(self, timeout: Optional[float], partial: bool = True) -> None:
+        """Hand out queued files and collect what finished, waiting up to `timeout` or the next deadline.
+
+        Unless `partial`, devices only get files once they have a full batch of them queued.
+        """
+        self.dispatch(partial)
+        busy = [worker for worker in self.workers if worker.jobs]
+        if not busy:
+            return
+
+        if self.timeout > 0:
+            remaining = max(0.0, min(worker.deadline for worker in busy) - time.monotonic())
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        ready = wait([worker.connection for worker in busy], timeout)
+
+        for index, worker in enumerate(self.workers):
+            if not worker.jobs:
+                continue
+
+            if worker.connection in ready:
+                try:
+                    self.results.update(zip((job[2] for job in worker.jobs), worker.connection.recv()))
+                    self.release(worker)
+                    continue
+                except EOFError:
+                    worker.process.join()
+                    reason = f"Worker exited with code {worker.process.exitcode}"
+            elif self.timeout > 0 and time.monotonic() >= worker.deadline:
+                reason = f"Timed out after {self.timeout:g} seconds"
+            else:
+                continue
+
+            if len(worker.jobs) > 1:
+                for job in worker.jobs:
+                    self.alone.add(job[2])
+                    heapq.heappush(self.queues[worker.device], job)
+            else:
+                self.results[worker.jobs[0][2]] = ProbeFailure(reason)
+            self.release(worker)
+            worker.process.kill()
+            worker.process.join()
+            worker.connection.close()
+            self.workers[index] = self.start()
+
+        self.dispatch(partial)
+
+    def release(self, worker: Worker) -> None:
+        self.reading[worker.device] -= 1
+        worker.jobs = []
+
+
+def probe_media_info_lists(
+    videos: Iterable[Video],
+    cache: TrackCache,
+    jobs: int,
+    timeout: float = 0.0,
+    limits: DeviceLimits = DeviceLimits(),
+    backend: ProbeBackend = LibraryBackend(),
+) -> Iterator[Optional[Probe]]:
+    """Yield the media info of each video, in order, parsing cache misses on a pool of worker processes.
+
+    Videos that are already cached or quarantined yield None so the caller reads them from the SQLite
+    cache itself; the workers only ever see filenames, so the cache and its connection never leave the
+    parent process. A file that fails or takes longer than `timeout` seconds yields a ProbeFailure.
+
+    Files are read `jobs * QUEUE_DEPTH` batches ahead of the one to yield next, and further, up to
+    MAX_AHEAD, while workers are idle for want of a full batch on a device under its limit, so that files on
+    the next device in walk order are probed alongside the current one. Results are held until their turn.
+    """
+    backend.check()
+
+    window = jobs * QUEUE_DEPTH * backend.get_batch_size()
+    limit = max(window, MAX_AHEAD)
+
+    with ProbePool(jobs, timeout, limits, backend) as pool:
+        pending: Deque[Optional[int]] = deque()
+
+        for video in videos:
+            if video.is_cached(cache) or video.is_quarantined(cache):
+                pending.append(None)
+            else:
+                try:
+                    device, inode = video.get_file_id()
+                except OSError:
+                    device, inode = 0, 0
+                pending.append(pool.submit(video.get_filename(), device, inode))
+
+            while len(pending) > limit or (len(pending) > window and not pool.is_starved()):
+                ticket = pending.popleft()
+                yield None if ticket is None else pool.get(ticket)
+
+        while pending:
+            ticket = pending.popleft()
+            yield None if ticket is None else pool.get(ticket)
+
+
+def probe_serially(
+    videos: Iterable[Video], cache: TrackCache, backend: ProbeBackend = LibraryBackend()
+) -> Iterator[Optional[Probe]]:
+    """Like probe_media_info_lists, but probing each cache miss in this process, without a timeout."""
+    backend.check()
+
+    for video in videos:
+        if video.is_cached(cache) or video.is_quarantined(cache):
+            yield None
+        else:
+            yield probe_files(backend, [video.get_filename()])[0]
@@ -1,7 +1,8 @@
 import re
 
 from abc import abstractmethod, ABC
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
 from .level import Level, DEFAULT_LEVEL
 
 
@@ -14,6 +15,10 @@ class Preference(ABC):
     def match(self, target: str) -> bool:
         raise NotImplementedError
 
+    @abstractmethod
+    def get_literal(self) -> Optional[str]:
+        raise NotImplementedError
+
     @abstractmethod
     def __hash__(self) -> int:
         raise NotImplementedError
@@ -32,14 +37,21 @@ class SinglePreference(Preference):
     title: str
     pattern: str
     level: Level = DEFAULT_LEVEL
+    regex: Optional[Pattern[str]] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.regex = None if self.pattern.isalnum() else re.compile(self.pattern)
 
     def get_title(self) -> str:
         return self.title
 
     def match(self, target: str) -> bool:
-        if self.pattern.isalnum():
+        if self.regex is None:
             return target == self.pattern
-        return bool(re.match(self.pattern, target))
+        return bool(self.regex.match(target))
+
+    def get_literal(self) -> Optional[str]:
+        return self.pattern if self.regex is None else None
 
     def __hash__(self) -> int:
         return hash(self.title)
@@ -49,3 +61,57 @@ class SinglePreference(Preference):
 
     def render(self, input: str) -> str:
         return self.level.render(input)
+
+
+class PreferenceMatcher:
+    """Find the first preference matching a value without testing the whole list on every lookup.
+
+    Literal preferences are indexed in a dict and only patterns listed before the first literal match
+    are tested. The list is only ever appended to, so the first match for a value never changes and
+    lookups are memoized per value, including the preferences learned for unmatched values.
+    """
+
+    preferences: List[Preference]
+    literals: Dict[str, int]
+    patterns: List[Tuple[int, Preference]]
+    matches: Dict[str, Preference]
+
+    def __init__(self, preferences: List[Preference]):
+        self.preferences = preferences
+        self.literals = {}
+        self.patterns = []
+        self.matches = {}
+
+        for position, preference in enumerate(preferences):
+            self.index(position, preference)
+
+    def index(self, position: int, preference: Preference) -> None:
+        literal = preference.get_literal()
+        if literal is None:
+            self.patterns.append((position, preference))
+        elif literal not in self.literals:
+            self.literals[literal] = position
+
+    def find(self, value: str) -> Optional[Preference]:
+        position = self.literals.get(value, None)
+
+        for index, preference in self.patterns:
+            if position is not None and index > position:
+                break
+            if preference.match(value):
+                return preference
+
+        return None if position is None else self.preferences[position]
+
+    def match(self, value: str, create: Callable[[str], Preference]) -> Preference:
+        preference = self.matches.get(value, None)
+
+        if preference is None:
+            preference = self.find(value)
+            if preference is None:
+                preference = create(value)
+                self.index(len(self.preferences), preference)
+                self.preferences.append(preference)
+            self.matches[value] = preference
+
+        return preference
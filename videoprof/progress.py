@@ -1,12 +1,10 @@
-import math
 import sys
-from typing import Callable, Sequence, TypeVar
+from typing import Iterable, Iterator, TypeVar
 
 T = TypeVar("T")
 
 
-def show_progress(items: Sequence[T], process: Callable[[T], None]) -> None:
-    for x in range(0, len(items)):
-        progress = math.trunc(10000 * (x + 1) / len(items)) / 100
-        print(f"> {progress}%  ", end="\r", flush=True, file=sys.stderr)
-        process(items[x])
+def show_progress(items: Iterable[T]) -> Iterator[T]:
+    for count, item in enumerate(items, 1):
+        print(f"> {count}  ", end="\r", flush=True, file=sys.stderr)
+        yield item
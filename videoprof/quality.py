@@ -1,10 +1,12 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Optional
 
 from .attribute import Attribute
 from .preference import Preference
 
 
-@dataclass
+@dataclass(frozen=True)
 class Quality:
     attribute: Attribute
     preference: Preference
+    value: Optional[str] = field(default=None, compare=False)
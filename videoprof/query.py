@@ -0,0 +1,168 @@
+import os
+import sqlite3
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+from .attribute import Attribute
+from .preference import Preference
+from .quality import Quality
+
+# An SQL condition along with its parameters.
+Condition = Tuple[str, List[Any]]
+
+
+@dataclass
+class ResultFilter:
+    """Files whose stored result for the attribute has the given value or preference title, or not."""
+
+    attribute: Attribute
+    target: str
+    negate: bool = False
+
+    def get_condition(self) -> Condition:
+        operator = "NOT IN" if self.negate else "IN"
+        return (
+            f"filename {operator} (SELECT filename FROM results "
+            "WHERE fingerprint = ? AND (value = ? OR preference = ?))",
+            [self.attribute.get_fingerprint(), self.target, self.target],
+        )
+
+
+def parse_filter(text: str, attributes: Sequence[Attribute]) -> ResultFilter:
+    """Parse `Attribute Title=target` or `Attribute Title!=target`, matching the title case-insensitively."""
+    title, separator, target = text.partition("=")
+    negate = title.endswith("!")
+    if negate:
+        title = title[:-1]
+    if not separator or not target.strip():
+        raise ValueError(f"Expected 'Attribute=value' but got '{text}'")
+
+    for attribute in attributes:
+        if attribute.get_title().lower() == title.strip().lower():
+            return ResultFilter(attribute=attribute, target=target.strip(), negate=negate)
+
+    raise ValueError(f"Unknown attribute '{title.strip()}'")
+
+
+class ResultQuery:
+    """Summaries and file lists computed in SQL from the stored attribute results, without walking or probing.
+
+    The results table is a narrow key/value table of (filename, attribute fingerprint, value, preference),
+    indexed by fingerprint and value, so filters become indexed subqueries. Results reflect the files as
+    they were at their last scan.
+    """
+
+    connection: sqlite3.Connection
+    attributes: Sequence[Attribute]
+    by_fingerprint: Dict[str, Attribute]
+    under: Sequence[str]
+    filters: Sequence[ResultFilter]
+    only_flagged: bool
+
+    def __init__(
+        self,
+        connection: sqlite3.Connection,
+        attributes: Sequence[Attribute],
+        under: Sequence[str] = (),
+        filters: Sequence[ResultFilter] = (),
+        only_flagged: bool = False,
+    ):
+        self.connection = connection
+        self.attributes = attributes
+        self.by_fingerprint = {attribute.get_fingerprint(): attribute for attribute in attributes}
+        self.under = [os.path.abspath(x) for x in under]
+        self.filters = filters
+        self.only_flagged = only_flagged
+
+    def get_fingerprint_condition(self) -> Condition:
+        return f"fingerprint IN ({','.join('?' * len(self.by_fingerprint))})", list(self.by_fingerprint)
+
+    def get_under_condition(self) -> Condition:
+        if not self.under:
+            return "1", []
+
+        conditions = []
+        parameters = []
+        for directory in self.under:
+            conditions.append("filename > ? AND filename < ?")
+            parameters.extend([directory + os.sep, directory + chr(ord(os.sep) + 1)])
+
+        return f"({' OR '.join(conditions)})", parameters
+
+    def get_flagged_condition(self) -> Condition:
+        """Matching each stored value group once tells which preference titles are flagged."""
+        fingerprints, fingerprint_parameters = self.get_fingerprint_condition()
+        under, under_parameters = self.get_under_condition()
+        conditions = []
+        parameters = []
+
+        for fingerprint, title, value in self.connection.execute(
+            "SELECT fingerprint, preference, min(value) FROM results "
+            f"WHERE {fingerprints} AND {under} AND value IS NOT NULL GROUP BY fingerprint, preference",
+            fingerprint_parameters + under_parameters,
+        ):
+            if self.by_fingerprint[fingerprint].match(value).is_flagged():
+                conditions.append("(fingerprint = ? AND preference = ?)")
+                parameters.extend([fingerprint, title])
+
+        if not conditions:
+            return "0", []
+
+        return f"filename IN (SELECT filename FROM results WHERE {' OR '.join(conditions)})", parameters
+
+    def get_selection(self) -> Condition:
+        """A subquery of the filenames matching every condition of this query."""
+        conditions = [self.get_fingerprint_condition(), self.get_under_condition()]
+        conditions.extend(x.get_condition() for x in self.filters)
+        if self.only_flagged:
+            conditions.append(self.get_flagged_condition())
+
+        return (
+            f"SELECT DISTINCT filename FROM results WHERE {' AND '.join(x[0] for x in conditions)}",
+            [parameter for x in conditions for parameter in x[1]],
+        )
+
+    def count(self) -> int:
+        selection, parameters = self.get_selection()
+        return int(self.connection.execute(f"SELECT count(*) FROM ({selection})", parameters).fetchone()[0])
+
+    def get_preference_counts(self) -> Dict[Preference, int]:
+        selection, parameters = self.get_selection()
+        fingerprints, fingerprint_parameters = self.get_fingerprint_condition()
+        preference_counts: Dict[Preference, int] = {}
+
+        for fingerprint, value, count in self.connection.execute(
+            "SELECT fingerprint, min(value), count(*) FROM results "
+            f"WHERE filename IN ({selection}) AND {fingerprints} AND value IS NOT NULL "
+            "GROUP BY fingerprint, preference",
+            parameters + fingerprint_parameters,
+        ):
+            preference = self.by_fingerprint[fingerprint].match(value)
+            preference_counts[preference] = preference_counts.get(preference, 0) + count
+
+        return preference_counts
+
+    def get_files(self) -> Iterator[Tuple[str, List[Quality]]]:
+        selection, parameters = self.get_selection()
+        fingerprints, fingerprint_parameters = self.get_fingerprint_condition()
+        filename = None
+        qualities: List[Quality] = []
+
+        for row_filename, fingerprint, value in self.connection.execute(
+            "SELECT filename, fingerprint, value FROM results "
+            f"WHERE filename IN ({selection}) AND {fingerprints} ORDER BY filename",
+            parameters + fingerprint_parameters,
+        ):
+            if row_filename != filename:
+                if filename is not None:
+                    yield filename, qualities
+                filename = row_filename
+                qualities = []
+
+            if value is not None:
+                attribute = self.by_fingerprint[fingerprint]
+                qualities.append(Quality(attribute=attribute, preference=attribute.match(value), value=value))
+
+        if filename is not None:
+            yield filename, qualities
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import sqlite3
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from .attribute import Attribute
+from .db import get_subtree_range
+from .pipeline import Item
+from .quality import Quality
+from .video import Video
+
+
+@dataclass
+class Rollup:
+    video_count: int = 0
+    flag_count: int = 0
+    badges: Dict[Quality, int] = field(default_factory=dict)
+
+    def add(self, video: Video, flagged: bool) -> None:
+        self.video_count += 1
+        if flagged:
+            self.flag_count += 1
+
+        for quality in video.get_qualities():
+            self.badges[quality] = self.badges.get(quality, 0) + 1
+
+
+# Rollups keyed by the absolute filename of their directory.
+Rollups = Dict[str, Rollup]
+
+
+def get_config_fingerprint(attributes: Sequence[Attribute]) -> str:
+    """Stored rollups are only valid for the attributes they were counted with."""
+    return hashlib.sha1(
+        ",".join(attribute.get_fingerprint() for attribute in attributes).encode()
+    ).hexdigest()
+
+
+def roll_up(items: Iterable[Item], rollups: Rollups) -> Iterator[Item]:
+    """Add every video to the rollup of each directory from its source down to its own directory."""
+    for video, entry in items:
+        if entry.root is not None:
+            flagged = video.is_flagged()
+            directory = os.path.dirname(entry.filename)
+            while True:
+                rollups.setdefault(directory, Rollup()).add(video, flagged)
+                if len(directory) <= len(entry.root):
+                    break
+                directory = os.path.dirname(directory)
+
+        yield video, entry
+
+
+def save_rollups(connection: sqlite3.Connection, roots: Sequence[str], rollups: Rollups, config: str) -> None:
+    """Replace the stored rollups below each scanned root, so directories that have gone are dropped too."""
+    with connection:
+        for root in roots:
+            for table in ["directories", "badges"]:
+                connection.execute(
+                    f"DELETE FROM {table} WHERE directory = ? OR (directory > ? AND directory < ?)",
+                    get_subtree_range(root),
+                )
+
+        connection.executemany(
+            "INSERT OR REPLACE INTO directories VALUES (?,?,?,?)",
+            [
+                (directory, config, rollup.video_count, rollup.flag_count)
+                for directory, rollup in rollups.items()
+            ],
+        )
+        connection.executemany(
+            "INSERT OR REPLACE INTO badges VALUES (?,?,?,?,?)",
+            [
+                (
+                    directory,
+                    quality.attribute.get_fingerprint(),
+                    quality.preference.get_title(),
+                    quality.value,
+                    count,
+                )
+                for directory, rollup in rollups.items()
+                for quality, count in rollup.badges.items()
+            ],
+        )
+
+
+def load_rollups(
+    connection: sqlite3.Connection, attributes: Sequence[Attribute], root: str, depth: int
+) -> Rollups:
+    """Load the stored rollups of the directories `depth` levels below `root`.
+
+    Badges are rebuilt by matching each stored value again, which recreates any preference that was only
+    learned during the scan.
+    """
+    rollups: Rollups = {}
+    by_fingerprint = {attribute.get_fingerprint(): attribute for attribute in attributes}
+
+    def at_depth(directory: str) -> bool:
+        relative = os.path.relpath(directory, root)
+        return (0 if relative == os.curdir else relative.count(os.sep) + 1) == depth
+
+    for directory, video_count, flag_count in connection.execute(
+        "SELECT directory, video_count, flag_count FROM directories "
+        "WHERE config = ? AND (directory = ? OR (directory > ? AND directory < ?))",
+        [get_config_fingerprint(attributes), *get_subtree_range(root)],
+    ):
+        if at_depth(directory):
+            rollups[directory] = Rollup(video_count=video_count, flag_count=flag_count)
+
+    rows: List[Tuple[str, str, str, str, int]] = connection.execute(
+        "SELECT * FROM badges WHERE directory = ? OR (directory > ? AND directory < ?)",
+        get_subtree_range(root),
+    ).fetchall()
+    for directory, fingerprint, _, value, count in rows:
+        attribute = by_fingerprint.get(fingerprint, None)
+        if directory in rollups and attribute is not None and value is not None:
+            quality = Quality(attribute=attribute, preference=attribute.match(value), value=value)
+            rollups[directory].badges[quality] = count
+
+    return rollups
@@ -0,0 +1,42 @@
+import heapq
+import json
+import tempfile
+
+from typing import IO, Iterable, Iterator, List, Tuple
+
+# Number of records sorted in memory before a run is spilled to a temporary file.
+SORT_BUFFER_SIZE = 100000
+
+Record = Tuple[str, str]
+
+
+def read_run(run: IO[str]) -> Iterator[Record]:
+    run.seek(0)
+    for line in run:
+        key, value = json.loads(line)
+        yield key, value
+
+
+def external_sort(records: Iterable[Record], buffer_size: int = SORT_BUFFER_SIZE) -> Iterator[Record]:
+    """Sort (key, value) records by key in bounded memory.
+
+    Records are sorted in runs of `buffer_size`, every run but the last is spilled to a temporary file,
+    and the runs are merged back lazily.
+    """
+    runs: List[IO[str]] = []
+    buffer: List[Record] = []
+
+    try:
+        for record in records:
+            buffer.append(record)
+            if len(buffer) >= buffer_size:
+                run = tempfile.TemporaryFile("w+", encoding="utf-8")
+                run.writelines(json.dumps(x) + "\n" for x in sorted(buffer))
+                runs.append(run)
+                buffer = []
+
+        buffer.sort()
+        yield from heapq.merge(*[read_run(run) for run in runs], buffer)
+    finally:
+        for spilled in runs:
+            spilled.close()
@@ -1,29 +1,50 @@
 import json
 import os
+import sys
 
 from abc import abstractmethod, ABC
 from pathlib import Path
-from sqlite3 import Connection
-from typing import List, Optional, Sequence
+from typing import List, Optional, Sequence, Tuple
 
-from .attribute import Attribute
-from .db import get_tracks
+from .attribute import Attribute, AttributeMemo
+from .db import Result, TrackCache
+from .device import FileId
 from .exceptions import MissingAttributeError
-from .mediainfo import get_media_info_list, MediaInfoList
+from .mediainfo import DEFAULT_PARSE_SPEED, get_media_info_list, MediaInfoList, TrackIndex
 from .quality import Quality
 
 
 class Video(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def get_path(self) -> Path:
         raise NotImplementedError
 
+    @abstractmethod
+    def get_filename(self) -> str:
+        raise NotImplementedError
+
     @abstractmethod
     def get_qualities(self) -> Sequence[Quality]:
         raise NotImplementedError
 
     @abstractmethod
-    def get_cached_media_info_list(self, connection: Connection) -> MediaInfoList:
+    def get_file_id(self) -> FileId:
+        raise NotImplementedError
+
+    @abstractmethod
+    def is_cached(self, cache: TrackCache) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def is_quarantined(self, cache: TrackCache) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_cached_media_info_list(
+        self, cache: TrackCache, media_info_list: Optional[MediaInfoList] = None
+    ) -> MediaInfoList:
         raise NotImplementedError
 
     @abstractmethod
@@ -31,22 +52,63 @@ class Video(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    def analyze(self, attributes: Sequence[Attribute], connection: Connection) -> None:
+    def analyze(
+        self,
+        attributes: Sequence[Attribute],
+        cache: TrackCache,
+        media_info_list: Optional[MediaInfoList] = None,
+    ) -> None:
         raise NotImplementedError
 
 
 class SingleVideo(Video):
-    path: Path
-    filename: str
+    """A file, kept small enough to hold a whole library of them in memory.
+
+    The filename is split into its directory, interned so files in one directory share it, and its name.
+    The path the file was found at is kept the same way, unless it is the filename itself.
+    """
+
+    __slots__ = ("directory", "name", "relative", "qualities", "stat", "file_id")
+
+    directory: str
+    name: str
+    relative: Optional[Tuple[str, str]]
     qualities: List[Quality]
+    stat: Optional[Tuple[int, float]]
+    file_id: Optional[FileId]
+
+    def __init__(
+        self,
+        path: Path,
+        qualities: Optional[List[Quality]] = None,
+        filename: Optional[str] = None,
+        stat: Optional[Tuple[int, float]] = None,
+        file_id: Optional[FileId] = None,
+    ):
+        filename = filename or str(path.absolute())
+        self.directory = sys.intern(os.path.dirname(filename))
+        self.name = os.path.basename(filename)
+
+        relative = str(path)
+        if relative == filename:
+            self.relative = None
+        else:
+            name = os.path.basename(relative)
+            self.relative = (sys.intern(os.path.dirname(relative)), self.name if name == self.name else name)
 
-    def __init__(self, path: Path, qualities: Optional[List[Quality]] = None):
-        self.path = path
-        self.filename = str(path.absolute())
         self.qualities = qualities or []
+        self.stat = stat
+        self.file_id = file_id
 
     def get_path(self) -> Path:
-        return self.path
+        return Path(self.filename if self.relative is None else os.path.join(*self.relative))
+
+    def get_filename(self) -> str:
+        return os.path.join(self.directory, self.name)
+
+    @property
+    def filename(self) -> str:
+        return self.get_filename()
 
     def get_qualities(self) -> Sequence[Quality]:
         return self.qualities
@@ -58,25 +120,76 @@ class SingleVideo(Video):
 
         return False
 
-    def get_media_info_list(self) -> MediaInfoList:
-        return get_media_info_list(self.filename)
+    def get_media_info_list(self, parse_speed: float = DEFAULT_PARSE_SPEED) -> MediaInfoList:
+        return get_media_info_list(self.filename, parse_speed)
+
+    def get_stat(self) -> Tuple[int, float]:
+        if self.stat is None:
+            self.stat = (os.path.getsize(self.filename), os.path.getmtime(self.filename))
+
+        return self.stat
+
+    def get_file_id(self) -> FileId:
+        if self.file_id is None:
+            stat = os.stat(self.filename)
+            self.file_id = (stat.st_dev, stat.st_ino)
+
+        return self.file_id
+
+    def is_cached(self, cache: TrackCache) -> bool:
+        size, modified = self.get_stat()
+        return cache.has_tracks(self.filename, size, modified)
+
+    def is_quarantined(self, cache: TrackCache) -> bool:
+        size, modified = self.get_stat()
+        return cache.is_quarantined(self.filename, size, modified)
+
+    def get_cached_media_info_list(
+        self, cache: TrackCache, media_info_list: Optional[MediaInfoList] = None
+    ) -> MediaInfoList:
+        size, modified = self.get_stat()
 
-    def get_cached_media_info_list(self, connection: Connection) -> MediaInfoList:
-        size = os.path.getsize(self.filename)
-        modified = os.path.getmtime(self.filename)
+        def tracks_generator() -> MediaInfoList:
+            return self.get_media_info_list(cache.parse_speed) if media_info_list is None else media_info_list
 
-        return get_tracks(connection, self.filename, size, modified, lambda: self.get_media_info_list())
+        return cache.get_tracks(self.filename, size, modified, tracks_generator)
 
-    def analyze(self, attributes: Sequence[Attribute], connection: Connection) -> None:
-        tracks = self.get_cached_media_info_list(connection)
+    def analyze(
+        self,
+        attributes: Sequence[Attribute],
+        cache: TrackCache,
+        media_info_list: Optional[MediaInfoList] = None,
+    ) -> None:
+        size, modified = self.get_stat()
+        stored = cache.get_results(self.filename, size, modified)
+        results: List[Result] = []
+        tracks: Optional[MediaInfoList] = None
+        track_index = TrackIndex([])
+        memo: AttributeMemo = {}
 
         for attribute in attributes:
-            try:
-                self.qualities.append(
-                    Quality(attribute=attribute, preference=attribute.get_preference(tracks))
-                )
-            except MissingAttributeError:
-                continue
-            except Exception as e:
-                print(json.dumps(tracks, indent=4))
-                raise (e)
+            fingerprint = attribute.get_fingerprint()
+
+            if fingerprint in stored:
+                value = stored[fingerprint]
+            else:
+                if tracks is None:
+                    tracks = self.get_cached_media_info_list(cache, media_info_list)
+                    track_index = TrackIndex(tracks)
+
+                try:
+                    value = attribute.evaluate(track_index, memo)
+                except MissingAttributeError:
+                    value = None
+                except Exception as e:
+                    print(json.dumps(tracks, indent=4))
+                    raise (e)
+
+            preference = None if value is None else attribute.match(value)
+            if preference is not None:
+                self.qualities.append(Quality(attribute=attribute, preference=preference, value=value))
+
+            if fingerprint and fingerprint not in stored:
+                results.append((fingerprint, value, None if preference is None else preference.get_title()))
+
+        cache.put_results(self.filename, size, modified, results)
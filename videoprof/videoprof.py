@@ -1,18 +1,37 @@
 import click
 import json
 import os
+import sqlite3
 
 from appdirs import user_config_dir, user_cache_dir
 from pathlib import Path
-from typing import Dict, List, Optional, Sequence
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
 
 from .attribute import Attribute
-from .config import get_attributes
-from .db import get_connection
+from .backend import BACKENDS, NativeBackend
+from .columns import load_summary
+from .config import (
+    get_config,
+    make_attributes,
+    make_backend,
+    make_device_limits,
+    make_filter,
+    make_ignore,
+    make_parse_speed,
+)
+from .codec import CODECS
+from .db import get_connection, SYNCHRONOUS_MODES, TrackCache
+from .maintenance import clear_quarantine, get_quarantine, get_stats, prune, vacuum
+from .pipeline import analyze_videos, plan_videos, read_ahead
+from .pool import ProbeFailure, probe_serially
 from .preference import Preference
 from .progress import show_progress
 from .quality import Quality
+from .query import parse_filter, ResultQuery
+from .rollup import get_config_fingerprint, load_rollups, roll_up, Rollup, Rollups, save_rollups
+from .sort import external_sort
 from .video import SingleVideo, Video
+from .walk import CacheWalker, Walker
 
 APP_NAME = "videoprof"
 DEFAULT_CONFIG = os.path.join(user_config_dir(), APP_NAME, "config.json")
@@ -20,22 +39,47 @@ DEFAULT_CACHE = os.path.join(user_cache_dir(), APP_NAME, "cache.db")
 TAB = "\t"
 
 
-def render_badge(preference: Preference) -> str:
+def render_badge(preference: Preference, count: Optional[int] = None) -> str:
     prefix = "\u2612 " if preference.is_flagged() else "\u2713 "
-    return preference.render(prefix + preference.get_title())
+    suffix = "" if count is None else f" \u00d7{count}"
+    return preference.render(prefix + preference.get_title() + suffix)
+
+
+def get_quality_sort_key(quality: Quality) -> Tuple[str, int]:
+    """Order badges by attribute title, then in the order the attribute lists its preferences."""
+    preferences = list(quality.attribute.get_preferences())
+    position = (
+        preferences.index(quality.preference) if quality.preference in preferences else len(preferences)
+    )
+    return quality.attribute.get_title(), position
 
 
-def render_cluster(qualities: Sequence[Quality]) -> str:
+def render_cluster(qualities: Iterable[Quality], counts: Optional[Mapping[Quality, int]] = None) -> str:
     cluster = [
-        render_badge(quality.preference)
-        for quality in sorted(qualities, key=lambda x: x.attribute.get_title())
+        render_badge(quality.preference, None if counts is None else counts[quality])
+        for quality in sorted(qualities, key=get_quality_sort_key)
     ]
     return f"{' '.join(cluster)}"
 
 
-def show_summary(attributes: Sequence[Attribute], videos: Sequence[Video]) -> None:
+def get_sort_key(path: Path) -> str:
+    """A string key that sorts like the path itself, comparing one component at a time."""
+    return "\0".join(path.parts)
+
+
+def show_summary(attributes: Sequence[Attribute], videos: Iterable[Video]) -> None:
     preference_counts: Dict[Preference, int] = {}
 
+    for video in videos:
+        for quality in video.get_qualities():
+            preference_counts[quality.preference] = preference_counts.get(quality.preference, 0) + 1
+
+    show_preference_counts(attributes, preference_counts)
+
+
+def show_preference_counts(
+    attributes: Sequence[Attribute], preference_counts: Mapping[Preference, int]
+) -> None:
     def preference_summary(preference: Preference) -> str:
         count = preference_counts.get(preference, 0)
         return f"{preference.get_title()}:{TAB}{preference.render(str(count))}"
@@ -44,46 +88,120 @@ def show_summary(attributes: Sequence[Attribute], videos: Sequence[Video]) -> No
         counts = "\t".join([preference_summary(preference) for preference in attribute.get_preferences()])
         return f"{attribute.get_title()}{TAB}{counts}"
 
-    for video in videos:
-        for quality in video.get_qualities():
-            preference_counts[quality.preference] = preference_counts.get(quality.preference, 0) + 1
-
     for attribute in attributes:
         print(attribute_summary(attribute))
 
 
-def show_files(videos: Sequence[Video], only_flagged: bool) -> None:
-    for video in sorted(videos, key=lambda item: item.get_path()):
-        if not only_flagged or video.is_flagged():
-            print(f"{video.get_path()}:{TAB}{render_cluster(video.get_qualities())}")
+def show_files(videos: Iterable[Video], only_flagged: bool, ordered: bool = True) -> None:
+    lines = (
+        (get_sort_key(video.get_path()), f"{video.get_path()}:{TAB}{render_cluster(video.get_qualities())}")
+        for video in videos
+        if not only_flagged or video.is_flagged()
+    )
+
+    for _, line in external_sort(lines) if ordered else lines:
+        print(line)
+
 
+def show_directories(rollups: Mapping[Path, Rollup], only_flagged: bool) -> None:
+    for path, rollup in sorted(rollups.items(), key=lambda item: item[0]):
+        if not only_flagged or rollup.flag_count:
+            counts = f"\u2690 {rollup.flag_count}/{rollup.video_count}"
+            print(f"{path}:{TAB}{counts}{TAB}{render_cluster(rollup.badges, rollup.badges)}")
+
+
+def show_cached_directories(
+    connection: sqlite3.Connection,
+    attributes: Sequence[Attribute],
+    sources: Sequence[str],
+    depth: int,
+    only_flagged: bool,
+) -> None:
+    rollups = {}
+    for source in sources:
+        root = os.path.abspath(source)
+        for directory, rollup in load_rollups(connection, attributes, root, depth).items():
+            rollups[Path(os.path.join(source, os.path.relpath(directory, root)))] = rollup
 
-def show_directories(dir_videos: Dict[Path, List[Video]], only_flagged: bool) -> None:
-    for directory, videos in sorted(dir_videos.items(), key=lambda item: item[0]):
-        flag_count = 0
-        video_count = 0
-        qualities: List[Quality] = []
+    show_directories(rollups, only_flagged)
 
-        for video in videos:
-            video_count += 1
-            if video.is_flagged():
-                flag_count += 1
 
-            for quality in video.get_qualities():
-                if quality not in qualities:
-                    qualities.append(quality)
+class DefaultGroup(click.Group):
+    """A group running its default command when no other command is named, so `videoprof DIR` still scans.
 
-        if not only_flagged or flag_count:
-            print(f"{directory}:{TAB}\u2690 {flag_count}/{video_count}{TAB}{render_cluster(qualities)}")
+    An existing path is always taken as a source, even when it is named like a command.
+    """
 
+    default_command: str
 
-@click.command()
+    def __init__(self, *args: Any, default_command: str, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx: click.Context, args: List[str]) -> List[str]:
+        if (
+            not args
+            or os.path.exists(args[0])
+            or (args[0] not in self.commands and args[0] not in ctx.help_option_names)
+        ):
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
+
+
+config_option = click.option("-c", "--config", default=DEFAULT_CONFIG, help="JSON configuration file")
+sqlite_cache_option = click.option("-s", "--sqlite-cache", default=DEFAULT_CACHE, help="SQLite cache file")
+
+
+@click.group(cls=DefaultGroup, default_command="scan")
+def main() -> None:
+    """Profile videos, scanning the given sources unless another command is named."""
+
+
+@main.command()
 @click.argument("sources", nargs=-1)
-@click.option("-c", "--config", default=DEFAULT_CONFIG, help="JSON configuration file")
-@click.option("-s", "--sqlite-cache", default=DEFAULT_CACHE, help="SQLite cache file")
+@config_option
+@sqlite_cache_option
+@click.option(
+    "--sqlite-synchronous",
+    type=click.Choice(SYNCHRONOUS_MODES),
+    default="NORMAL",
+    help="SQLite synchronous setting for cache writes",
+)
+@click.option(
+    "--cache-format",
+    type=click.Choice(list(CODECS)),
+    default="json",
+    help="Storage format for cached tracks",
+)
+@click.option(
+    "--project-tracks",
+    is_flag=True,
+    default=False,
+    help="Only cache the track fields used by the configuration",
+)
+@click.option(
+    "--content-keys",
+    is_flag=True,
+    default=False,
+    help="Find moved or renamed files in the cache by a fingerprint of their content",
+)
 @click.option("-f", "--files", is_flag=True, default=False, help="Show individual file badges and exit")
 @click.option("-d", "--directories", is_flag=True, default=False, help="Show directory badges and exit")
 @click.option("-p", "--directory-depth", default=1, help="Directory depth for summaries")
+@click.option(
+    "-r",
+    "--from-cache",
+    is_flag=True,
+    default=False,
+    help="Show directory badges stored by earlier scans without scanning again",
+)
+@click.option(
+    "-u",
+    "--unordered",
+    is_flag=True,
+    default=False,
+    help="Show individual files as soon as they are analyzed instead of sorted",
+)
 @click.option(
     "-o",
     "--only-flagged",
@@ -98,64 +216,267 @@ def show_directories(dir_videos: Dict[Path, List[Video]], only_flagged: bool) ->
     default=False,
     help="Show media info for the first found file and exit",
 )
-def main(
+@click.option(
+    "-j", "--jobs", default=1, help="Number of parallel mediainfo worker processes (0 for one per CPU)"
+)
+@click.option(
+    "--probe-backend",
+    type=click.Choice(BACKENDS),
+    default=None,
+    help="Probe with libmediainfo in-process, with batched mediainfo tool runs, or by reading Matroska "
+    "and MP4 headers natively (default from config)",
+)
+@click.option(
+    "--parse-speed",
+    type=float,
+    default=None,
+    help="How much of each file mediainfo reads, from 0 for headers to 1 for all of it (default from config)",
+)
+@click.option(
+    "-t",
+    "--timeout",
+    default=300.0,
+    help="Quarantine files that take longer than this many seconds to probe (0 to probe without a worker)",
+)
+@click.option(
+    "--trust-cache",
+    is_flag=True,
+    default=False,
+    help="List files from the cache below each source, with their cached size and time, instead of walking",
+)
+@click.option(
+    "--revalidate",
+    default=0,
+    help="With --trust-cache, check this many of the least recently checked files against the filesystem",
+)
+def scan(
     sources: Sequence[str],
     config: str,
     sqlite_cache: str,
+    sqlite_synchronous: str,
+    cache_format: str,
+    project_tracks: bool,
+    content_keys: bool,
     files: bool,
     directories: bool,
     only_flagged: bool,
     media_info: bool,
     directory_depth: int,
+    from_cache: bool,
+    unordered: bool,
+    jobs: int,
+    probe_backend: Optional[str],
+    parse_speed: Optional[float],
+    timeout: float,
+    trust_cache: bool,
+    revalidate: int,
 ) -> None:
+    """Scan SOURCES, the current directory by default, and summarize their attributes."""
     if len(sources) == 0:
         sources = ["."]
 
-    attributes = get_attributes(Path(config))
-    connection = get_connection(Path(sqlite_cache))
-    videos: List[Video] = []
-    dir_videos: Dict[Path, List[Video]] = {}
+    if jobs < 1:
+        jobs = os.cpu_count() or 1
 
-    def add_video(path: Path) -> Optional[Video]:
-        if not path.is_file():
-            return None
+    configuration = get_config(Path(config))
+    attributes = make_attributes(configuration)
+    config_fields = frozenset().union(*[attribute.get_fields() for attribute in attributes])
+    try:
+        backend = make_backend(configuration, probe_backend, config_fields, parse_speed)
+        parse_speed = make_parse_speed(configuration, parse_speed)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    # Native tracks only carry the configured fields, so they are cached as projected tracks would be.
+    fields = config_fields if project_tracks or isinstance(backend, NativeBackend) else None
+    cache = TrackCache(
+        get_connection(Path(sqlite_cache), sqlite_synchronous),
+        codec=CODECS[cache_format],
+        fields=fields,
+        content=content_keys,
+        parse_speed=parse_speed,
+        parse_speeds={x.get_fingerprint(): x.get_parse_speed() for x in attributes if x.get_parse_speed()},
+        # Trusting the cache means not reading the files, so old rows only get fingerprints on a full walk.
+        backfill_content=not trust_cache,
+    )
+
+    if from_cache:
+        show_cached_directories(cache.connection, attributes, sources, directory_depth, only_flagged)
+        exit(0)
 
-        video = SingleVideo(path=path)
-        if media_info:
-            print(json.dumps(video.get_cached_media_info_list(connection), indent=4))
+    walker = (
+        CacheWalker(cache, directory_depth, make_filter(configuration), revalidate)
+        if trust_cache
+        else Walker(directory_depth, make_filter(configuration), make_ignore(configuration))
+    )
+    entries = walker.walk(sources)
+    if not trust_cache:
+        cache.start_listing()
+        # The filesystem walk runs on its own thread, a bounded distance ahead of probing and analysis.
+        # Walking the cache instead reads the same SQLite connection, so it stays on this one.
+        entries = read_ahead(entries)
+
+    if media_info:
+        for entry in entries:
+            video = SingleVideo(
+                path=Path(entry.path), filename=entry.filename, stat=(entry.size, entry.modified)
+            )
+            probe = next(probe_serially([video], cache, backend))
+            if isinstance(probe, ProbeFailure):
+                print(f"Could not probe {entry.path}: {probe.reason}")
+                exit(1)
+            print(json.dumps(video.get_cached_media_info_list(cache, probe), indent=4))
+            cache.flush()
             exit(0)
-        videos.append(video)
-        return video
-
-    for src in sources:
-        origin = Path(src)
-        add_video(origin)
-
-        file_paths = origin.glob("*")
-        for file in file_paths:
-            add_video(file)
-
-        dir_paths = origin.glob("/".join(["*" for x in range(directory_depth)]))
-        for dir in dir_paths:
-            dir_videos[dir] = []
-            src_paths = dir.glob("**/*")
-            for path in src_paths:
-                video = add_video(path)
-                if video:
-                    dir_videos[dir].append(video)
+
+    # Walking, analysis and rendering are chained generators, so only a few chunks of files are in flight.
+    # Every directory is rolled up on the way, at every depth, and stored for later --from-cache queries.
+    fingerprints = [attribute.get_fingerprint() for attribute in attributes]
+    rollups: Rollups = {}
+    items = roll_up(
+        show_progress(
+            analyze_videos(
+                plan_videos(entries, cache, fingerprints),
+                attributes,
+                cache,
+                jobs,
+                timeout,
+                make_device_limits(configuration),
+                backend,
+            )
+        ),
+        rollups,
+    )
 
     try:
-        show_progress(videos, lambda video: video.analyze(attributes, connection))
+        if files:
+            show_files((video for video, _ in items), only_flagged, not unordered)
+        elif directories:
+            for _ in items:
+                pass
+        else:
+            show_summary(attributes, (video for video, _ in items))
     except OSError:
         print("Could not analyze videos: make sure libmediainfo is installed!")
         exit(1)
+    finally:
+        cache.flush()
 
-    if files:
-        show_files(videos, only_flagged)
-        exit(0)
+    # A complete walk listed every file below its roots, so the cached rows of any others are gone.
+    if not trust_cache:
+        cache.sweep(walker.roots, walker.unwalked)
+
+    for directory in walker.walked:
+        rollups.setdefault(directory, Rollup())
+    save_rollups(cache.connection, walker.roots, rollups, get_config_fingerprint(attributes))
 
     if directories:
-        show_directories(dir_videos, only_flagged)
-        exit(0)
+        show_directories(
+            {Path(x): rollups.get(os.path.abspath(x), Rollup()) for x in walker.directories}, only_flagged
+        )
+
+
+@main.command()
+@click.argument("filters", nargs=-1)
+@config_option
+@sqlite_cache_option
+@click.option("--under", multiple=True, help="Only count files below this directory (repeatable)")
+@click.option("-f", "--files", is_flag=True, default=False, help="Show individual file badges")
+@click.option(
+    "-o", "--only-flagged", is_flag=True, default=False, help="Only count files with a flagged badge"
+)
+@click.option(
+    "--columns",
+    is_flag=True,
+    default=False,
+    help="Evaluate the attributes over the cached tracks, one distinct value at a time, instead of reading "
+    "stored results (without FILTERS, --files or --only-flagged)",
+)
+def query(
+    filters: Sequence[str],
+    config: str,
+    sqlite_cache: str,
+    under: Sequence[str],
+    files: bool,
+    only_flagged: bool,
+    columns: bool,
+) -> None:
+    """Summarize the results stored by earlier scans, filtered by FILTERS such as "Video Codec=HEVC".
+
+    A filter matches the stored value or the preference title of an attribute, and "!=" negates it.
+    """
+    attributes = make_attributes(get_config(Path(config)))
+    if columns:
+        if filters or files or only_flagged:
+            raise click.UsageError("--columns only summarizes, without FILTERS, --files or --only-flagged")
+
+        summary = load_summary(get_connection(Path(sqlite_cache)), attributes, under)
+        print(f"Files:{TAB}{summary.size}")
+        show_preference_counts(attributes, summary.get_preference_counts())
+        return
+    try:
+        result_filters = [parse_filter(x, attributes) for x in filters]
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="FILTERS")
+
+    result_query = ResultQuery(
+        get_connection(Path(sqlite_cache)), attributes, under, result_filters, only_flagged
+    )
+
+    if files:
+        show_files(
+            (
+                SingleVideo(Path(filename), qualities, filename)
+                for filename, qualities in result_query.get_files()
+            ),
+            only_flagged,
+        )
+        return
+
+    print(f"Files:{TAB}{result_query.count()}")
+    show_preference_counts(attributes, result_query.get_preference_counts())
+
+
+@main.group(name="cache")
+def cache_group() -> None:
+    """Maintain the SQLite cache."""
+
+
+@cache_group.command(name="prune")
+@click.argument("prefixes", nargs=-1)
+@sqlite_cache_option
+@click.option("-j", "--jobs", default=8, help="Number of parallel filesystem checks")
+def cache_prune(prefixes: Sequence[str], sqlite_cache: str, jobs: int) -> None:
+    """Drop cached files that no longer exist, below PREFIXES or everywhere."""
+    count = prune(get_connection(Path(sqlite_cache)), prefixes, jobs)
+    print(f"Pruned:{TAB}{count}")
+
+
+@cache_group.command(name="vacuum")
+@sqlite_cache_option
+def cache_vacuum(sqlite_cache: str) -> None:
+    """Refresh the query planner statistics and compact the cache file."""
+    vacuum(get_connection(Path(sqlite_cache)))
+
+
+@cache_group.command(name="stats")
+@sqlite_cache_option
+def cache_stats(sqlite_cache: str) -> None:
+    """Show the size, contents and lookup hit ratio of the cache."""
+    for name, value in get_stats(get_connection(Path(sqlite_cache)), Path(sqlite_cache)).items():
+        rendered = f"{value:.2%}" if isinstance(value, float) else str(value)
+        print(f"{name.capitalize()}:{TAB}{rendered}")
+
+
+@cache_group.command(name="quarantine")
+@click.argument("prefixes", nargs=-1)
+@sqlite_cache_option
+@click.option("--clear", is_flag=True, default=False, help="Probe the listed files again on the next scan")
+def cache_quarantine(prefixes: Sequence[str], sqlite_cache: str, clear: bool) -> None:
+    """List the files below PREFIXES that could not be probed, skipped until they change."""
+    connection = get_connection(Path(sqlite_cache))
+    if clear:
+        print(f"Cleared:{TAB}{clear_quarantine(connection, prefixes)}")
+        return
 
-    show_summary(attributes, videos)
+    for filename, _, _, reason, _ in get_quarantine(connection, prefixes):
+        print(f"{filename}:{TAB}{reason}")
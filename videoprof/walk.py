@@ -0,0 +1,256 @@
+import os
+import time
+
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .db import TrackCache
+from .device import FileId
+from .filter import VideoFilter
+from .ignore import IGNORE_FILE, IgnoreRule, is_ignored, parse_rules, read_rules
+
+
+@dataclass
+class WalkEntry:
+    path: str
+    filename: str
+    size: int
+    modified: float
+    directory: Optional[str] = None
+    root: Optional[str] = None
+    file_id: Optional[FileId] = None
+
+
+class Walker:
+    """Walk sources once with os.scandir, reusing each DirEntry's stat for size and modification time.
+
+    Directories are de-duplicated by device and inode, which identifies the resolved directory without
+    resolving every path component, so overlapping sources and directory loops are only walked once. Only
+    the files that could be reached twice are recorded as well: symlinks and sources, which are skipped if
+    the directory they resolve to was walked, and files with several hard links. So memory grows with the
+    number of directories, not files.
+    Every directory found `depth` levels below a source is recorded in `directories`, and the files
+    beneath it are tagged with it as they are yielded. The absolute filename of every directory walked is
+    recorded in `walked`, and files found in a source directory are tagged with its filename as `root`,
+    which is also recorded in `roots`. Directories below a root that are not walked, because they are
+    ignored, were already walked from elsewhere or could not be read, are recorded in `unwalked`.
+    Files rejected by the video filter's extension rules are skipped before they are even stat-ed.
+
+    The `ignore` patterns, and those of every .videoprofignore file on the way down, follow gitignore
+    rules. Ignored directories are pruned before they are stat-ed or read.
+    """
+
+    depth: int
+    video_filter: VideoFilter
+    ignore: Sequence[str]
+    directories: List[str]
+    walked: List[str]
+    roots: List[str]
+    unwalked: Set[str]
+    seen: Set[FileId]
+
+    def __init__(self, depth: int = 1, video_filter: VideoFilter = VideoFilter(), ignore: Sequence[str] = ()):
+        self.depth = depth
+        self.video_filter = video_filter
+        self.ignore = ignore
+        self.directories = []
+        self.walked = []
+        self.roots = []
+        self.unwalked = set()
+        self.seen = set()
+
+    def walk(self, sources: Sequence[str]) -> Iterator[WalkEntry]:
+        for source in sources:
+            try:
+                stat = os.stat(source)
+            except OSError:
+                continue
+
+            if os.path.isdir(source):
+                if self.visit(stat):
+                    filename = os.path.abspath(source)
+                    self.roots.append(filename)
+                    rules = parse_rules(self.ignore, filename)
+                    yield from self.walk_directory(filename, source, filename, 0, None, rules)
+            elif (
+                os.path.isfile(source)
+                and self.video_filter.accepts_name(source)
+                and self.visit_file(source, stat, True)
+                and self.video_filter.accepts_file(source)
+            ):
+                yield WalkEntry(
+                    path=source,
+                    filename=os.path.abspath(source),
+                    size=stat.st_size,
+                    modified=stat.st_mtime,
+                    file_id=(stat.st_dev, stat.st_ino),
+                )
+
+    def visit(self, stat: os.stat_result) -> bool:
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id in self.seen:
+            return False
+
+        self.seen.add(file_id)
+        return True
+
+    def visit_file(self, filename: str, stat: os.stat_result, resolve: bool) -> bool:
+        """Whether a file was not found before, resolving symlinks and sources to their directory first."""
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id in self.seen:
+            return False
+
+        if resolve:
+            try:
+                parent = os.stat(os.path.dirname(os.path.realpath(filename)))
+            except OSError:
+                pass
+            else:
+                if (parent.st_dev, parent.st_ino) in self.seen:
+                    return False
+
+        if resolve or stat.st_nlink > 1:
+            self.seen.add(file_id)
+        return True
+
+    def walk_directory(
+        self,
+        root: str,
+        path: str,
+        filename: str,
+        level: int,
+        directory: Optional[str],
+        rules: Sequence[IgnoreRule],
+    ) -> Iterator[WalkEntry]:
+        try:
+            with os.scandir(path) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+        except OSError:
+            self.unwalked.add(filename)
+            return
+
+        self.walked.append(filename)
+
+        if any(entry.name == IGNORE_FILE for entry in entries):
+            rules = [*rules, *read_rules(filename)]
+
+        for entry in entries:
+            child_filename = os.path.join(filename, entry.name)
+            try:
+                if entry.is_dir():
+                    if is_ignored(rules, child_filename, True) or not self.visit(entry.stat()):
+                        self.unwalked.add(child_filename)
+                        continue
+
+                    child_path = os.path.join(path, entry.name)
+                    child_directory = directory
+                    if level + 1 == self.depth:
+                        child_directory = child_path
+                        self.directories.append(child_path)
+
+                    yield from self.walk_directory(
+                        root, child_path, child_filename, level + 1, child_directory, rules
+                    )
+                elif (
+                    entry.is_file()
+                    and entry.name != IGNORE_FILE
+                    and self.video_filter.accepts_name(entry.name)
+                    and not is_ignored(rules, child_filename, False)
+                ):
+                    stat = entry.stat()
+                    if self.visit_file(
+                        child_filename, stat, entry.is_symlink()
+                    ) and self.video_filter.accepts_file(child_filename):
+                        yield WalkEntry(
+                            path=os.path.join(path, entry.name),
+                            filename=child_filename,
+                            size=stat.st_size,
+                            modified=stat.st_mtime,
+                            directory=directory,
+                            root=root,
+                            file_id=(stat.st_dev, stat.st_ino),
+                        )
+            except OSError:
+                self.unwalked.add(child_filename)
+                continue
+
+
+class CacheWalker(Walker):
+    """Walk the files cached below each source instead of the filesystem, trusting their cached stat.
+
+    Only the `revalidate` files that have gone longest without a check are stat-ed; files that changed are
+    yielded with their new stat, so they are parsed again, and files that are gone are skipped. Files are
+    only filtered by extension, since reading .videoprofignore files or headers would touch the filesystem.
+    """
+
+    cache: TrackCache
+    revalidate: int
+
+    def __init__(
+        self,
+        cache: TrackCache,
+        depth: int = 1,
+        video_filter: VideoFilter = VideoFilter(),
+        revalidate: int = 0,
+    ):
+        super().__init__(depth, video_filter)
+        self.cache = cache
+        self.revalidate = revalidate
+
+    def validate(self, roots: Sequence[str]) -> Dict[str, Optional[Tuple[int, float]]]:
+        stats: Dict[str, Optional[Tuple[int, float]]] = {}
+        for filename, _, _ in self.cache.get_unvalidated(roots, self.revalidate):
+            try:
+                stat = os.stat(filename)
+                stats[filename] = (stat.st_size, stat.st_mtime)
+            except OSError:
+                stats[filename] = None
+
+        self.cache.put_validated(list(stats), time.time())
+        return stats
+
+    def walk(self, sources: Sequence[str]) -> Iterator[WalkEntry]:
+        # Sources below another source are already covered by it, like the de-duplication of a real walk.
+        root_sources: Dict[str, str] = {}
+        for source in sources:
+            root_sources.setdefault(os.path.abspath(source), source)
+        self.roots = [x for x in root_sources if not any(x.startswith(y + os.sep) for y in root_sources)]
+        stats = self.validate(self.roots)
+        walked = set()
+
+        for root in self.roots:
+            source = root_sources[root]
+            for filename, size, modified in self.cache.get_stats(root):
+                if not self.video_filter.accepts_name(filename):
+                    continue
+
+                if filename in stats:
+                    stat = stats[filename]
+                    if stat is None:
+                        continue
+                    size, modified = stat
+
+                if filename == root:
+                    yield WalkEntry(path=source, filename=filename, size=size, modified=modified)
+                    continue
+
+                parts = os.path.relpath(filename, root).split(os.sep)
+                directory = None
+                for level in range(len(parts)):
+                    child = os.path.join(root, *parts[:level])
+                    if 0 < level == self.depth:
+                        directory = os.path.join(source, *parts[:level])
+                    if child not in walked:
+                        walked.add(child)
+                        self.walked.append(child)
+                        if directory is not None and level == self.depth:
+                            self.directories.append(directory)
+
+                yield WalkEntry(
+                    path=os.path.join(source, *parts),
+                    filename=filename,
+                    size=size,
+                    modified=modified,
+                    directory=directory,
+                    root=root,
+                )